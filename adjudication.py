@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Adjudication - AI Battle
+========================
+Ends clearly decided games early. After each move the position is scored
+from White's point of view (material count, or a UCI engine if one is
+configured); a game is adjudicated when:
+- one side stays ahead by resign_margin for resign_plies plies: it wins
+- the score stays within draw_margin for draw_plies plies, late in the
+  game and with few pieces left: draw
+
+In 'shadow' mode nothing is ended: the first trigger is only recorded, and
+the plies and tokens spent after it are what adjudication would have saved.
+Every game with a trigger is appended to a JSON lines log.
+
+Usage:
+    python adjudication.py adjudications.jsonl     # savings report
+"""
+
+import argparse
+import json
+import os
+
+import chess
+
+from move_prompt import calculate_material_score
+
+MODES = ("off", "shadow", "on")
+
+
+def material_eval(board):
+    """Material balance in centipawns, from White's point of view"""
+    if board.is_checkmate():
+        return -10000 if board.turn == chess.WHITE else 10000
+    white, black = calculate_material_score(board)
+    return (white - black) * 100
+
+
+class EngineEvaluator:
+    """Engine evaluation with a short search (one engine process, started on first use)"""
+
+    def __init__(self, engine_path, depth=8, time_limit=0.1):
+        self.engine_path = engine_path
+        self.depth = depth
+        self.time_limit = time_limit
+        self.engine = None
+
+    def __call__(self, board):
+        import chess.engine
+        from engine_analysis import evaluate_board, EVAL_CAP
+        if self.engine is None:
+            self.engine = chess.engine.SimpleEngine.popen_uci(self.engine_path)
+        try:
+            score = evaluate_board(self.engine, board, chess.engine.Limit(depth=self.depth, time=self.time_limit))
+        except Exception:
+            # The engine may have died: the next call starts a new one
+            self.discard()
+            raise
+        return max(-EVAL_CAP, min(EVAL_CAP, score))
+
+    def discard(self):
+        engine, self.engine = self.engine, None
+        if engine:
+            try:
+                engine.close()
+            except Exception:
+                pass
+
+    def close(self):
+        if self.engine:
+            self.engine.quit()
+            self.engine = None
+
+
+class Adjudicator:
+    """Tracks how long a game has looked decided and says when to end it"""
+
+    def __init__(self, evaluate=material_eval, resign_margin=900, resign_plies=8, min_ply=20,
+                 draw_margin=50, draw_plies=20, draw_min_ply=80, draw_max_pieces=10):
+        self.evaluate = evaluate
+        self.resign_margin = resign_margin
+        self.resign_plies = resign_plies
+        self.min_ply = min_ply
+        self.draw_margin = draw_margin
+        self.draw_plies = draw_plies
+        self.draw_min_ply = draw_min_ply
+        self.draw_max_pieces = draw_max_pieces
+        self.reset()
+
+    def reset(self):
+        """Starts a new game"""
+        self.ahead = None  # color ahead by the resign margin
+        self.ahead_plies = 0
+        self.level_plies = 0
+        self.last_ply = None
+        self.trigger = None
+
+    def check(self, board, tokens=0):
+        """Scores a new position. Returns None, ('resign', losing_color) or ('draw', None)"""
+        ply = board.ply()
+        if ply == self.last_ply or board.is_game_over():
+            return None
+        self.last_ply = ply
+        score = self.evaluate(board)
+
+        ahead = chess.WHITE if score >= self.resign_margin else (
+            chess.BLACK if score <= -self.resign_margin else None)
+        if ahead is not None and ahead == self.ahead:
+            self.ahead_plies += 1
+        else:
+            self.ahead_plies = 1 if ahead is not None else 0
+        self.ahead = ahead
+        self.level_plies = self.level_plies + 1 if abs(score) <= self.draw_margin else 0
+
+        decision = None
+        if ahead is not None and self.ahead_plies >= self.resign_plies and ply >= self.min_ply:
+            decision = ("resign", not ahead)
+        elif (self.level_plies >= self.draw_plies and ply >= self.draw_min_ply
+              and len(board.piece_map()) <= self.draw_max_pieces):
+            decision = ("draw", None)
+
+        if decision and self.trigger is None:
+            loser = None if decision[1] is None else chess.COLOR_NAMES[decision[1]]
+            self.trigger = {"ply": ply, "tokens": tokens, "score": score, "decision": decision[0], "loser": loser}
+        return decision
+
+    def game_entry(self, game_id, mode, end_ply, tokens, winner):
+        """Log entry of a finished game (None if adjudication never triggered). winner: 'white', 'black' or 'draw'"""
+        if self.trigger is None:
+            return None
+        return {
+            "game_id": game_id,
+            "mode": mode,
+            "winner": winner,
+            "end_ply": end_ply,
+            **self.trigger,
+            # Spent after the trigger: what adjudication saved ('shadow') or would have cost ('on': 0)
+            "plies_after": end_ply - self.trigger["ply"],
+            "tokens_after": tokens - self.trigger["tokens"],
+        }
+
+
+def append_entry(path, entry):
+    """Appends one game entry to the adjudication log"""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(entry) + "\n")
+
+
+def load_entries(path):
+    if not os.path.isfile(path):
+        return []
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def summarize(entries, tokens_per_ply=None):
+    """Plies and tokens saved: measured on shadow games, estimated for adjudicated ones"""
+    shadow = [e for e in entries if e["mode"] == "shadow"]
+    adjudicated = [e for e in entries if e["mode"] == "on"]
+    mean_plies = sum(e["plies_after"] for e in shadow) / len(shadow) if shadow else None
+    if tokens_per_ply is None and shadow and sum(e["plies_after"] for e in shadow):
+        tokens_per_ply = sum(e["tokens_after"] for e in shadow) / sum(e["plies_after"] for e in shadow)
+
+    summary = {
+        "shadow_games": len(shadow),
+        "shadow_plies_after_trigger": sum(e["plies_after"] for e in shadow),
+        "shadow_tokens_after_trigger": sum(e["tokens_after"] for e in shadow),
+        # Shadow games whose trigger was wrong: the side said to be lost did not lose
+        "shadow_disagreements": sum(1 for e in shadow if not agrees(e)),
+        "adjudicated_games": len(adjudicated),
+        "mean_plies_saved": round(mean_plies, 1) if mean_plies is not None else None,
+    }
+    if mean_plies is not None:
+        summary["estimated_plies_saved"] = round(mean_plies * len(adjudicated))
+        if tokens_per_ply:
+            summary["estimated_tokens_saved"] = round(mean_plies * len(adjudicated) * tokens_per_ply)
+    return summary
+
+
+def agrees(entry):
+    """True if the game ended the way the trigger said it would"""
+    if entry["decision"] == "draw":
+        return entry["winner"] == "draw"
+    return entry["winner"] in ("white", "black") and entry["winner"] != entry["loser"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="AI Battle adjudication savings report")
+    parser.add_argument("log", nargs="?", default="adjudications.jsonl")
+    args = parser.parse_args()
+    print(json.dumps(summarize(load_entries(args.log)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
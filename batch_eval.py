@@ -0,0 +1,351 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Batch Evaluation - AI Battle
+============================
+Offline move evaluation for a FEN corpus through the providers' batch APIs
+(Anthropic Message Batches, OpenAI Batch). The prompts are the ones the bots
+send during games; batches are polled in the background of the loop and the
+parsed moves are streamed back as soon as each batch has ended.
+
+Usage:
+    python batch_eval.py positions.fen --players claude gpt --output results.jsonl
+    python batch_eval.py positions.fen --resume claude=msgbatch_...   # reattach to a batch
+    python batch_eval.py positions.fen --candidates 3   # ranked moves, as with MOVE_CANDIDATES
+
+A stand-in batch server can be used with --base-url. --check-per-call sends
+every prompt again through the per-call path used in games and reports the
+positions where the two moves differ; with a deterministic server (see
+batch_stub.py) both paths must give the same moves.
+"""
+
+import argparse
+import json
+import sys
+import time
+
+import chess
+
+from move_prompt import build_move_prompt, parse_move_candidates, resolve_candidates, PROMPT_MODES
+from providers import build_providers
+
+# Batches that ended, one way or another
+OPENAI_FINAL_STATUSES = ("completed", "failed", "expired", "cancelled")
+
+
+def load_fen_corpus(path):
+    """Reads one FEN per line (blank lines and # comments are skipped)"""
+    fens = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith('#'):
+                fens.append(line)
+    return fens
+
+
+def build_requests(fens, mode="full", candidates=1):
+    """One prompt per position: [(custom_id, fen, prompt)]"""
+    requests = []
+    for index, fen in enumerate(fens):
+        color = 'white' if chess.Board(fen).turn == chess.WHITE else 'black'
+        requests.append((f"pos-{index:05d}", fen, build_move_prompt(fen, color, mode=mode, candidates=candidates)))
+    return requests
+
+
+class BatchJob:
+    """One batch of prompts sent to one provider/model"""
+
+    def __init__(self, player, provider, model, max_tokens, temperature):
+        self.player = player
+        self.provider = provider
+        self.model = model
+        self.max_tokens = max_tokens
+        self.temperature = temperature
+        self.batch_id = None
+
+    def submit(self, requests):
+        """Creates the batch. Returns its ID"""
+        raise NotImplementedError
+
+    def poll(self):
+        """True once the batch has ended"""
+        raise NotImplementedError
+
+    def results(self):
+        """Yields (custom_id, text, tokens, error) for every request"""
+        raise NotImplementedError
+
+
+class AnthropicBatchJob(BatchJob):
+    """Anthropic Message Batches API"""
+
+    def batches(self):
+        messages = self.provider.get_client().messages
+        # Older SDKs only expose batches under beta
+        if hasattr(messages, "batches"):
+            return messages.batches
+        return self.provider.get_client().beta.messages.batches
+
+    def submit(self, requests):
+        batch = self.batches().create(requests=[
+            {
+                "custom_id": custom_id,
+                "params": {
+                    "model": self.model,
+                    "max_tokens": self.max_tokens,
+                    "temperature": self.temperature,
+                    "messages": [{"role": "user", "content": prompt}],
+                },
+            }
+            for custom_id, fen, prompt in requests
+        ])
+        self.batch_id = batch.id
+        return self.batch_id
+
+    def poll(self):
+        return self.batches().retrieve(self.batch_id).processing_status == "ended"
+
+    def results(self):
+        for entry in self.batches().results(self.batch_id):
+            result = entry.result
+            if result.type != "succeeded":
+                error = getattr(getattr(result, "error", None), "error", None)
+                yield entry.custom_id, None, None, getattr(error, "message", None) or result.type
+                continue
+            message = result.message
+            yield (
+                entry.custom_id,
+                message.content[0].text.strip(),
+                (message.usage.input_tokens, message.usage.output_tokens),
+                None
+            )
+
+
+class OpenAIBatchJob(BatchJob):
+    """OpenAI Batch API (JSONL input file, polled, JSONL output file)"""
+
+    endpoint = "/v1/chat/completions"
+
+    def submit(self, requests):
+        client = self.provider.get_client()
+        lines = [
+            json.dumps({
+                "custom_id": custom_id,
+                "method": "POST",
+                "url": self.endpoint,
+                "body": {
+                    "model": self.model,
+                    "messages": [{"role": "user", "content": prompt}],
+                    "max_tokens": self.max_tokens,
+                    "temperature": self.temperature,
+                },
+            })
+            for custom_id, fen, prompt in requests
+        ]
+        input_file = client.files.create(
+            file=("moves.jsonl", "\n".join(lines).encode('utf-8')),
+            purpose="batch"
+        )
+        batch = client.batches.create(
+            input_file_id=input_file.id,
+            endpoint=self.endpoint,
+            completion_window="24h"
+        )
+        self.batch_id = batch.id
+        return self.batch_id
+
+    def poll(self):
+        self.batch = self.provider.get_client().batches.retrieve(self.batch_id)
+        return self.batch.status in OPENAI_FINAL_STATUSES
+
+    def results(self):
+        client = self.provider.get_client()
+        for file_id in (self.batch.output_file_id, self.batch.error_file_id):
+            if not file_id:
+                continue
+            for line in client.files.content(file_id).text.splitlines():
+                if line.strip():
+                    yield self.parse_line(json.loads(line))
+
+    @staticmethod
+    def parse_line(item):
+        """(custom_id, text, tokens, error) from one output/error file line"""
+        response = item.get("response") or {}
+        body = response.get("body") or {}
+        if item.get("error") or response.get("status_code") != 200:
+            error = item.get("error") or body.get("error") or {}
+            return item["custom_id"], None, None, error.get("message") or f"HTTP {response.get('status_code')}"
+        usage = body.get("usage") or {}
+        tokens = (usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0)) if usage else None
+        text = (body["choices"][0]["message"].get("content") or "").strip()
+        return item["custom_id"], text, tokens, None
+
+
+# Batch API of each provider type
+BATCH_JOB_TYPES = {
+    "anthropic": AnthropicBatchJob,
+    "openai": OpenAIBatchJob,
+    "openai_compatible": OpenAIBatchJob,
+}
+
+
+def create_batch_job(player, provider_configs, providers, player_models, max_tokens, temperature):
+    """Builds the batch job of a player from its provider/model config"""
+    config = player_models[player]
+    provider_type = provider_configs[config["provider"]]["type"]
+    if provider_type not in BATCH_JOB_TYPES:
+        raise ValueError(f"Provider type '{provider_type}' has no batch API")
+    return BATCH_JOB_TYPES[provider_type](
+        player, providers[config["provider"]], config["model"], max_tokens, temperature
+    )
+
+
+def evaluate_result(player, fen, custom_id, text, tokens, error, candidates=1):
+    """Parses one batch answer and checks the move against the position"""
+    moves, thought = parse_move_candidates(text, candidates) if text else ([], None)
+    # First legal candidate, UCI or SAN (compact prompts ask for SAN), as in the game loop
+    parsed, rejected = resolve_candidates(moves, chess.Board(fen), log=lambda *args: None)
+    return {
+        "player": player,
+        "id": custom_id,
+        "fen": fen,
+        "move": moves[len(rejected)] if parsed else (moves[0] if moves else None),
+        "candidates": moves,
+        "thought": thought,
+        "uci": parsed.uci() if parsed else None,
+        "legal": parsed is not None,
+        "tokens": tokens,
+        "error": error,
+    }
+
+
+def stream_results(jobs, requests, poll_interval=30.0, log=print, candidates=1):
+    """Polls every job and yields evaluated results as soon as its batch has ended"""
+    fens = {custom_id: fen for custom_id, fen, prompt in requests}
+    pending = list(jobs)
+    while pending:
+        for job in list(pending):
+            try:
+                ended = job.poll()
+            except Exception as e:
+                log(f"⚠️  {job.player} batch {job.batch_id} poll error: {e}")
+                continue
+            if not ended:
+                continue
+            pending.remove(job)
+            log(f"✅ {job.player} batch {job.batch_id} ended")
+            for custom_id, text, tokens, error in job.results():
+                if custom_id in fens:
+                    yield evaluate_result(job.player, fens[custom_id], custom_id, text, tokens, error, candidates)
+        if pending:
+            time.sleep(poll_interval)
+
+
+def check_per_call(jobs, requests, results, candidates=1, log=print):
+    """Sends every prompt again, one call at a time as in games, and returns the results whose move differs"""
+    prompts = {custom_id: prompt for custom_id, fen, prompt in requests}
+    jobs = {job.player: job for job in jobs}
+    mismatches = []
+    for result in results:
+        job = jobs[result["player"]]
+        try:
+            response = job.provider.complete(prompts[result["id"]], job.model, job.max_tokens, job.temperature)
+            text, error = response.text.strip(), None
+        except Exception as e:
+            text, error = None, str(e)
+        single = evaluate_result(job.player, result["fen"], result["id"], text, None, error, candidates)
+        if single["uci"] != result["uci"]:
+            mismatches.append({"player": job.player, "id": result["id"], "batch": result["uci"],
+                               "per_call": single["uci"], "error": error})
+    log(f"🔎 Per-call check: {len(results) - len(mismatches)}/{len(results)} moves identical")
+    return mismatches
+
+
+def summarize(results):
+    """Per-player counts: answers, legal moves, errors and tokens"""
+    summary = {}
+    for result in results:
+        stats = summary.setdefault(result["player"], {
+            "positions": 0, "legal": 0, "errors": 0, "input_tokens": 0, "output_tokens": 0
+        })
+        stats["positions"] += 1
+        stats["legal"] += result["legal"]
+        stats["errors"] += result["error"] is not None
+        if result["tokens"]:
+            stats["input_tokens"] += result["tokens"][0]
+            stats["output_tokens"] += result["tokens"][1]
+    for stats in summary.values():
+        stats["legal_rate"] = round(stats["legal"] / stats["positions"], 3) if stats["positions"] else None
+    return summary
+
+
+def main():
+    """Command line batch evaluation"""
+    from config_railway import (LLM_PROVIDERS, AI_PLAYER_MODELS, MOVE_MAX_TOKENS, MOVE_TEMPERATURE,
+                                PROMPT_MODE, MOVE_CANDIDATES)
+
+    parser = argparse.ArgumentParser(description="AI Battle offline batch evaluation")
+    parser.add_argument("corpus", help="FEN file, one position per line")
+    parser.add_argument("--players", nargs="+", default=list(AI_PLAYER_MODELS), choices=list(AI_PLAYER_MODELS))
+    parser.add_argument("--resume", nargs="*", default=[], metavar="PLAYER=BATCH_ID",
+                        help="Reattach to batches already submitted for this corpus")
+    parser.add_argument("--poll-interval", type=float, default=30.0)
+    parser.add_argument("--prompt-mode", default=PROMPT_MODE, choices=PROMPT_MODES)
+    parser.add_argument("--candidates", type=int, default=MOVE_CANDIDATES,
+                        help="Ranked moves asked per position, the first legal one counts (MOVE_CANDIDATES)")
+    parser.add_argument("--base-url", help="Send every batch call to this server (e.g. a local stand-in)")
+    parser.add_argument("--check-per-call", action="store_true",
+                        help="Send every prompt again one call at a time and compare the moves")
+    parser.add_argument("--output", help="Results file, JSON lines (stdout by default)")
+    args = parser.parse_args()
+    if args.candidates < 1:
+        parser.error("--candidates must be at least 1")
+
+    def log(message):
+        print(message, file=sys.stderr)
+
+    provider_configs = json.loads(json.dumps(LLM_PROVIDERS))
+    if args.base_url:
+        for config in provider_configs.values():
+            config["base_url"] = args.base_url
+    providers = build_providers(provider_configs)
+
+    requests = build_requests(load_fen_corpus(args.corpus), args.prompt_mode, args.candidates)
+    resume = dict(item.split("=", 1) for item in args.resume)
+    log(f"📋 {len(requests)} positions, players: {', '.join(args.players)}")
+
+    jobs = []
+    for player in args.players:
+        job = create_batch_job(player, provider_configs, providers, AI_PLAYER_MODELS,
+                               MOVE_MAX_TOKENS, MOVE_TEMPERATURE)
+        if player in resume:
+            job.batch_id = resume[player]
+            log(f"🔁 {player}: resuming batch {job.batch_id}")
+        else:
+            job.submit(requests)
+            log(f"📤 {player}: submitted batch {job.batch_id} ({job.model})")
+        jobs.append(job)
+
+    out = open(args.output, 'w', encoding='utf-8') if args.output else sys.stdout
+    results = []
+    try:
+        for result in stream_results(jobs, requests, args.poll_interval, log, args.candidates):
+            results.append(result)
+            out.write(json.dumps(result, ensure_ascii=False) + "\n")
+            out.flush()
+    finally:
+        if args.output:
+            out.close()
+
+    log(json.dumps(summarize(results), indent=2))
+    if args.check_per_call:
+        mismatches = check_per_call(jobs, requests, results, args.candidates, log)
+        for mismatch in mismatches:
+            log(json.dumps(mismatch, ensure_ascii=False))
+        if mismatches:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Batch Features - AI Battle
+==========================
+Position features for many boards at once, for analytics and prompt
+research. Boards are stacked into an (n, 2, 6) uint64 array of bitboards
+(color: white, black; piece type: pawn ... king) and every feature is
+computed with vectorized bitboard operations over the whole batch:
+- material: same values as move_prompt.calculate_material_score
+- attacked_pieces: same count as the threats of move_prompt.analyze_threats
+- hanging_pieces: attacked and not defended
+- mobility: squares attacked by each piece, own pieces excluded
+- in_check: king attacked
+
+board_features() computes the same features for one board with
+python-chess; --check compares both on the corpus.
+Needs numpy.
+
+Usage:
+    python batch_features.py archive/games.bin --output features.npz
+    python batch_features.py benchmark_positions.jsonl --check 2000
+"""
+
+import argparse
+import itertools
+import sys
+import time
+
+import chess
+import numpy as np
+
+from move_prompt import calculate_material_score, analyze_threats
+
+COLORS = (chess.WHITE, chess.BLACK)
+PIECE_VALUES = np.array([1, 3, 3, 5, 9, 0])
+
+FILE_A = np.uint64(chess.BB_FILE_A)
+FILE_B = np.uint64(chess.BB_FILE_B)
+FILE_G = np.uint64(chess.BB_FILE_G)
+FILE_H = np.uint64(chess.BB_FILE_H)
+NOT_A = ~FILE_A
+NOT_H = ~FILE_H
+NOT_AB = ~(FILE_A | FILE_B)
+NOT_GH = ~(FILE_G | FILE_H)
+ALL = ~np.uint64(0)
+
+# (shift, mask of the squares that can be reached without wrapping around the board)
+ROOK_DIRECTIONS = ((8, ALL), (-8, ALL), (1, NOT_A), (-1, NOT_H))
+BISHOP_DIRECTIONS = ((9, NOT_A), (7, NOT_H), (-7, NOT_A), (-9, NOT_H))
+KNIGHT_JUMPS = ((17, NOT_A), (15, NOT_H), (10, NOT_AB), (6, NOT_GH),
+                (-6, NOT_AB), (-10, NOT_GH), (-15, NOT_A), (-17, NOT_H))
+KING_STEPS = ROOK_DIRECTIONS + BISHOP_DIRECTIONS
+PAWN_CAPTURES = {chess.WHITE: ((9, NOT_A), (7, NOT_H)), chess.BLACK: ((-7, NOT_A), (-9, NOT_H))}
+
+
+BYTE_COUNTS = np.array([bin(byte).count("1") for byte in range(256)], dtype=np.int64)
+
+
+def popcount(bitboards):
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(bitboards).astype(np.int64)
+    # numpy < 2.0: table lookup on the 8 bytes of each bitboard
+    as_bytes = np.ascontiguousarray(bitboards).view(np.uint8).reshape(bitboards.shape + (8,))
+    return BYTE_COUNTS[as_bytes].sum(axis=-1)
+
+
+def shift(bitboards, step, mask):
+    if step > 0:
+        return (bitboards << np.uint64(step)) & mask
+    return (bitboards >> np.uint64(-step)) & mask
+
+
+def slide(sliders, empty, step, mask):
+    """Squares attacked along one direction, up to and including the first blocker"""
+    flood = sliders
+    for _ in range(6):
+        sliders = shift(sliders, step, mask) & empty
+        flood = flood | sliders
+    return shift(flood, step, mask)
+
+
+def stack_boards(boards):
+    """(bitboards (n, 2, 6) uint64, side to move (n,) bool: True for white)"""
+    boards = list(boards)
+    bitboards = np.array([
+        [[board.pieces_mask(piece_type, color) for piece_type in chess.PIECE_TYPES] for color in COLORS]
+        for board in boards
+    ], dtype=np.uint64).reshape(len(boards), 2, 6)
+    turns = np.array([board.turn for board in boards], dtype=bool)
+    return bitboards, turns
+
+
+def attack_sets(bitboards, side, occupied):
+    """Attacked squares of one side, one bitboard per piece and direction (each piece's targets
+    are disjoint within a direction, so popcounts add up to per-piece counts)"""
+    pieces = bitboards[:, side]
+    color = COLORS[side]
+    empty = ~occupied
+    rooks = pieces[:, chess.ROOK - 1] | pieces[:, chess.QUEEN - 1]
+    bishops = pieces[:, chess.BISHOP - 1] | pieces[:, chess.QUEEN - 1]
+
+    sets = [shift(pieces[:, chess.PAWN - 1], step, mask) for step, mask in PAWN_CAPTURES[color]]
+    sets += [shift(pieces[:, chess.KNIGHT - 1], step, mask) for step, mask in KNIGHT_JUMPS]
+    sets += [shift(pieces[:, chess.KING - 1], step, mask) for step, mask in KING_STEPS]
+    sets += [slide(rooks, empty, step, mask) for step, mask in ROOK_DIRECTIONS]
+    sets += [slide(bishops, empty, step, mask) for step, mask in BISHOP_DIRECTIONS]
+    return sets
+
+
+def batch_features(bitboards, turns=None):
+    """Features of every stacked board (arrays indexed [board] or [board, color])"""
+    by_color = np.bitwise_or.reduce(bitboards, axis=2)
+    occupied = by_color[:, 0] | by_color[:, 1]
+    counts = popcount(bitboards)
+
+    attacked = np.zeros(by_color.shape, dtype=np.uint64)
+    mobility = np.zeros(by_color.shape, dtype=np.int64)
+    for side in (0, 1):
+        for targets in attack_sets(bitboards, side, occupied):
+            attacked[:, side] |= targets
+            mobility[:, side] += popcount(targets & ~by_color[:, side])
+
+    # Pieces of each color attacked by the other one
+    threatened = by_color & attacked[:, ::-1]
+    features = {
+        "pieces": counts,
+        "material": (counts * PIECE_VALUES).sum(axis=2),
+        "mobility": mobility,
+        "attacked_pieces": popcount(threatened),
+        "hanging_pieces": popcount(threatened & ~attacked),
+        "in_check": (bitboards[:, :, chess.KING - 1] & attacked[:, ::-1]) != 0,
+    }
+    if turns is not None:
+        features["turn"] = turns
+    return features
+
+
+def board_features(board):
+    """Same features for one board, computed square by square with python-chess"""
+    features = {"pieces": [], "material": calculate_material_score(board), "mobility": [],
+                "attacked_pieces": [], "hanging_pieces": [], "in_check": []}
+    for color in COLORS:
+        opponent = not color
+        features["pieces"].append([len(board.pieces(piece_type, color)) for piece_type in chess.PIECE_TYPES])
+        features["mobility"].append(sum(len(board.attacks(square) & ~board.occupied_co[color])
+                                        for square in chess.SquareSet(board.occupied_co[color])))
+        features["attacked_pieces"].append(len(analyze_threats(board, chess.COLOR_NAMES[color])[0]))
+        features["hanging_pieces"].append(sum(
+            1 for square in chess.SquareSet(board.occupied_co[color])
+            if board.is_attacked_by(opponent, square) and not board.is_attacked_by(color, square)))
+        king = board.king(color)
+        features["in_check"].append(king is not None and board.is_attacked_by(opponent, king))
+    features["turn"] = board.turn
+    return features
+
+
+def archive_boards(path):
+    """Every position of the games in a binary archive"""
+    from binary_archive import BinaryArchive
+    with BinaryArchive(path) as archive:
+        for game in range(len(archive)):
+            board = chess.Board()
+            yield board.copy(stack=False)
+            for move in archive.moves(game):
+                board.push(move)
+                yield board.copy(stack=False)
+
+
+def load_boards(path, limit=None):
+    """Boards from a binary archive (.bin) or a FEN / benchmark corpus"""
+    if path.endswith('.bin'):
+        return list(itertools.islice(archive_boards(path), limit))
+    from prompt_tokens import load_positions
+    return [chess.Board(fen) for fen in load_positions(path)[:limit]]
+
+
+def check(boards, features, log=print):
+    """Compares the batch features with board_features. Returns the number of mismatching boards"""
+    mismatches = 0
+    for index, board in enumerate(boards):
+        expected = board_features(board)
+        for name, value in expected.items():
+            if not np.array_equal(np.asarray(value), features[name][index]):
+                mismatches += 1
+                log(f"❌ {board.fen()}: {name} {features[name][index].tolist()} != {value}")
+                break
+    return mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(description="AI Battle batch position features")
+    parser.add_argument("corpus", help="Binary archive (.bin), .fen file or benchmark corpus")
+    parser.add_argument("--limit", type=int, help="Only the first N positions")
+    parser.add_argument("--check", type=int, default=0, help="Compare N positions with the per-board features")
+    parser.add_argument("--output", help="Save the features as .npz")
+    args = parser.parse_args()
+
+    boards = load_boards(args.corpus, args.limit)
+    if not boards:
+        sys.exit("❌ No positions in corpus")
+
+    started = time.perf_counter()
+    bitboards, turns = stack_boards(boards)
+    stacked = time.perf_counter()
+    features = batch_features(bitboards, turns)
+    done = time.perf_counter()
+    print(f"📦 {len(boards)} positions stacked in {stacked - started:.2f}s, "
+          f"features in {done - stacked:.2f}s ({len(boards) / max(done - stacked, 1e-9):.0f} positions/s)")
+
+    if args.check:
+        sample = boards[:args.check]
+        started = time.perf_counter()
+        mismatches = check(sample, features)
+        elapsed = time.perf_counter() - started
+        print(f"🐢 Per-board features: {len(sample) / max(elapsed, 1e-9):.0f} positions/s")
+        print(f"{'✅' if not mismatches else '❌'} {len(sample) - mismatches}/{len(sample)} positions match")
+
+    if args.output:
+        np.savez_compressed(args.output, bitboards=bitboards, **features)
+        print(f"💾 Features saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Batch Stub - AI Battle
+======================
+Stand-in OpenAI-compatible server for checking batch_eval.py locally: it
+answers chat completions and the Batch API (files, batches, file content)
+with the same deterministic answer for the same prompt, picked among the
+legal moves listed in the prompt (as many as the prompt asks for).
+
+Usage:
+    python batch_stub.py --port 8100
+    LOCAL_LLM_BASE_URL=http://127.0.0.1:8100/v1 CLAUDE_PROVIDER=local GPT_PROVIDER=local \\
+        python batch_eval.py positions.fen --check-per-call
+"""
+
+import argparse
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Legal move lists of the full (UCI) and compact (SAN) prompts
+LEGAL_MOVES_PATTERNS = (
+    re.compile(r"ALL LEGAL MOVES[^\n]*\n([^\n]+)"),
+    re.compile(r"Legal moves \(SAN\): ([^\n]+)"),
+)
+CANDIDATES_PATTERN = re.compile(r"[Uu]p to (\d+)")
+
+
+def stub_answer(prompt):
+    """Thought line and ranked moves, the same for the same prompt"""
+    moves = []
+    for pattern in LEGAL_MOVES_PATTERNS:
+        match = pattern.search(prompt)
+        if match:
+            moves = [move for move in re.split(r"[\s,]+", match.group(1)) if move]
+            break
+    if not moves:
+        return "No legal move listed\nresign"
+    match = CANDIDATES_PATTERN.search(prompt)
+    count = min(int(match.group(1)) if match else 1, len(moves))
+    rng = random.Random(hashlib.sha256(prompt.encode("utf-8")).digest())
+    return "Stub move from the list\n" + " ".join(rng.sample(moves, count))
+
+
+def chat_completion(body):
+    """Chat completion response body for a request body"""
+    prompt = body["messages"][-1]["content"]
+    text = stub_answer(prompt)
+    return {
+        "id": "chatcmpl-stub",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "stub"),
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(text) // 4,
+                  "total_tokens": len(prompt) // 4 + len(text) // 4},
+    }
+
+
+class StubState:
+    """Uploaded files and batches (batches complete as soon as they are created)"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.files = {}
+        self.batches = {}
+
+    def add_file(self, content, filename="file.jsonl", purpose="batch"):
+        with self.lock:
+            file_id = f"file-stub{len(self.files) + 1}"
+            self.files[file_id] = content
+        return {"id": file_id, "object": "file", "bytes": len(content), "created_at": int(time.time()),
+                "filename": filename, "purpose": purpose, "status": "processed"}
+
+    def add_batch(self, request):
+        """Runs every line of the input file and stores the output file"""
+        lines = []
+        for line in self.files[request["input_file_id"]].decode("utf-8").splitlines():
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            lines.append(json.dumps({
+                "id": f"batch_req_{item['custom_id']}",
+                "custom_id": item["custom_id"],
+                "response": {"status_code": 200, "request_id": item["custom_id"], "body": chat_completion(item["body"])},
+                "error": None,
+            }))
+        output = self.add_file("\n".join(lines).encode("utf-8"), "output.jsonl", "batch_output")
+        now = int(time.time())
+        with self.lock:
+            batch_id = f"batch_stub{len(self.batches) + 1}"
+            self.batches[batch_id] = {
+                "id": batch_id, "object": "batch", "endpoint": request["endpoint"],
+                "input_file_id": request["input_file_id"], "completion_window": request["completion_window"],
+                "status": "completed", "output_file_id": output["id"], "error_file_id": None,
+                "created_at": now, "completed_at": now,
+                "request_counts": {"total": len(lines), "completed": len(lines), "failed": 0},
+            }
+            return self.batches[batch_id]
+
+
+class StubRequestHandler(BaseHTTPRequestHandler):
+    """OpenAI API routes used by the providers and batch_eval.py"""
+
+    state = None
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        path = self.path.split("?")[0].rstrip("/")
+        if path.endswith("/chat/completions"):
+            self.send_json(chat_completion(json.loads(body)))
+        elif path.endswith("/files"):
+            self.send_json(self.upload(body))
+        elif path.endswith("/batches"):
+            self.send_json(self.state.add_batch(json.loads(body)))
+        else:
+            self.send_json({"error": {"message": f"Unknown route {path}"}}, 404)
+
+    def do_GET(self):
+        path = self.path.split("?")[0].rstrip("/")
+        parts = path.split("/")
+        if "batches" in parts and parts[-1] in self.state.batches:
+            self.send_json(self.state.batches[parts[-1]])
+        elif parts[-1] == "content" and parts[-2] in self.state.files:
+            self.send_body(self.state.files[parts[-2]], "application/octet-stream")
+        else:
+            self.send_json({"error": {"message": f"Unknown route {path}"}}, 404)
+
+    def upload(self, body):
+        """Multipart file upload (purpose + file)"""
+        header = f"Content-Type: {self.headers['Content-Type']}\r\n\r\n".encode("latin-1")
+        fields = {}
+        filename = "file.jsonl"
+        for part in BytesParser(policy=HTTP).parsebytes(header + body).iter_parts():
+            name = part.get_param("name", header="content-disposition")
+            fields[name] = part.get_payload(decode=True)
+            if name == "file":
+                filename = part.get_filename() or filename
+        return self.state.add_file(fields["file"], filename, (fields.get("purpose") or b"batch").decode())
+
+    def send_json(self, data, status=200):
+        self.send_body(json.dumps(data).encode("utf-8"), "application/json", status)
+
+    def send_body(self, body, content_type, status=200):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def create_stub_server(host="127.0.0.1", port=8100):
+    """Creates the stub server with empty file and batch stores"""
+    handler = type("BoundStubRequestHandler", (StubRequestHandler,), {"state": StubState()})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="AI Battle stand-in OpenAI-compatible batch server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    args = parser.parse_args()
+
+    server = create_stub_server(args.host, args.port)
+    print(f"🧪 Batch stub listening on http://{args.host}:{args.port}/v1")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,324 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Position Benchmark - AI Battle
+==============================
+Plays a suite of positions with known good moves through the move agents
+(same prompt, parser, move validation and retry rules as in games) and
+reports per player:
+- first-try legality rate and retries needed to reach a legal move
+- match rate against the reference moves
+- p50/p95 LLM latency and tokens per position
+Several prompt modes can be compared in the same run (--prompt-modes).
+With --stream, responses are streamed and closed once a legal move is read;
+time to first token is reported next to the time to move.
+With --candidates 1 3, each answer holds up to K ranked moves (the first
+legal one is played): the report gives the extra round trips per game of
+each K and how many K saves against single-move answers.
+
+Usage:
+    python benchmark.py benchmark_positions.jsonl --output runs/haiku.json
+    python benchmark.py benchmark_positions.jsonl --baseline runs/haiku.json
+    python benchmark.py --prompt-modes full compact
+    python benchmark.py --candidates 1 3
+
+Corpus: JSON lines {"id", "fen", "best": [UCI moves]} or an EPD file with bm.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+
+import chess
+
+from metrics import LatencyStats, percentile
+from move_prompt import (build_move_prompt, parse_move_response, parse_move_candidates, resolve_candidates,
+                         PROMPT_MODES, MoveStreamParser)
+from providers import build_providers
+
+# Metrics shown when comparing two runs
+COMPARED_METRICS = ("first_try_legal_rate", "legal_rate", "match_rate", "avg_retries",
+                    "latency_p50_ms", "latency_p95_ms", "tokens_per_position", "extra_round_trips_per_game")
+
+
+def load_corpus(path):
+    """Reads the position suite: [{"id", "fen", "best": [uci, ...]}]"""
+    positions = []
+    with open(path, encoding='utf-8') as f:
+        for number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            if path.endswith('.epd'):
+                board, ops = chess.Board.from_epd(line)
+                positions.append({
+                    "id": ops.get("id") or f"line-{number}",
+                    "fen": board.fen(),
+                    "best": [move.uci() for move in ops.get("bm", [])],
+                })
+            else:
+                item = json.loads(line)
+                item.setdefault("id", f"line-{number}")
+                positions.append(item)
+    return positions
+
+
+def quiet(*args, **kwargs):
+    """Log function that drops the move validation debug output"""
+
+
+def solve_position(provider, model, position, max_retries, max_tokens, temperature, mode="full",
+                   stream=False, candidates=1):
+    """Asks for a move until it is legal (or retries run out), like a game turn"""
+    board = chess.Board(position["fen"])
+    color = 'white' if board.turn == chess.WHITE else 'black'
+    invalid_moves = []
+    latencies = []
+    ttfts = []
+    early_closes = 0
+    tokens = [0, 0]
+    errors = 0
+    move = None
+    thought = None
+    attempts = 0
+    skipped = 0
+
+    for attempt in range(max_retries):
+        attempts = attempt + 1
+        prompt = build_move_prompt(position["fen"], color, invalid_moves, mode=mode, candidates=candidates)
+        parser = MoveStreamParser(board, candidates) if stream else None
+        try:
+            if parser:
+                response = provider.complete_stream(prompt, model, max_tokens=max_tokens,
+                                                    temperature=temperature, stop=parser.feed)
+            else:
+                response = provider.complete(prompt, model, max_tokens=max_tokens, temperature=temperature)
+        except Exception:
+            errors += 1
+            continue
+        latencies.append(response.latency)
+        if response.ttft is not None:
+            ttfts.append(response.ttft)
+        early_closes += response.stopped_early
+        if response.tokens:
+            tokens[0] += response.tokens[0]
+            tokens[1] += response.tokens[1]
+
+        if candidates > 1:
+            moves, thought = parser.result() if parser else parse_move_candidates(response.text, candidates)
+        else:
+            move_str, thought = parser.result() if parser else parse_move_response(response.text)
+            moves = [move_str] if move_str else []
+        if not moves:
+            continue
+        move, rejected = resolve_candidates(moves, board, log=quiet)
+        invalid_moves.extend(rejected)
+        if move:
+            # Illegal candidates skipped in the answer that was played: retries a single move would need
+            skipped = len(rejected)
+            break
+
+    best = position.get("best") or []
+    return {
+        "id": position["id"],
+        "fen": position["fen"],
+        "move": move.uci() if move else None,
+        "thought": thought if move else None,
+        "legal": move is not None,
+        "first_try_legal": move is not None and attempts == 1,
+        "attempts": attempts,
+        "retries": attempts - 1 if move else None,
+        "match": bool(move) and move.uci() in best,
+        "best": best,
+        "latencies": [round(latency, 3) for latency in latencies],
+        "ttfts": [round(ttft, 3) for ttft in ttfts],
+        "early_closes": early_closes,
+        "candidates": candidates,
+        "skipped_candidates": skipped,
+        "input_tokens": tokens[0],
+        "output_tokens": tokens[1],
+        "errors": errors,
+    }
+
+
+def summarize(results, game_plies=80):
+    """Aggregated metrics of one player's results (game_plies: both sides' moves in a typical game)"""
+    count = len(results)
+    legal = [r for r in results if r["legal"]]
+    latency = LatencyStats()
+    for result in results:
+        for value in result["latencies"]:
+            latency.add(value)
+    calls = latency.summary()
+    ttft = LatencyStats()
+    for result in results:
+        for value in result.get("ttfts", []):
+            ttft.add(value)
+    first_token = ttft.summary()
+    tokens = [r["input_tokens"] + r["output_tokens"] for r in results]
+
+    def rate(n):
+        return round(n / count, 3) if count else None
+
+    calls_per_position = sum(r["attempts"] for r in results) / count if count else None
+
+    return {
+        "positions": count,
+        "first_try_legal_rate": rate(sum(r["first_try_legal"] for r in results)),
+        "legal_rate": rate(len(legal)),
+        "match_rate": rate(sum(r["match"] for r in results)),
+        "avg_retries": round(sum(r["retries"] for r in legal) / len(legal), 2) if legal else None,
+        "max_retries": max((r["retries"] for r in legal), default=None),
+        "calls": calls["count"],
+        "api_errors": sum(r["errors"] for r in results),
+        "latency_p50_ms": calls["p50_ms"],
+        "latency_p95_ms": calls["p95_ms"],
+        "ttft_p50_ms": first_token["p50_ms"],
+        "ttft_p95_ms": first_token["p95_ms"],
+        "early_closes": sum(r.get("early_closes", 0) for r in results),
+        "calls_per_position": round(calls_per_position, 3) if count else None,
+        # Calls beyond the first for each of this player's moves, over one game
+        "extra_round_trips_per_game": round((calls_per_position - 1) * game_plies / 2, 2) if count else None,
+        "skipped_candidates": sum(r.get("skipped_candidates", 0) for r in results),
+        "tokens_per_position": round(sum(tokens) / count, 1) if count else None,
+        "tokens_per_position_p95": round(percentile(tokens, 95), 1) if tokens else None,
+        "input_tokens": sum(r["input_tokens"] for r in results),
+        "output_tokens": sum(r["output_tokens"] for r in results),
+    }
+
+
+def variant_name(player, mode, candidates=1):
+    """Results key of a variant: "player/mode", with "/kK" for K candidates"""
+    return f"{player}/{mode}" if candidates == 1 else f"{player}/{mode}/k{candidates}"
+
+
+def run_benchmark(positions, players, providers, max_retries, max_tokens, temperature, workers=4,
+                  modes=("full",), stream=False, candidates=(1,), log=print):
+    """Runs every player, prompt mode and candidate count on every position. Returns {variant: [result, ...]}"""
+    variants = [(player, mode, k) for player in players for mode in modes for k in candidates]
+    results = {variant_name(*variant): [None] * len(positions) for variant in variants}
+    total = len(variants) * len(positions)
+
+    def task(player, mode, k, index):
+        config = players[player]
+        return variant_name(player, mode, k), index, solve_position(
+            providers[config["provider"]], config["model"], positions[index], max_retries, max_tokens,
+            temperature, mode, stream, k)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(task, player, mode, k, index)
+                   for player, mode, k in variants for index in range(len(positions))]
+        for done, future in enumerate(as_completed(futures), 1):
+            variant, index, result = future.result()
+            results[variant][index] = result
+            mark = "✅" if result["match"] else ("☑️ " if result["legal"] else "❌")
+            log(f"{mark} [{done}/{total}] {variant} {result['id']}: {result['move']} "
+                f"(attempts {result['attempts']})")
+    return results
+
+
+def compare_candidates(summary, log=print):
+    """Adds the round trips per game saved by each K against single-move answers"""
+    for variant, stats in summary.items():
+        base_name, _, k = variant.rpartition("/k")
+        base = summary.get(base_name) if k.isdigit() else None
+        if not base or stats["extra_round_trips_per_game"] is None or base["extra_round_trips_per_game"] is None:
+            continue
+        saved = round(base["extra_round_trips_per_game"] - stats["extra_round_trips_per_game"], 2)
+        stats["round_trips_saved_per_game"] = saved
+        log(f"🎯 {variant}: {stats['extra_round_trips_per_game']} extra round trips per game "
+            f"vs {base['extra_round_trips_per_game']} with one move ({saved:+} saved)")
+
+
+def compare_summaries(baseline, current, log=print):
+    """Prints metric deltas between a previous run and this one"""
+    for player, summary in current.items():
+        previous = baseline.get(player)
+        if not previous:
+            continue
+        log(f"\n📊 {player} vs baseline")
+        for metric in COMPARED_METRICS:
+            old, new = previous.get(metric), summary.get(metric)
+            if old is None or new is None:
+                continue
+            log(f"   {metric:<22} {old:>10} → {new:<10} ({new - old:+.3f})")
+
+
+def main():
+    """Command line benchmark"""
+    from config_railway import (LLM_PROVIDERS, AI_PLAYER_MODELS, MOVE_MAX_TOKENS,
+                                MOVE_TEMPERATURE, PROMPT_MODE)
+
+    parser = argparse.ArgumentParser(description="AI Battle position benchmark")
+    parser.add_argument("corpus", nargs="?", default="benchmark_positions.jsonl")
+    parser.add_argument("--players", nargs="+", default=list(AI_PLAYER_MODELS), choices=list(AI_PLAYER_MODELS))
+    parser.add_argument("--workers", type=int, default=4, help="Positions evaluated in parallel")
+    parser.add_argument("--max-retries", type=int, default=5, help="Attempts per position")
+    parser.add_argument("--prompt-modes", nargs="+", default=[PROMPT_MODE], choices=PROMPT_MODES,
+                        help="Prompt modes to compare")
+    parser.add_argument("--stream", action="store_true", help="Stream responses and stop at the first legal move")
+    parser.add_argument("--candidates", nargs="+", type=int, default=[1],
+                        help="Ranked moves per answer to compare (1 = single move)")
+    parser.add_argument("--game-plies", type=int, default=80, help="Plies of a typical game, for per-game figures")
+    parser.add_argument("--limit", type=int, help="Only the first N positions")
+    parser.add_argument("--output", help="Results file (JSON)")
+    parser.add_argument("--baseline", help="Previous results file to compare against")
+    args = parser.parse_args()
+
+    def log(message):
+        print(message, file=sys.stderr)
+
+    positions = load_corpus(args.corpus)[:args.limit]
+    players = {player: AI_PLAYER_MODELS[player] for player in args.players}
+    providers = build_providers(LLM_PROVIDERS)
+    log(f"📋 {len(positions)} positions, players: "
+        + ", ".join(f"{p} ({c['model']})" for p, c in players.items()))
+
+    started = time.time()
+    results = run_benchmark(positions, players, providers, args.max_retries,
+                            MOVE_MAX_TOKENS, MOVE_TEMPERATURE, args.workers, args.prompt_modes,
+                            args.stream, args.candidates, log)
+    summary = {variant: summarize(variant_results, args.game_plies) for variant, variant_results in results.items()}
+    compare_candidates(summary, log)
+
+    report = {
+        "run": {
+            "date": datetime.now().isoformat(timespec='seconds'),
+            "corpus": args.corpus,
+            "positions": len(positions),
+            "players": players,
+            "max_retries": args.max_retries,
+            "prompt_modes": args.prompt_modes,
+            "stream": args.stream,
+            "candidates": args.candidates,
+            "game_plies": args.game_plies,
+            "max_tokens": MOVE_MAX_TOKENS,
+            "temperature": MOVE_TEMPERATURE,
+            "workers": args.workers,
+            "duration_s": round(time.time() - started, 1),
+        },
+        "summary": summary,
+        "results": results,
+    }
+
+    log(json.dumps(summary, indent=2))
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            compare_summaries(json.load(f)["summary"], summary, log)
+
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text)
+        log(f"💾 Results saved to {args.output}")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,417 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Binary Archive - AI Battle
+==========================
+Compact append-only archive of played games, for analysis at scale.
+
+games.bin: 8-byte file header (magic, format version), then one record per
+game: a fixed-size game header followed by one 16-bit little-endian word
+per ply (from square | to square << 6 | promotion piece type << 12).
+games.idx: 8-byte file header, then one (record offset, first ply) pair of
+64-bit words per game. The first ply is the global index of the game's
+first ply, so any ply of the archive can be found with a binary search.
+
+Format 1 cut model names at 24 bytes (format 2: 64). Format 1 archives are
+still read, and converted in place (old files kept aside) before the first
+append.
+
+The record is written before its index entry: a reader never sees a game
+that is not fully on disk, and a crash between the two only leaves
+unreachable bytes at the end of games.bin.
+
+Usage:
+    python binary_archive.py from-pgn archive/games_*.pgn --output archive/games.bin
+    python binary_archive.py to-pgn archive/games.bin > games.pgn
+    python binary_archive.py bench archive/games_*.pgn
+"""
+
+import argparse
+import bisect
+import mmap
+import os
+import random
+import struct
+import sys
+import tempfile
+import time
+from array import array
+from datetime import datetime
+
+import chess
+import chess.pgn
+
+DATA_MAGIC = b"AIBG"
+INDEX_MAGIC = b"AIBI\x01\x00\x00\x00"
+FORMAT_VERSION = 2
+
+# game_id, date (YYYYMMDD), plies, result, reserved, white model, black model (by format version)
+GAME_HEADERS = {
+    1: struct.Struct("<12sIHBB24s24s"),
+    2: struct.Struct("<12sIHBB64s64s"),
+}
+GAME_HEADER = GAME_HEADERS[FORMAT_VERSION]
+GAME_ID_SIZE = 12
+MODEL_SIZE = 64
+INDEX_ENTRY = struct.Struct("<QQ")
+
+RESULTS = ("*", "1-0", "0-1", "1/2-1/2")
+
+
+def encode_move(move):
+    """16-bit word of a move: from | to << 6 | promotion << 12"""
+    return move.from_square | (move.to_square << 6) | ((move.promotion or 0) << 12)
+
+
+def decode_move(word):
+    return chess.Move(word & 63, (word >> 6) & 63, (word >> 12) & 7 or None)
+
+
+def as_words(buffer, code):
+    """Little-endian integer view of a buffer (zero-copy on little-endian hosts)"""
+    if sys.byteorder == "little":
+        return memoryview(buffer).cast(code)
+    words = array(code, bytes(buffer))
+    words.byteswap()
+    return words
+
+
+def data_header(version=FORMAT_VERSION):
+    return DATA_MAGIC + bytes([version, 0, 0, 0])
+
+
+def read_version(path):
+    """Format version of an existing games.bin (None if missing or empty)"""
+    if not os.path.isfile(path) or os.path.getsize(path) == 0:
+        return None
+    with open(path, "rb") as f:
+        header = f.read(len(DATA_MAGIC) + 1)
+    if header[:len(DATA_MAGIC)] != DATA_MAGIC or len(header) <= len(DATA_MAGIC):
+        raise ValueError(f"{path} is not an AI Battle archive")
+    return header[len(DATA_MAGIC)]
+
+
+def text_field(value, size, name="field", log=print):
+    """UTF-8 bytes of a header field; longer values are cut (on a character boundary) with a warning"""
+    encoded = (value or "").encode("utf-8")
+    if len(encoded) <= size:
+        return encoded
+    cut = encoded[:size].decode("utf-8", "ignore")
+    log(f"⚠️  Binary archive: {name} '{value}' cut to '{cut}' ({size} bytes)")
+    return cut.encode("utf-8")
+
+
+def upgrade_archive(path, log=print):
+    """Rewrites an older format archive in the current format; the old files are kept as *.v<N>.*"""
+    version = read_version(path)
+    base, extension = os.path.splitext(path)
+    index_path = base + ".idx"
+    temp_path = f"{base}.upgrade{extension}"
+    temp_index = f"{base}.upgrade.idx"
+    for stale in (temp_path, temp_index):
+        if os.path.exists(stale):
+            os.remove(stale)
+    with BinaryArchive(path) as archive, BinaryArchiveWriter(temp_path, log=log) as writer:
+        for game in range(len(archive)):
+            header = archive.header(game)
+            writer.append(header["game_id"], archive.moves(game), header["result"],
+                          datetime.strptime(header["date"], "%Y-%m-%d"),
+                          header["white_model"], header["black_model"])
+        count = len(archive)
+    os.replace(path, f"{base}.v{version}{extension}")
+    if os.path.exists(index_path):
+        os.replace(index_path, f"{base}.v{version}.idx")
+    os.replace(temp_index, index_path)
+    os.replace(temp_path, path)
+    log(f"📦 Binary archive upgraded to format {FORMAT_VERSION} ({count} games, "
+        f"format {version} files kept as {base}.v{version}.*)")
+
+
+class BinaryArchiveWriter:
+    """Appends finished games to games.bin and games.idx"""
+
+    def __init__(self, path, log=print):
+        self.path = path
+        self.log = log
+        self.index_path = os.path.splitext(path)[0] + ".idx"
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        version = read_version(path)
+        if version is not None and version != FORMAT_VERSION:
+            if version > FORMAT_VERSION:
+                raise ValueError(f"{path} has format {version}, newer than this version ({FORMAT_VERSION})")
+            upgrade_archive(path, log)
+        self.data = open(path, "ab")
+        self.index = open(self.index_path, "ab")
+        if self.data.tell() == 0:
+            self.data.write(data_header())
+        if self.index.tell() == 0:
+            self.index.write(INDEX_MAGIC)
+        # Plies already archived: read from the last index entry
+        self.total_plies = 0
+        if self.index.tell() > len(INDEX_MAGIC):
+            with open(path, "rb") as data, open(self.index_path, "rb") as index:
+                index.seek(-INDEX_ENTRY.size, os.SEEK_END)
+                offset, first_ply = INDEX_ENTRY.unpack(index.read(INDEX_ENTRY.size))
+                data.seek(offset)
+                self.total_plies = first_ply + GAME_HEADER.unpack(data.read(GAME_HEADER.size))[2]
+
+    def append(self, game_id, moves, result="*", date=None, white_model=None, black_model=None):
+        """Archives one game (moves: chess.Move objects or UCI strings). Returns its index"""
+        words = array("H", (encode_move(chess.Move.from_uci(m) if isinstance(m, str) else m) for m in moves))
+        if sys.byteorder != "little":
+            words.byteswap()
+        day = int((date or datetime.now()).strftime("%Y%m%d"))
+        header = GAME_HEADER.pack(text_field(game_id, GAME_ID_SIZE, "game id", self.log), day, len(words),
+                                  RESULTS.index(result) if result in RESULTS else 0, 0,
+                                  text_field(white_model, MODEL_SIZE, "white model", self.log),
+                                  text_field(black_model, MODEL_SIZE, "black model", self.log))
+
+        self.data.seek(0, os.SEEK_END)
+        offset = self.data.tell()
+        self.data.write(header)
+        self.data.write(words.tobytes())
+        self.data.flush()
+        self.index.write(INDEX_ENTRY.pack(offset, self.total_plies))
+        self.index.flush()
+        self.total_plies += len(words)
+        return self.index.tell() // INDEX_ENTRY.size - 1
+
+    def close(self):
+        self.data.close()
+        self.index.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class BinaryArchive:
+    """Memory-mapped reader: games and plies by index, without parsing any text"""
+
+    def __init__(self, path):
+        self.path = path
+        self.maps = []
+        version = read_version(path)
+        if version is not None and version not in GAME_HEADERS:
+            raise ValueError(f"{path} has unsupported format {version}")
+        self.game_header = GAME_HEADERS[version or FORMAT_VERSION]
+        data = self.map_file(path, DATA_MAGIC)
+        index = self.map_file(os.path.splitext(path)[0] + ".idx", INDEX_MAGIC)
+        self.data = memoryview(data) if data is not None else memoryview(b"")
+        if index is not None:
+            # Read in place, and only whole entries: the writer may be appending one right now
+            size = (len(index) - len(INDEX_MAGIC)) // INDEX_ENTRY.size * INDEX_ENTRY.size
+            entries = as_words(memoryview(index)[len(INDEX_MAGIC):len(INDEX_MAGIC) + size], "Q")
+        else:
+            entries = array("Q")
+        count = len(entries) // 2
+        self.offsets = entries[0:2 * count:2]
+        self.first_plies = entries[1:2 * count:2]
+        self.total_plies = self.first_plies[-1] + self.header_fields(count - 1)[2] if count else 0
+
+    def map_file(self, path, magic):
+        """Maps a whole file read-only (None if missing or empty)"""
+        if not os.path.isfile(path) or os.path.getsize(path) <= len(magic):
+            return None
+        with open(path, "rb") as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if mapped[:len(magic)] != magic:
+            mapped.close()
+            raise ValueError(f"{path} is not an AI Battle archive")
+        self.maps.append(mapped)
+        return mapped
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def header_fields(self, game):
+        return self.game_header.unpack_from(self.data, self.offsets[game])
+
+    def header(self, game):
+        """Game header as a dict"""
+        game_id, day, plies, result, _, white, black = self.header_fields(game)
+        return {
+            "game_id": game_id.rstrip(b"\0").decode("utf-8", "replace"),
+            "date": f"{day // 10000:04d}-{day // 100 % 100:02d}-{day % 100:02d}",
+            "plies": plies,
+            "result": RESULTS[result] if result < len(RESULTS) else "*",
+            "white_model": white.rstrip(b"\0").decode("utf-8", "replace"),
+            "black_model": black.rstrip(b"\0").decode("utf-8", "replace"),
+        }
+
+    def words(self, game):
+        """Ply words of a game (a view into the mapped file)"""
+        start = self.offsets[game] + self.game_header.size
+        return as_words(self.data[start:start + 2 * self.header_fields(game)[2]], "H")
+
+    def moves(self, game):
+        return [decode_move(word) for word in self.words(game)]
+
+    def __iter__(self):
+        """Yields (header, moves) for every game"""
+        for game in range(len(self)):
+            yield self.header(game), self.moves(game)
+
+    def ply(self, number):
+        """Global ply number -> (game index, ply in game, move)"""
+        if not 0 <= number < self.total_plies:
+            raise IndexError(number)
+        # Last game starting at or before this ply (empty games before it share its first ply)
+        game = bisect.bisect_right(self.first_plies, number) - 1
+        ply = number - self.first_plies[game]
+        start = self.offsets[game] + self.game_header.size + 2 * ply
+        return game, ply, decode_move(int.from_bytes(self.data[start:start + 2], "little"))
+
+    def close(self):
+        self.offsets = self.first_plies = array("Q")
+        self.data.release()
+        for mapped in self.maps:
+            try:
+                mapped.close()
+            except BufferError:
+                # A caller still holds a view of the file: the map closes when it is dropped
+                pass
+        self.maps = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def pgn_to_binary(pgn_paths, output, log=print):
+    """Appends every game of the PGN files to a binary archive. Returns the game count"""
+    count = 0
+    with BinaryArchiveWriter(output, log=log) as writer:
+        for path in pgn_paths:
+            with open(path, encoding="utf-8") as handle:
+                while True:
+                    game = chess.pgn.read_game(handle)
+                    if game is None:
+                        break
+                    headers = game.headers
+                    try:
+                        date = datetime.strptime(headers.get("Date", ""), "%Y.%m.%d")
+                    except ValueError:
+                        date = datetime(1970, 1, 1)
+                    game_id = headers.get("Site", "").rstrip("/").rsplit("/", 1)[-1]
+                    writer.append(game_id, game.mainline_moves(), headers.get("Result", "*"), date,
+                                  headers.get("WhiteModel"), headers.get("BlackModel"))
+                    count += 1
+    log(f"✅ {count} games written to {output}")
+    return count
+
+
+def binary_to_pgn(archive, out):
+    """Writes every archived game as PGN. Returns the game count"""
+    exporter = chess.pgn.FileExporter(out)
+    count = 0
+    for header, moves in archive:
+        game = chess.pgn.Game()
+        game.headers["Event"] = "AI Battle - Claude vs GPT"
+        game.headers["Site"] = f"https://lichess.org/{header['game_id']}"
+        game.headers["Date"] = header["date"].replace("-", ".")
+        game.headers["Result"] = header["result"]
+        game.headers["WhiteModel"] = header["white_model"]
+        game.headers["BlackModel"] = header["black_model"]
+        game.add_line(moves)
+        game.accept(exporter)
+        count += 1
+    return count
+
+
+def benchmark(pgn_paths, samples=100000, log=print):
+    """Times reading the same games from PGN and from the binary archive"""
+    started = time.perf_counter()
+    pgn_plies = 0
+    for path in pgn_paths:
+        with open(path, encoding="utf-8") as handle:
+            while True:
+                game = chess.pgn.read_game(handle)
+                if game is None:
+                    break
+                pgn_plies += sum(1 for _ in game.mainline_moves())
+    pgn_time = time.perf_counter() - started
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "games.bin")
+        pgn_to_binary(pgn_paths, path, log=lambda message: None)
+        pgn_bytes = sum(os.path.getsize(p) for p in pgn_paths)
+        binary_bytes = os.path.getsize(path) + os.path.getsize(os.path.splitext(path)[0] + ".idx")
+
+        with BinaryArchive(path) as archive:
+            games = len(archive)
+            started = time.perf_counter()
+            binary_plies = sum(len(moves) for _, moves in archive)
+            decode_time = time.perf_counter() - started
+
+            started = time.perf_counter()
+            words = sum(len(archive.words(game)) for game in range(len(archive)))
+            scan_time = time.perf_counter() - started
+
+            lookups = [random.randrange(archive.total_plies) for _ in range(samples)] if archive.total_plies else []
+            started = time.perf_counter()
+            for number in lookups:
+                archive.ply(number)
+            random_time = time.perf_counter() - started
+
+    def rate(count, seconds):
+        return round(count / seconds) if seconds else None
+
+    report = {
+        "games": games,
+        "plies": binary_plies,
+        "pgn_bytes": pgn_bytes,
+        "binary_bytes": binary_bytes,
+        "pgn_plies_per_s": rate(pgn_plies, pgn_time),
+        "binary_moves_per_s": rate(binary_plies, decode_time),
+        "binary_words_per_s": rate(words, scan_time),
+        "random_plies_per_s": rate(len(lookups), random_time),
+    }
+    log(f"📦 {report['games']} games, {report['plies']} plies: PGN {pgn_bytes} bytes, binary {binary_bytes} bytes")
+    log(f"🐢 PGN parsing      : {report['pgn_plies_per_s']} plies/s")
+    log(f"⚡ Binary (moves)   : {report['binary_moves_per_s']} plies/s")
+    log(f"⚡ Binary (words)   : {report['binary_words_per_s']} plies/s")
+    log(f"🎯 Random access    : {report['random_plies_per_s']} plies/s")
+    return report
+
+
+def main():
+    """Command line converters and benchmark"""
+    parser = argparse.ArgumentParser(description="AI Battle binary game archive")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    from_pgn = sub.add_parser("from-pgn", help="Append PGN games to a binary archive")
+    from_pgn.add_argument("pgn", nargs="+")
+    from_pgn.add_argument("--output", default=os.path.join(os.environ.get('PGN_ARCHIVE_DIR', 'archive'), "games.bin"))
+
+    to_pgn = sub.add_parser("to-pgn", help="Export a binary archive as PGN")
+    to_pgn.add_argument("archive")
+    to_pgn.add_argument("--output", help="Output file (stdout by default)")
+
+    bench = sub.add_parser("bench", help="Compare reading games from PGN and from the binary archive")
+    bench.add_argument("pgn", nargs="+")
+    bench.add_argument("--samples", type=int, default=100000, help="Random ply lookups")
+
+    args = parser.parse_args()
+
+    if args.command == "from-pgn":
+        pgn_to_binary(args.pgn, args.output)
+    elif args.command == "to-pgn":
+        out = open(args.output, 'w', encoding='utf-8') if args.output else sys.stdout
+        try:
+            with BinaryArchive(args.archive) as archive:
+                count = binary_to_pgn(archive, out)
+            print(f"✅ Exported {count} games", file=sys.stderr)
+        finally:
+            if args.output:
+                out.close()
+    else:
+        benchmark(args.pgn, args.samples)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Budget - AI Battle
+==================
+Token and cost accounting of every LLM call, per game and over the last
+hour, with a governor that degrades play as spending nears the limits:
+- compact: compact prompts
+- lean: compact prompts and a lower max_tokens
+- cheap: the same, on a cheaper model (if one is configured)
+- fallback: local heuristic moves, no API calls
+
+The level follows the highest share of any limit used (game tokens, game
+cost, hour tokens, hour cost): it goes back down when a new game starts
+or older calls leave the hour window.
+"""
+
+import threading
+import time
+from collections import deque
+
+LEVELS = ("normal", "compact", "lean", "cheap", "fallback")
+NORMAL, COMPACT, LEAN, CHEAP, FALLBACK = range(len(LEVELS))
+# Share of a limit at which each degraded level starts (one per level after normal)
+DEFAULT_THRESHOLDS = (0.6, 0.75, 0.9, 1.0)
+
+# USD per million tokens (input, output), matched on the longest model name prefix
+PRICES = {
+    "claude-opus-4": (15.0, 75.0),
+    "claude-sonnet-4": (3.0, 15.0),
+    "claude-3-7-sonnet": (3.0, 15.0),
+    "claude-3-5-sonnet": (3.0, 15.0),
+    "claude-haiku-4-5": (1.0, 5.0),
+    "claude-3-5-haiku": (0.8, 4.0),
+    "claude-3-haiku": (0.25, 1.25),
+    "gpt-4o-mini": (0.15, 0.6),
+    "gpt-4o": (2.5, 10.0),
+    "gpt-4.1-nano": (0.1, 0.4),
+    "gpt-4.1-mini": (0.4, 1.6),
+    "gpt-4.1": (2.0, 8.0),
+    "o4-mini": (1.1, 4.4),
+}
+
+HOUR = 3600.0
+
+
+def model_price(model, prices=PRICES):
+    """(input, output) USD per million tokens, None for unknown (e.g. local) models"""
+    matches = [name for name in prices if model.startswith(name)]
+    return prices[max(matches, key=len)] if matches else None
+
+
+def call_cost(model, tokens, prices=PRICES):
+    """USD cost of one call from its (input, output) token counts"""
+    price = model_price(model, prices)
+    if not price or not tokens:
+        return 0.0
+    return (tokens[0] * price[0] + tokens[1] * price[1]) / 1e6
+
+
+class BudgetGovernor:
+    """Spend accounting and the degradation level it calls for"""
+
+    def __init__(self, game_tokens=0, game_usd=0.0, hour_tokens=0, hour_usd=0.0,
+                 thresholds=DEFAULT_THRESHOLDS, prices=None, game_plies=80, log=print):
+        # Limits (0: no limit) and the share of a limit at which each degraded level starts
+        self.limits = {"game_tokens": game_tokens, "game_usd": game_usd,
+                       "hour_tokens": hour_tokens, "hour_usd": hour_usd}
+        thresholds = tuple(sorted(thresholds))
+        if len(thresholds) != len(LEVELS) - 1:
+            log(f"⚠️  Budget: {len(LEVELS) - 1} thresholds expected, got {len(thresholds)}, "
+                f"using {','.join(map(str, DEFAULT_THRESHOLDS))}")
+            thresholds = DEFAULT_THRESHOLDS
+        self.thresholds = thresholds
+        self.prices = {**PRICES, **(prices or {})}
+        self.game_plies = game_plies
+        self.log = log
+        self.lock = threading.Lock()
+        self.started = time.monotonic()
+        self.window = deque()  # (time, tokens, cost) of the calls of the last hour
+        self.total_tokens = 0
+        self.total_usd = 0.0
+        self.unpriced = set()
+        self.finished_games = 0
+        self.finished_usd = 0.0
+        self.current_level = 0
+        self.reset_game()
+
+    def reset_game(self):
+        self.game_calls = 0
+        self.game_tokens = 0
+        self.game_usd = 0.0
+
+    def start_game(self):
+        """Closes the accounting of the previous game (if it made calls) and starts a new one"""
+        with self.lock:
+            if self.game_calls:
+                self.finished_games += 1
+                self.finished_usd += self.game_usd
+            self.reset_game()
+        self.level()
+
+    def record(self, model, tokens):
+        """Accounts one call. Returns its cost in USD"""
+        cost = call_cost(model, tokens, self.prices)
+        count = sum(tokens) if tokens else 0
+        with self.lock:
+            if tokens and model_price(model, self.prices) is None:
+                self.unpriced.add(model)
+            self.window.append((time.monotonic(), count, cost))
+            self.game_calls += 1
+            self.game_tokens += count
+            self.game_usd += cost
+            self.total_tokens += count
+            self.total_usd += cost
+        return cost
+
+    def hour_totals(self):
+        """(tokens, USD) of the calls of the last hour"""
+        with self.lock:
+            cutoff = time.monotonic() - HOUR
+            while self.window and self.window[0][0] < cutoff:
+                self.window.popleft()
+            return sum(entry[1] for entry in self.window), sum(entry[2] for entry in self.window)
+
+    def usage(self):
+        """Highest share used of any configured limit"""
+        hour_tokens, hour_usd = self.hour_totals()
+        spent = {"game_tokens": self.game_tokens, "game_usd": self.game_usd,
+                 "hour_tokens": hour_tokens, "hour_usd": hour_usd}
+        return max((spent[name] / limit for name, limit in self.limits.items() if limit), default=0.0)
+
+    def level(self):
+        """Degradation level (index in LEVELS) for the next call; changes are logged"""
+        usage = self.usage()
+        level = sum(1 for threshold in self.thresholds if usage >= threshold)
+        if level != self.current_level:
+            change = "⬆️" if level > self.current_level else "⬇️"
+            self.log(f"💸 {change} Budget level {LEVELS[level]} ({usage:.0%} of the tightest limit used)")
+            self.current_level = level
+        return level
+
+    def snapshot(self):
+        """Spend, spend rate and projections shown in game_state.json"""
+        hour_tokens, hour_usd = self.hour_totals()
+        elapsed = time.monotonic() - self.started
+        # Spend rate over the last hour, or since start during the first hour (over 5 minutes at least)
+        rate = hour_usd if elapsed >= HOUR else self.total_usd / max(elapsed, 300.0) * HOUR
+        with self.lock:
+            per_call = self.game_usd / self.game_calls if self.game_calls else None
+            return {
+                "level": LEVELS[self.current_level],
+                "limits": {name: limit for name, limit in self.limits.items() if limit},
+                "game": {"tokens": self.game_tokens, "usd": round(self.game_usd, 4), "calls": self.game_calls,
+                         # Cost per call so far, over a typical game length
+                         "projected_usd": round(per_call * max(self.game_calls, self.game_plies), 4)
+                         if per_call is not None else None},
+                "hour": {"tokens": hour_tokens, "usd": round(hour_usd, 4)},
+                "total": {"tokens": self.total_tokens, "usd": round(self.total_usd, 4)},
+                "usd_per_hour": round(rate, 4),
+                "projected_usd_per_day": round(rate * 24, 2),
+                "usd_per_game": round(self.finished_usd / self.finished_games, 4) if self.finished_games else None,
+                "unpriced_models": sorted(self.unpriced),
+            }
@@ -6,29 +6,65 @@ AI Battle - Claude vs GPT Chess
 Script to automatically play Claude against ChatGPT on Lichess
 """
 
-import berserk
 import chess
-import chess.pgn
-from anthropic import Anthropic
-from openai import OpenAI
 import time
 import sys
 import threading
-from datetime import datetime, timedelta
-from config_railway import *
-import json
+from datetime import datetime
+from config_railway import (
+    LICHESS_BOT_CLAUDE_USERNAME, LICHESS_BOT_CLAUDE_TOKEN, LICHESS_BOT_GPT_USERNAME, LICHESS_BOT_GPT_TOKEN,
+    TIME_CONTROL, MAX_RETRIES, PGN_ARCHIVE_DIR, BINARY_ARCHIVE_ENABLED, BINARY_ARCHIVE_PATH, STATE_WRITE_INTERVAL,
+    LICHESS_POOL_SIZE, LICHESS_RATE_PER_SEC, LICHESS_BURST, LICHESS_MAX_RETRIES, FAST_START,
+    LICHESS_STREAM_TIMEOUT, LICHESS_STREAM_RECONNECTS,
+    LLM_PROVIDERS, AI_PLAYER_MODELS, MOVE_MAX_TOKENS, MOVE_TEMPERATURE, LLM_STREAMING,
+    ENGINE_PATH, ENGINE_WORKERS, ENGINE_DEPTH,
+    MOVE_CACHE_ENABLED, MOVE_CACHE_PATH, MOVE_CACHE_MAX_ENTRIES, MOVE_CACHE_MODE,
+    TRACE_ENABLED, TRACE_DIR, TRACE_BUFFER_SIZE, PROMPT_MODE, MOVE_CANDIDATES,
+    BREAKER_FAILURE_THRESHOLD, BREAKER_RESET_TIMEOUT, PROVIDER_FALLBACK, BREAKER_MAX_CLOCK_SHARE,
+    ADJUDICATION_MODE, ADJUDICATION_ENGINE, ADJUDICATION_RESIGN_MARGIN, ADJUDICATION_RESIGN_PLIES,
+    ADJUDICATION_DRAW_MARGIN, ADJUDICATION_DRAW_PLIES, ADJUDICATION_LOG,
+    RATINGS_LOG, RATINGS_GROUP_BY, RATINGS_BOOTSTRAP,
+    BUDGET_GAME_TOKENS, BUDGET_GAME_USD, BUDGET_HOUR_TOKENS, BUDGET_HOUR_USD, BUDGET_THRESHOLDS,
+    BUDGET_LEAN_MAX_TOKENS, BUDGET_CHEAP_MODELS, BUDGET_PRICES,
+)
 import os
-from http.server import HTTPServer, SimpleHTTPRequestHandler
+from pgn_archive import PgnGameWriter
+from state_server import SnapshotStore, create_server
+from state_publisher import StatePublisher
+from metrics import LatencyStats
+from game_runner import GameRunner, dispatch_latency
+from fast_start import (GameStartWatcher, create_accepted_game, extract_challenge_id, is_unsupported,
+                        time_to_first_move)
+from move_prompt import (calculate_material_score, analyze_threats, build_move_prompt, parse_move_response,
+                         parse_move_candidates, resolve_candidates, prompt_cache_version, MoveStreamParser,
+                         get_smart_moves)
+from budget import BudgetGovernor, LEVELS, NORMAL, COMPACT, LEAN, CHEAP, FALLBACK
+from retry_policy import (CircuitBreaker, classify_error, retry_after, retry_delay,
+                          PROVIDER_FAILURES, UNPARSEABLE, ILLEGAL_MOVE, CIRCUIT_OPEN)
+from tracing import tracer
+# berserk/requests (lichess_transport) and the LLM SDKs are imported on first use
+# (chess.engine is not: chess.pgn, needed by pgn_archive, imports it)
 
 # === LOGGING SYSTEM ===
-# Capture all print() output and save to logs.json
+# Capture all print() output for the viewer (/logs deltas and the logs.json snapshot)
 
 logs_list = []
 logs_lock = threading.Lock()
 original_print = print
 
+# In-memory snapshots served to the viewer (game_state.json, logs.json)
+state_store = SnapshotStore()
+# Sequence-numbered log lines and plies for the viewer's delta polls (/logs, /moves)
+log_sequence = state_store.sequence('logs', capacity=500)
+move_sequence = state_store.sequence('moves')
+
+def logs_snapshot():
+    """Data of the logs.json snapshot (built when it is requested, not on every line)"""
+    with logs_lock:
+        return {"logs": list(logs_list)}
+
 def custom_print(*args, **kwargs):
-    """Custom print that also saves to logs.json"""
+    """Custom print that also publishes the line to the viewer's log deltas"""
     # Print to console normally
     original_print(*args, **kwargs)
     
@@ -39,59 +75,154 @@ def custom_print(*args, **kwargs):
     timestamp = datetime.now().strftime('%H:%M:%S')
     log_entry = f"[{timestamp}] {message}"
     
-    # Add to logs list (thread-safe)
+    # Add to logs list and publish (thread-safe)
     with logs_lock:
         logs_list.append(log_entry)
         # Keep only last 500 logs
         if len(logs_list) > 500:
             logs_list.pop(0)
-    
-    # Save to file
-    try:
-        with open('logs.json', 'w') as f:
-            json.dump({"logs": logs_list}, f)
-    except:
-        pass
+        log_sequence.append(log_entry)
+    # logs.json is only serialized (and gzipped) when someone asks for it
+    state_store.invalidate('logs', logs_snapshot)
 
 # Replace built-in print
 print = custom_print
 
-# Initialize logs.json file immediately (before any print)
-try:
-    with open('logs.json', 'w') as f:
-        json.dump({"logs": []}, f)
-except:
-    pass
-
-# === INITIALIZATION ===
-print("🎮 Initializing AI Battle...")
-
-# Lichess clients
-try:
-    session_claude = berserk.TokenSession(LICHESS_BOT_CLAUDE_TOKEN)
-    client_claude = berserk.Client(session_claude)
-    
-    session_gpt = berserk.TokenSession(LICHESS_BOT_GPT_TOKEN)
-    client_gpt = berserk.Client(session_gpt)
-    
-    print("✅ Lichess connection successful")
-except Exception as e:
-    print(f"❌ Lichess connection error: {e}")
-    sys.exit(1)
-
-# AI clients
-try:
-    anthropic_client = Anthropic(api_key=ANTHROPIC_API_KEY)
-    openai_client = OpenAI(api_key=OPENAI_API_KEY)
-    print("✅ AI APIs connection successful")
-except Exception as e:
-    print(f"❌ AI APIs connection error: {e}")
-    sys.exit(1)
+# Publish an empty logs.json immediately (before any print)
+state_store.publish('logs', {"logs": []})
+
+# === LAZY INITIALIZATION ===
+# Clients and services are created on first use, so importing this module
+# has no side effects (no network, no files, no threads)
+
+init_lock = threading.RLock()
+lichess_clients = {}  # ai -> berserk client
+lichess_sessions = {}  # ai -> LichessSession (rate limit and retry counters)
+providers = None
+provider_breakers = {}  # provider name -> CircuitBreaker
+game_analyzer = None
+move_cache = None
+adjudicator = None
+rating_book = None
+state_publisher = None
+optional_services_ready = False
+
+LICHESS_TOKENS = {'claude': LICHESS_BOT_CLAUDE_TOKEN, 'gpt': LICHESS_BOT_GPT_TOKEN}
+
+def get_lichess(ai):
+    """Berserk client of a bot (shared transport: pooled, rate-limited, retried)"""
+    with init_lock:
+        if ai not in lichess_clients:
+            from lichess_transport import create_client
+            lichess_clients[ai], lichess_sessions[ai] = create_client(
+                LICHESS_TOKENS[ai], pool_size=LICHESS_POOL_SIZE,
+                rate=LICHESS_RATE_PER_SEC, burst=LICHESS_BURST, max_retries=LICHESS_MAX_RETRIES,
+                stream_timeout=LICHESS_STREAM_TIMEOUT, name=ai
+            )
+        return lichess_clients[ai]
+
+def get_providers():
+    """AI providers by name (SDK clients are created on their first call)"""
+    global providers
+    with init_lock:
+        if providers is None:
+            from providers import build_providers
+            configured = build_providers(LLM_PROVIDERS)
+            for ai, player in AI_PLAYER_MODELS.items():
+                if player["provider"] not in configured:
+                    raise ValueError(f"{ai} uses unknown provider '{player['provider']}'")
+            for name in configured:
+                provider_breakers[name] = CircuitBreaker(
+                    name, threshold=BREAKER_FAILURE_THRESHOLD, reset_timeout=BREAKER_RESET_TIMEOUT,
+                    on_change=on_breaker_change
+                )
+            providers = configured
+            print(f"✅ AI providers configured: {', '.join(providers)}")
+        return providers
+
+def on_breaker_change(breaker):
+    """Logs a circuit breaker transition and publishes it in the state"""
+    icons = {"open": "🔴", "half_open": "🟡", "closed": "🟢"}
+    print(f"{icons[breaker.state]} Provider {breaker.name} circuit {breaker.state.replace('_', '-')}")
+    get_state_publisher().publish({"providers": {breaker.name: breaker.snapshot()}})
+
+def init_optional_services():
+    """Engine analysis, move cache, adjudication and ratings: each is skipped when unavailable"""
+    global game_analyzer, move_cache, adjudicator, rating_book, optional_services_ready
+    with init_lock:
+        if optional_services_ready:
+            return
+        optional_services_ready = True
+        
+        # Post-game engine analysis, skipped when no UCI engine is installed
+        from engine_analysis import GameAnalyzer, find_engine
+        engine_path = find_engine(ENGINE_PATH)
+        if engine_path:
+            game_analyzer = GameAnalyzer(engine_path, workers=ENGINE_WORKERS, depth=ENGINE_DEPTH,
+                                         output_dir=PGN_ARCHIVE_DIR, log=print)
+            print(f"✅ Engine analysis: {engine_path} ({ENGINE_WORKERS} engines, depth {ENGINE_DEPTH})")
+        else:
+            print(f"⚠️  No UCI engine found ('{ENGINE_PATH}'), post-game analysis disabled")
+        
+        # Cross-game move cache (opt-in)
+        if MOVE_CACHE_ENABLED:
+            try:
+                from move_cache import MoveCache
+                move_cache = MoveCache(MOVE_CACHE_PATH, prompt_cache_version(PROMPT_MODE, MOVE_CANDIDATES),
+                                       max_entries=MOVE_CACHE_MAX_ENTRIES, mode=MOVE_CACHE_MODE)
+                print(f"✅ Move cache: {MOVE_CACHE_PATH} ({MOVE_CACHE_MODE}, {move_cache.stats()['entries']} moves)")
+            except Exception as e:
+                print(f"⚠️  Move cache disabled: {e}")
+        
+        # Early end of decided games (opt-in)
+        if ADJUDICATION_MODE != 'off':
+            from adjudication import Adjudicator, EngineEvaluator, material_eval
+            adjudication_engine = find_engine(ADJUDICATION_ENGINE)
+            adjudicator = Adjudicator(
+                EngineEvaluator(adjudication_engine) if adjudication_engine else material_eval,
+                resign_margin=ADJUDICATION_RESIGN_MARGIN, resign_plies=ADJUDICATION_RESIGN_PLIES,
+                draw_margin=ADJUDICATION_DRAW_MARGIN, draw_plies=ADJUDICATION_DRAW_PLIES
+            )
+            print(f"✅ Adjudication ({ADJUDICATION_MODE}): {adjudication_engine or 'material count'}")
+        
+        # Ratings over every recorded game
+        try:
+            from ratings import RatingBook
+            rating_book = RatingBook(RATINGS_LOG, group_by=RATINGS_GROUP_BY, bootstrap=RATINGS_BOOTSTRAP, log=print)
+            print(f"✅ Ratings: {RATINGS_LOG} ({rating_book.ratings['games']} games)")
+        except Exception as e:
+            print(f"⚠️  Ratings disabled: {e}")
+
+def initialize():
+    """Creates everything the game loop needs. Returns False if a required part is missing"""
+    print("🎮 Initializing AI Battle...")
+    tracer.configure(TRACE_ENABLED, TRACE_BUFFER_SIZE)
+    if TRACE_ENABLED:
+        print(f"🧵 Tracing enabled: one Chrome trace per game in {TRACE_DIR}/")
+    try:
+        get_lichess('claude')
+        get_lichess('gpt')
+        print("✅ Lichess clients ready")
+    except Exception as e:
+        print(f"❌ Lichess client error: {e}")
+        return False
+    try:
+        get_providers()
+    except Exception as e:
+        print(f"❌ AI providers configuration error: {e}")
+        return False
+    init_optional_services()
+    return True
 
 # Global variables for synchronization
 current_game_id = None
 game_ready = threading.Event()
+http_ready = threading.Event()  # Viewer server bound to its port
 challenge_accepted = threading.Event()
+fast_start_active = threading.Event()  # Game accepted directly by GPT's client: listener must not touch it
+fast_start_enabled = FAST_START  # Turned off for the process once Lichess refuses the fast path
+start_watcher = None  # Claude's incoming-events stream, kept open between games
+game_created_at = None  # When the current game was requested (for time-to-first-move)
 gpt_listener_running = True
 game_in_progress = False
 last_move_played = "-"
@@ -100,10 +231,43 @@ current_moves_string = ""
 claude_last_thought = "Waiting for game..."
 gpt_last_thought = "Waiting for game..."
 
+# Stats of the last API call of each AI (used for PGN annotations)
+# error: failure class of the last attempt (see retry_policy), retry_after: seconds asked by the provider
+ai_call_stats = {
+    "claude": {"latency": None, "tokens": None, "cached": False, "error": None},
+    "gpt": {"latency": None, "tokens": None, "cached": False, "error": None}
+}
+
+# PGN writer of the game in progress
+game_record = None
+
+# Tokens used by both AIs in the current game (adjudication savings)
+game_tokens = 0
+# Consecutive failed adjudication evaluations (adjudication is skipped for the game after a few)
+adjudication_errors = 0
+ADJUDICATION_MAX_ERRORS = 3
+# Most degraded budget level each AI played at in the current game (FALLBACK: heuristic moves)
+game_levels = {"claude": NORMAL, "gpt": NORMAL}
+
+# LLM call latency per AI (move submission RTT is tracked by the transport)
+llm_latency = {"claude": LatencyStats(), "gpt": LatencyStats()}
+# Streaming only: time to first token, and calls closed as soon as the move was read
+llm_ttft = {"claude": LatencyStats(), "gpt": LatencyStats()}
+early_closes = {"claude": 0, "gpt": 0}
+# Retry calls avoided by playing a lower-ranked candidate (MOVE_CANDIDATES > 1)
+candidate_saves = {"claude": 0, "gpt": 0}
+
+# Token and cost accounting of every call; degrades play as spending nears the limits
+budget = BudgetGovernor(
+    game_tokens=BUDGET_GAME_TOKENS, game_usd=BUDGET_GAME_USD,
+    hour_tokens=BUDGET_HOUR_TOKENS, hour_usd=BUDGET_HOUR_USD,
+    thresholds=BUDGET_THRESHOLDS, prices=BUDGET_PRICES, log=print
+)
+
 # === GAME STATE SAVE FUNCTION ===
 
 def save_game_state(game_url=None, game_num=None, last_move=None, moves=None, claude_thought=None, gpt_thought=None):
-    """Saves the current game state to a JSON file with AI thoughts"""
+    """Publishes the current game state with AI thoughts (written to game_state.json in the background)"""
     global last_move_played, current_game_number, current_moves_string, claude_last_thought, gpt_last_thought
     
     if last_move:
@@ -112,6 +276,7 @@ def save_game_state(game_url=None, game_num=None, last_move=None, moves=None, cl
         current_game_number = game_num
     if moves is not None:
         current_moves_string = moves
+        move_sequence.sync(moves.split())
         print(f"📝 Updated current_moves_string: '{moves}' ({len(moves.split()) if moves else 0} moves)")
     if claude_thought:
         claude_last_thought = claude_thought
@@ -145,7 +310,6 @@ def save_game_state(game_url=None, game_num=None, last_move=None, moves=None, cl
             pass
     
     state = {
-        "current_game_url": game_url or "https://lichess.org",
         "game_in_progress": game_in_progress,
         "game_number": current_game_number,
         "scores": {
@@ -169,15 +333,20 @@ def save_game_state(game_url=None, game_num=None, last_move=None, moves=None, cl
                 "threats": threats_black
             }
         },
+        "providers": {name: breaker.snapshot() for name, breaker in provider_breakers.items()},
+        "ratings": rating_book.ratings if rating_book else None,
+        "budget": budget.snapshot(),
         "last_update": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     }
+    # Keep the current game URL unless a new one is given
+    if game_url:
+        state["current_game_url"] = game_url
+    # Lichess stream health (once a bot client exists)
+    if lichess_sessions:
+        from lichess_transport import stream_monitor
+        state["streams"] = stream_monitor.snapshot()
     
-    try:
-        with open('game_state.json', 'w', encoding='utf-8') as f:
-            json.dump(state, f, indent=2, ensure_ascii=False)
-        print(f"✅ game_state.json saved successfully")
-    except Exception as e:
-        print(f"⚠️  Error saving state: {e}")
+    get_state_publisher().publish(state)
 
 # === CHALLENGE LISTENER FUNCTION (BOT GPT) ===
 
@@ -185,13 +354,18 @@ def gpt_challenge_listener():
     """Thread that listens for incoming challenges for GPT bot"""
     global current_game_id, gpt_listener_running, game_in_progress
     
+    from lichess_transport import backoff_delay, is_rate_limited, RATE_LIMIT_PENALTY
+    
     print("👂 GPT Bot listening for challenges...")
+    client_gpt = get_lichess('gpt')
     
+    failures = 0
     while gpt_listener_running:
         try:
             for event in client_gpt.board.stream_incoming_events():
                 if not gpt_listener_running:
                     break
+                failures = 0
                     
                 if event['type'] == 'challenge':
                     challenge_data = event['challenge']
@@ -200,6 +374,9 @@ def gpt_challenge_listener():
                     
                     # Accepter seulement si pas de partie en cours et que c'est Claude
                     if challenger.lower() == LICHESS_BOT_CLAUDE_USERNAME.lower():
+                        if fast_start_active.is_set():
+                            # Already accepted by token
+                            continue
                         if not game_in_progress:
                             print(f"✅ Challenge received from {challenger}, accepting...")
                             try:
@@ -231,8 +408,11 @@ def gpt_challenge_listener():
                         
         except Exception as e:
             if gpt_listener_running:
-                print(f"⚠️  Error in GPT listener : {e}")
-                time.sleep(5)
+                # Back off with jitter; a 429 means wait a full minute
+                delay = RATE_LIMIT_PENALTY if is_rate_limited(e) else backoff_delay(failures, base=1.0)
+                failures += 1
+                print(f"⚠️  Error in GPT listener : {e} (reconnecting in {delay:.1f}s)")
+                time.sleep(delay)
 
 # === SCORE COUNTER ===
 scores = {
@@ -243,539 +423,293 @@ scores = {
 }
 start_time = datetime.now()
 
-# Initialize game_state.json file immediately
-try:
-    initial_state = {
-        "current_game_url": "https://lichess.org",
-        "game_in_progress": False,
-        "game_number": 0,
-        "scores": scores,
-        "elapsed_time": "0h 0min",
-        "last_move": "-",
-        "moves": "",
-        "ai_thoughts": {
-            "claude": {"thought": "Waiting for game...", "material": 0, "threats": 0},
-            "gpt": {"thought": "Waiting for game...", "material": 0, "threats": 0}
-        },
-        "last_update": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    }
-    with open('game_state.json', 'w', encoding='utf-8') as f:
-        json.dump(initial_state, f, indent=2, ensure_ascii=False)
-except:
-    pass
+def get_state_publisher():
+    """State publisher, created (with the initial state) on first use"""
+    global state_publisher
+    with init_lock:
+        if state_publisher is None:
+            # Merges state updates, publishes them to the viewer and writes game_state.json (debounced)
+            state_publisher = StatePublisher('game_state.json', store=state_store,
+                                             min_interval=STATE_WRITE_INTERVAL, log=print)
+            state_publisher.publish({
+                "current_game_url": "https://lichess.org",
+                "game_in_progress": False,
+                "game_number": 0,
+                "scores": scores,
+                "elapsed_time": "0h 0min",
+                "last_move": "-",
+                "moves": "",
+                "ai_thoughts": {
+                    "claude": {"thought": "Waiting for game...", "material": 0, "threats": 0},
+                    "gpt": {"thought": "Waiting for game...", "material": 0, "threats": 0}
+                },
+                "last_update": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            })
+        return state_publisher
 
 # === AI FUNCTIONS ===
 
-def board_to_ascii(board):
-    """Converts board to visual ASCII representation with Unicode symbols"""
-    pieces_unicode = {
-        'R': '♖', 'N': '♘', 'B': '♗', 'Q': '♕', 'K': '♔', 'P': '♙',
-        'r': '♜', 'n': '♞', 'b': '♝', 'q': '♛', 'k': '♚', 'p': '♟',
-    }
-    
-    result = "\n  a b c d e f g h\n"
-    for i in range(8):
-        rank = 8 - i
-        result += f"{rank} "
-        for j in range(8):
-            square = chess.square(j, 7 - i)
-            piece = board.piece_at(square)
-            if piece:
-                result += pieces_unicode.get(piece.symbol(), piece.symbol()) + " "
-            else:
-                result += ". "
-        result += f"{rank}\n"
-    result += "  a b c d e f g h\n"
-    return result
-
-def calculate_material_score(board):
-    """Calculates material score for each color"""
-    piece_values = {
-        chess.PAWN: 1,
-        chess.KNIGHT: 3,
-        chess.BISHOP: 3,
-        chess.ROOK: 5,
-        chess.QUEEN: 9,
-        chess.KING: 0
-    }
-    
-    white_score = 0
-    black_score = 0
-    
-    for square in chess.SQUARES:
-        piece = board.piece_at(square)
-        if piece:
-            value = piece_values[piece.piece_type]
-            if piece.color == chess.WHITE:
-                white_score += value
-            else:
-                black_score += value
-    
-    return white_score, black_score
-
-def analyze_threats(board, color):
-    """Analyzes threats and endangered pieces"""
-    threats = []
-    captures = []
-    
-    my_color = chess.WHITE if color == 'white' else chess.BLACK
-    opponent_color = chess.BLACK if color == 'white' else chess.WHITE
-    
-    # Check attacked pieces
-    for square in chess.SQUARES:
-        piece = board.piece_at(square)
-        if piece and piece.color == my_color:
-            # Is this piece attacked?
-            if board.is_attacked_by(opponent_color, square):
-                piece_name = chess.piece_name(piece.piece_type).upper()
-                square_name = chess.square_name(square)
-                threats.append(f"{piece_name} on {square_name}")
-    
-    # Search for possible captures
-    for move in board.legal_moves:
-        if board.is_capture(move):
-            captured_piece = board.piece_at(move.to_square)
-            if captured_piece:
-                piece_name = chess.piece_name(captured_piece.piece_type).upper()
-                captures.append(f"{move.uci()} (capture {piece_name})")
-    
-    return threats, captures
-
-def get_smart_moves(board):
-    """Returns the most interesting moves (not all)"""
-    legal_moves = list(board.legal_moves)
-    
-    # Prioritize: captures, checks, development
-    captures = [m for m in legal_moves if board.is_capture(m)]
-    checks = [m for m in legal_moves if board.gives_check(m)]
-    
-    # Development moves (knights, bishops)
-    development = []
-    for move in legal_moves:
-        piece = board.piece_at(move.from_square)
-        if piece and piece.piece_type in [chess.KNIGHT, chess.BISHOP]:
-            # If piece moves from its initial position
-            if move.from_square in [chess.B1, chess.G1, chess.C1, chess.F1,  # White
-                                     chess.B8, chess.G8, chess.C8, chess.F8]:  # Black
-                development.append(move)
-    
-    # Combine: captures + checks + development + some others
-    smart_moves = list(set(captures + checks + development))
-    
-    # If not enough, add random moves
-    if len(smart_moves) < 10:
-        remaining = [m for m in legal_moves if m not in smart_moves]
-        smart_moves.extend(remaining[:10 - len(smart_moves)])
-    
-    return smart_moves[:15]  # Max 15 moves
-
-def ask_claude_move(board_fen, color, invalid_moves=[]):
-    """Ask Claude to play a move with full ASCII vision"""
-    
-    board_temp = chess.Board(board_fen)
-    
-    # Generate ASCII board
-    ascii_board = board_to_ascii(board_temp)
-    
-    # Calculate material score
-    white_score, black_score = calculate_material_score(board_temp)
-    my_score = white_score if color == 'white' else black_score
-    opp_score = black_score if color == 'white' else white_score
-    diff = my_score - opp_score
-    
-    # Analyze threats
-    threats, captures = analyze_threats(board_temp, color)
-    
-    # Smart recommended moves
-    smart_moves = get_smart_moves(board_temp)
-    smart_moves_str = ", ".join([m.uci() for m in smart_moves])
-    
-    # ALL LEGAL MOVES (complete list)
-    all_legal_moves = list(board_temp.legal_moves)
-    all_legal_moves_str = ", ".join([m.uci() for m in all_legal_moves])
+def ask_ai_move(ai, board_fen, color, invalid_moves=[]):
+    """Ask an AI for a move through its configured provider. Returns (ranked candidate moves, thought)"""
+    player = AI_PLAYER_MODELS[ai]
+    label = AI_PLAYERS[ai]["label"]
     
-    # History
-    move_stack = list(board_temp.move_stack)
-    last_moves = " ".join([m.uci() for m in move_stack[-4:]]) if len(move_stack) > 0 else "Game start"
-    
-    # Build prompt
-    threats_str = "\n- ".join(threats) if threats else "No immediate threats"
-    captures_str = "\n- ".join(captures[:5]) if captures else "No captures available"
-    
-    situation = "AHEAD" if diff > 0 else "BEHIND" if diff < 0 else "EQUAL"
+    # Repeated position: replay a move this model already played here
+    if move_cache and not invalid_moves:
+        try:
+            with tracer.span("cache_lookup", ai=ai):
+                cached = move_cache.lookup(chess.Board(board_fen), cache_model(ai), MOVE_TEMPERATURE)
+        except Exception as e:
+            print(f"⚠️  Move cache error: {e}")
+            cached = None
+        if cached:
+            move, thought = cached
+            ai_call_stats[ai] = {"latency": 0.0, "tokens": None, "cached": True, "error": None}
+            print(f"📦 {label} replays cached move {move}: '{(thought or '')[:50]}'")
+            return [move], thought
+    
+    # Close to the spending limits: cheaper prompts, shorter answers, cheaper model, then no API call
+    level = budget.level()
+    game_levels[ai] = max(game_levels[ai], level)
+    if level >= FALLBACK:
+        return fallback_move(ai, chess.Board(board_fen), reason="budget exhausted")
+    mode = 'compact' if level >= COMPACT else PROMPT_MODE
+    max_tokens = min(MOVE_MAX_TOKENS, BUDGET_LEAN_MAX_TOKENS) if level >= LEAN else MOVE_MAX_TOKENS
+    model = (BUDGET_CHEAP_MODELS.get(ai) or player["model"]) if level >= CHEAP else player["model"]
+    
+    provider = get_providers()[player["provider"]]
+    breaker = provider_breakers[player["provider"]]
+    if not breaker.allow():
+        # Provider unhealthy: fail fast (or play a heuristic move) instead of waiting for a timeout
+        if PROVIDER_FALLBACK == 'heuristic':
+            return fallback_move(ai, chess.Board(board_fen))
+        ai_call_stats[ai] = {"latency": None, "tokens": None, "cached": False, "error": CIRCUIT_OPEN,
+                             "retry_after": breaker.retry_in()}
+        print(f"⛔ {label}: provider {player['provider']} circuit open, retry in {breaker.retry_in():.0f}s")
+        return None, None
     
-    # Warning about invalid moves
-    invalid_warning = ""
-    if invalid_moves:
-        invalid_warning = f"\n\n❌ WARNING! These moves are INVALID, do NOT play them again:\n{', '.join(invalid_moves)}\nChoose a DIFFERENT move!"
+    with tracer.span("build_prompt", ai=ai, retry=len(invalid_moves), mode=mode):
+        prompt = build_move_prompt(board_fen, color, invalid_moves, mode=mode, candidates=MOVE_CANDIDATES)
     
-    prompt = f"""🎯 YOU ARE A CHESS GRANDMASTER - YOU PLAY {'WHITE (♙)' if color == 'white' else 'BLACK (♟)'}
-
-CURRENT BOARD:
-{ascii_board}
-
-📊 MATERIAL SCORE:
-White: {white_score} points | Black: {black_score} points
-→ You are {situation} ({diff:+d} points)
-
-⚠️ YOUR PIECES IN DANGER:
-- {threats_str}
-
-🎯 POSSIBLE CAPTURES:
-- {captures_str}
-
-📋 LAST MOVES: {last_moves}
-
-🎲 RECOMMENDED MOVES:
-{smart_moves_str}
-
-⚔️ ALL LEGAL MOVES (you MUST choose from this list):
-{all_legal_moves_str}{invalid_warning}
-
-🏆 MISSION: WIN THE GAME!
-
-⚠️ CRITICAL ANTI-BLUNDER RULES (check BEFORE every move):
-1. NEVER leave your pieces undefended - always verify they're protected!
-2. ALWAYS check if opponent can capture your pieces after your move!
-3. NEVER sacrifice material without equal or better compensation!
-4. If one of YOUR pieces is attacked → Save it FIRST (move it or defend it)!
-5. Don't move into checks or create hanging pieces!
-
-🚨 SPECIAL RULES FOR KING AND QUEEN:
-1. KING: NEVER move your King in the opening (first 10 moves)! Keep it safe behind pawns!
-2. KING: Castle early (O-O or O-O-O) to protect your King!
-3. QUEEN: Your Queen is worth 9 points - PROTECT IT AT ALL COSTS!
-4. QUEEN: If your Queen is attacked → MOVE IT IMMEDIATELY!
-5. QUEEN: Don't bring Queen out too early - she's vulnerable to attacks!
-6. QUEEN: NEVER sacrifice your Queen unless it's checkmate!
-
-STRATEGY (in priority order):
-1. If CHECKMATE possible → Do it immediately!
-2. If YOUR QUEEN is attacked → SAVE HER FIRST!
-3. If YOUR pieces are attacked → SAVE THEM (move or defend)!
-4. If you can CAPTURE opponent's material → Take it!
-5. Castle early to protect your King!
-6. Otherwise → Develop pieces, control center
-
-⛔ ABSOLUTELY FORBIDDEN:
-- Moving your King in the opening without castling
-- Losing your Queen for free or for less than a Queen
-- Leaving pieces undefended (hanging pieces)
-- Moving attacked pieces to another attacked square
-- Leaving your king in danger
-
-📝 RESPONSE FORMAT - STRICTLY FOLLOW THIS:
-Line 1: Your thought in EXACTLY 3-6 words only
-Line 2: Your move in UCI format (4 characters: e2e4)
-
-CORRECT examples:
-Attacking queen with knight
-b1c3
-
-Defending the rook
-a1b1
-
-WRONG examples (DO NOT DO THIS):
-Looking at this position, I see...  ← TOO LONG!
-I need to find the best move  ← NO MOVE PROVIDED!
-
-Now play - remember: SHORT thought + UCI move!"""
-
+    response = None
     try:
-        message = anthropic_client.messages.create(
-            model=CLAUDE_MODEL,
-            max_tokens=80,  # Reduced to avoid timeouts
-            temperature=0.6,  # Balanced: not too random, not too slow
-            messages=[{"role": "user", "content": prompt}]
-        )
-        response_text = message.content[0].text.strip()
-        
-        # Parse: look for UCI move and extract thought
-        lines = [line.strip() for line in response_text.split('\n') if line.strip()]
-        thought = None
-        move = None
-        
-        # Strategy: Assume format is "thought" then "move"
-        if len(lines) >= 2:
-            # Try last line as move, previous as thought
-            potential_move = lines[-1]
-            if len(potential_move) >= 4 and len(potential_move) <= 5:
-                if potential_move[0:2].isalpha() and potential_move[2:4].isdigit():
-                    move = potential_move
-                    thought = lines[-2] if len(lines) >= 2 else None
-        
-        # Fallback: search for UCI move anywhere
-        if not move:
-            for i, line in enumerate(lines):
-                # Look for UCI move (4-5 chars like e2e4 or e7e8q)
-                if len(line) >= 4 and len(line) <= 5 and line[0:2].isalpha() and line[2:4].isdigit():
-                    move = line
-                    # Get thought from previous line if available
-                    if i > 0:
-                        thought = lines[i-1]
-                    break
-        
-        # Last resort: regex pattern search
-        if not move:
-            import re
-            uci_pattern = r'\b([a-h][1-8][a-h][1-8][qrbn]?)\b'
-            match = re.search(uci_pattern, response_text.lower())
-            if match:
-                move = match.group(1)
-        
-        # Default thought only if we really couldn't find one
-        if not thought and move:
-            # Try to extract any non-move line as thought
-            for line in lines:
-                if line != move and len(line) > 4:
-                    thought = line
-                    break
+        parser = MoveStreamParser(chess.Board(board_fen), MOVE_CANDIDATES) if LLM_STREAMING else None
+        with tracer.span("llm_call", ai=ai, provider=player["provider"], model=model,
+                         stream=LLM_STREAMING) as span:
+            if parser:
+                # Time to move: the stream is closed once a legal move and its thought are parsed
+                response = provider.complete_stream(
+                    prompt,
+                    model=model,
+                    max_tokens=max_tokens,
+                    temperature=MOVE_TEMPERATURE,
+                    stop=parser.feed
+                )
+                span.set(ttft_ms=round((response.ttft or 0) * 1000, 1), early_close=response.stopped_early)
+            else:
+                response = provider.complete(
+                    prompt,
+                    model=model,
+                    max_tokens=max_tokens,
+                    temperature=MOVE_TEMPERATURE
+                )
+            span.set(tokens=response.tokens)
+        # Billed whatever happens next (parsing may still fail)
+        record_usage(model, response.tokens)
+        breaker.record_success()
+        llm_latency[ai].add(response.latency)
+        if response.ttft is not None:
+            llm_ttft[ai].add(response.ttft)
+        if response.stopped_early:
+            early_closes[ai] += 1
+        ai_call_stats[ai] = {"latency": response.latency, "tokens": response.tokens, "cached": False,
+                             "error": None, "budget_level": level}
         
-        if not thought:
-            thought = "Calculating next move"
+        with tracer.span("parse", ai=ai):
+            if MOVE_CANDIDATES > 1:
+                moves, thought = parser.result() if parser else parse_move_candidates(response.text, MOVE_CANDIDATES)
+            else:
+                move, thought = parser.result() if parser else parse_move_response(response.text)
+                moves = [move] if move else []
         
-        if move:
-            print(f"💭 Claude thinks: '{thought[:50]}'")  # Truncate long thoughts
+        if moves:
+            print(f"💭 {label} thinks: '{thought[:50]}'")  # Truncate long thoughts
+            if len(moves) > 1:
+                print(f"🎯 {label} candidates: {' '.join(moves)}")
         else:
-            print(f"⚠️ Claude response parsing failed: {response_text[:100]}")
+            ai_call_stats[ai]["error"] = UNPARSEABLE
+            print(f"⚠️ {label} response parsing failed: {response.text[:100]}")
         
-        return move, thought
+        return moves or None, thought
     except Exception as e:
-        print(f"❌ Claude API error: {e}")
+        # Once the provider has answered, a failure is in our parsing, not in the provider
+        kind = UNPARSEABLE if response is not None else classify_error(e)
+        if response is None:
+            # A failed stream may have consumed tokens before it broke
+            record_usage(model, getattr(e, "tokens", None))
+        if kind in PROVIDER_FAILURES:
+            breaker.record_failure(kind)
+        ai_call_stats[ai] = {"latency": None, "tokens": None, "cached": False, "error": kind,
+                             "retry_after": retry_after(e)}
+        print(f"❌ {label} API error ({kind}): {e}")
         return None, None
 
-def ask_gpt_move(board_fen, color, invalid_moves=[]):
-    """Ask GPT to play a move with full ASCII vision"""
-    
-    board_temp = chess.Board(board_fen)
-    
-    # Generate ASCII board
-    ascii_board = board_to_ascii(board_temp)
-    
-    # Calculate material score
-    white_score, black_score = calculate_material_score(board_temp)
-    my_score = white_score if color == 'white' else black_score
-    opp_score = black_score if color == 'white' else white_score
-    diff = my_score - opp_score
-    
-    # Analyze threats
-    threats, captures = analyze_threats(board_temp, color)
-    
-    # Smart recommended moves
-    smart_moves = get_smart_moves(board_temp)
-    smart_moves_str = ", ".join([m.uci() for m in smart_moves])
-    
-    # ALL LEGAL MOVES (complete list)
-    all_legal_moves = list(board_temp.legal_moves)
-    all_legal_moves_str = ", ".join([m.uci() for m in all_legal_moves])
-    
-    # History
-    move_stack = list(board_temp.move_stack)
-    last_moves = " ".join([m.uci() for m in move_stack[-4:]]) if len(move_stack) > 0 else "Game start"
-    
-    # Build prompt
-    threats_str = "\n- ".join(threats) if threats else "No immediate threats"
-    captures_str = "\n- ".join(captures[:5]) if captures else "No captures available"
-    
-    situation = "AHEAD" if diff > 0 else "BEHIND" if diff < 0 else "EQUAL"
-    
-    # Warning about invalid moves
-    invalid_warning = ""
-    if invalid_moves:
-        invalid_warning = f"\n\n❌ WARNING! These moves are INVALID, do NOT play them again:\n{', '.join(invalid_moves)}\nChoose a DIFFERENT move!"
-    
-    prompt = f"""🎯 YOU ARE A CHESS GRANDMASTER - YOU PLAY {'WHITE (♙)' if color == 'white' else 'BLACK (♟)'}
-
-CURRENT BOARD:
-{ascii_board}
-
-📊 MATERIAL SCORE:
-White: {white_score} points | Black: {black_score} points
-→ You are {situation} ({diff:+d} points)
-
-⚠️ YOUR PIECES IN DANGER:
-- {threats_str}
-
-🎯 POSSIBLE CAPTURES:
-- {captures_str}
-
-📋 LAST MOVES: {last_moves}
-
-🎲 RECOMMENDED MOVES:
-{smart_moves_str}
-
-⚔️ ALL LEGAL MOVES (you MUST choose from this list):
-{all_legal_moves_str}{invalid_warning}
-
-🏆 MISSION: WIN THE GAME!
-
-⚠️ CRITICAL ANTI-BLUNDER RULES (check BEFORE every move):
-1. NEVER leave your pieces undefended - always verify they're protected!
-2. ALWAYS check if opponent can capture your pieces after your move!
-3. NEVER sacrifice material without equal or better compensation!
-4. If one of YOUR pieces is attacked → Save it FIRST (move it or defend it)!
-5. Don't move into checks or create hanging pieces!
-
-🚨 SPECIAL RULES FOR KING AND QUEEN:
-1. KING: NEVER move your King in the opening (first 10 moves)! Keep it safe behind pawns!
-2. KING: Castle early (O-O or O-O-O) to protect your King!
-3. QUEEN: Your Queen is worth 9 points - PROTECT IT AT ALL COSTS!
-4. QUEEN: If your Queen is attacked → MOVE IT IMMEDIATELY!
-5. QUEEN: Don't bring Queen out too early - she's vulnerable to attacks!
-6. QUEEN: NEVER sacrifice your Queen unless it's checkmate!
-
-STRATEGY (in priority order):
-1. If CHECKMATE possible → Do it immediately!
-2. If YOUR QUEEN is attacked → SAVE HER FIRST!
-3. If YOUR pieces are attacked → SAVE THEM (move or defend)!
-4. If you can CAPTURE opponent's material → Take it!
-5. Castle early to protect your King!
-6. Otherwise → Develop pieces, control center
-
-⛔ ABSOLUTELY FORBIDDEN:
-- Moving your King in the opening without castling
-- Losing your Queen for free or for less than a Queen
-- Leaving pieces undefended (hanging pieces)
-- Moving attacked pieces to another attacked square
-- Leaving your king in danger
-
-📝 RESPONSE FORMAT - STRICTLY FOLLOW THIS:
-Line 1: Your thought in EXACTLY 3-6 words only
-Line 2: Your move in UCI format (4 characters: e2e4)
+def record_usage(model, tokens):
+    """Counts the tokens of one call in the game total and the budget"""
+    global game_tokens
+    budget.record(model, tokens)
+    if tokens:
+        game_tokens += sum(tokens)
+
+def fallback_move(ai, board, reason="provider unavailable"):
+    """Heuristic move used while the AI's provider is unavailable (PROVIDER_FALLBACK=heuristic)
+    or once the budget is exhausted"""
+    game_levels[ai] = FALLBACK
+    moves = get_smart_moves(board)
+    captures = [m for m in moves if board.is_capture(m)]
+    move = (captures or moves)[0]
+    ai_call_stats[ai] = {"latency": 0.0, "tokens": None, "cached": False, "error": None, "fallback": True}
+    print(f"🛟 {AI_PLAYERS[ai]['label']} {reason}, heuristic move {move.uci()}")
+    return [move.uci()], f"{reason.capitalize()} - heuristic move"
+
+def cache_model(ai):
+    """Provider and model of an AI, as used in move cache keys"""
+    player = AI_PLAYER_MODELS[ai]
+    return f"{player['provider']}:{player['model']}"
+
+def cache_move(ai, board, move, thought):
+    """Stores a freshly generated legal move in the move cache (not moves from a degraded budget level)"""
+    stats = ai_call_stats[ai]
+    if not move_cache or stats.get("cached") or stats.get("fallback") or stats.get("budget_level"):
+        return
+    try:
+        move_cache.store(board, cache_model(ai), MOVE_TEMPERATURE, move.uci(), thought)
+    except Exception as e:
+        print(f"⚠️  Move cache error: {e}")
 
-CORRECT examples:
-Developing center pawn
-e7e5
+def ask_claude_move(board_fen, color, invalid_moves=[]):
+    """Ask Claude to play a move with full ASCII vision"""
+    return ask_ai_move('claude', board_fen, color, invalid_moves)
 
-Capturing enemy piece  
-d8d4
+def ask_gpt_move(board_fen, color, invalid_moves=[]):
+    """Ask GPT to play a move with full ASCII vision"""
+    return ask_ai_move('gpt', board_fen, color, invalid_moves)
 
-WRONG examples (DO NOT DO THIS):
-Looking at this position, I see...  ← TOO LONG!
-I need to find the best move  ← NO MOVE PROVIDED!
+# === PGN ARCHIVE ===
 
-Now play - remember: SHORT thought + UCI move!"""
+def start_game_record(game_id, game_url, game_number):
+    """Opens the PGN writer for a new game"""
+    global game_record
+    
+    try:
+        game_record = PgnGameWriter(PGN_ARCHIVE_DIR, game_id, {
+            "Event": "AI Battle - Claude vs GPT",
+            "Site": game_url,
+            "Date": datetime.now().strftime("%Y.%m.%d"),
+            "Round": str(game_number),
+            "White": LICHESS_BOT_CLAUDE_USERNAME or "Claude",
+            "Black": LICHESS_BOT_GPT_USERNAME or "GPT",
+            "Result": "*",
+            "WhiteModel": AI_PLAYER_MODELS["claude"]["model"],
+            "BlackModel": AI_PLAYER_MODELS["gpt"]["model"],
+            "TimeControl": f"{TIME_CONTROL['time'] * 60}+{TIME_CONTROL['increment']}",
+        })
+    except Exception as e:
+        game_record = None
+        print(f"⚠️  Cannot open PGN archive: {e}")
 
+def record_move(ai, move, thought, retries):
+    """Appends a played move to the PGN with thought, latency, retries and tokens"""
+    if not game_record:
+        return
     try:
-        response = openai_client.chat.completions.create(
-            model=GPT_MODEL,
-            messages=[{"role": "user", "content": prompt}],
-            max_tokens=80,  # Reduced to avoid timeouts
-            temperature=0.6  # Balanced: not too random, not too slow
-        )
-        response_text = response.choices[0].message.content.strip()
-        
-        # Parse: look for UCI move and extract thought
-        lines = [line.strip() for line in response_text.split('\n') if line.strip()]
-        thought = None
-        move = None
-        
-        # Strategy: Assume format is "thought" then "move"
-        if len(lines) >= 2:
-            # Try last line as move, previous as thought
-            potential_move = lines[-1]
-            if len(potential_move) >= 4 and len(potential_move) <= 5:
-                if potential_move[0:2].isalpha() and potential_move[2:4].isdigit():
-                    move = potential_move
-                    thought = lines[-2] if len(lines) >= 2 else None
-        
-        # Fallback: search for UCI move anywhere
-        if not move:
-            for i, line in enumerate(lines):
-                # Look for UCI move (4-5 chars like e2e4 or e7e8q)
-                if len(line) >= 4 and len(line) <= 5 and line[0:2].isalpha() and line[2:4].isdigit():
-                    move = line
-                    # Get thought from previous line if available
-                    if i > 0:
-                        thought = lines[i-1]
-                    break
-        
-        # Last resort: regex pattern search
-        if not move:
-            import re
-            uci_pattern = r'\b([a-h][1-8][a-h][1-8][qrbn]?)\b'
-            match = re.search(uci_pattern, response_text.lower())
-            if match:
-                move = match.group(1)
-        
-        # Default thought only if we really couldn't find one
-        if not thought and move:
-            # Try to extract any non-move line as thought
-            for line in lines:
-                if line != move and len(line) > 4:
-                    thought = line
-                    break
-        
-        if not thought:
-            thought = "Calculating next move"
-        
-        if move:
-            print(f"💭 GPT thinks: '{thought[:50]}'")  # Truncate long thoughts
-        else:
-            print(f"⚠️ GPT response parsing failed: {response_text[:100]}")
-        
-        return move, thought
+        stats = ai_call_stats[ai]
+        game_record.add_move(move, thought, stats["latency"], retries, stats["tokens"])
     except Exception as e:
-        print(f"❌ GPT API error: {e}")
-        return None, None
+        print(f"⚠️  Cannot record move in PGN: {e}")
 
-def validate_and_clean_move(move_str, board):
-    """Validates and cleans the move proposed by the AI - handles both UCI and algebraic notation"""
-    # Clean the response
-    original_move = move_str
-    move_str = move_str.strip()
-    
-    # Remove quotes, but preserve case for algebraic notation
-    move_str = move_str.replace('"', '').replace("'", '').replace('\n', '').replace('\r', '')
+def close_game_record(result):
+    """Writes the result and files the game into the rolling archive"""
+    global game_record
     
-    print(f"🔍 Debug - Original move: '{original_move}' → Cleaned: '{move_str}'")
-    
-    # Try parsing as Standard Algebraic Notation (SAN) first - e.g., "Kxf2", "Nf3", "e4"
+    if not game_record:
+        return
+    pgn_result = {'claude': '1-0', 'gpt': '0-1', 'draw': '1/2-1/2'}.get(result, '*')
+    game_id = game_record.game_id
+    moves = [move.uci() for move in game_record.board.move_stack]
     try:
-        move = board.parse_san(move_str)
-        if move in board.legal_moves:
-            print(f"✅ Parsed as algebraic notation (SAN): '{move_str}' → UCI: '{move.uci()}'")
-            return move
+        with tracer.span("archive_pgn", category="game"):
+            path = game_record.finish(pgn_result)
+        print(f"📚 Game archived in {path}")
     except Exception as e:
-        print(f"🔍 Debug - Not valid SAN: '{move_str}' ({e})")
-    
-    # Try parsing as UCI - e.g., "e2e4", "g1f3"
-    move_str_lower = move_str.lower().strip()
-    
-    # Remove extra spaces
-    move_str_lower = ''.join(c for c in move_str_lower if c.isalnum())
-    
-    # If too long, take first characters
-    if len(move_str_lower) > 5:
-        move_str_lower = move_str_lower[:5]
-    
-    print(f"🔍 Debug - Trying UCI: '{move_str_lower}'")
-    
-    # Try to parse as UCI
+        print(f"⚠️  Cannot archive game: {e}")
+    game_record = None
+    if BINARY_ARCHIVE_ENABLED:
+        archive_binary(game_id, moves, pgn_result)
+    if rating_book and result:
+        record_rating(game_id, pgn_result)
+    
+    if game_analyzer and result and moves:
+        game_analyzer.submit(game_id, moves, {'white': 'claude', 'black': 'gpt'}, on_done=on_game_analysed)
+        print(f"🔬 Engine analysis of {game_id} queued")
+
+def archive_binary(game_id, moves, result):
+    """Appends a finished game to the binary archive"""
+    from binary_archive import BinaryArchiveWriter
     try:
-        move = chess.Move.from_uci(move_str_lower)
-        if move in board.legal_moves:
-            print(f"✅ Parsed as UCI: '{move_str_lower}'")
-            return move
-        else:
-            print(f"🔍 Debug - Move '{move_str_lower}' is not legal in this position")
+        with BinaryArchiveWriter(BINARY_ARCHIVE_PATH, log=print) as writer:
+            writer.append(game_id, moves, result, white_model=played_config("claude")[0],
+                          black_model=played_config("gpt")[0])
     except Exception as e:
-        print(f"🔍 Debug - Cannot parse as UCI: '{move_str_lower}' ({e})")
-    
-    # Try to find a similar move
-    for legal_move in board.legal_moves:
-        if legal_move.uci().startswith(move_str_lower[:4]):
-            print(f"🔍 Debug - Similar move found: {legal_move.uci()}")
-            return legal_move
-    
-    print(f"❌ No valid move found for: '{original_move}'")
-    return None
+        print(f"⚠️  Cannot append game to binary archive: {e}")
+
+def played_config(ai):
+    """(model, prompt) an AI played the current game with, at its most degraded budget level.
+    The prompt is the prompt mode, or the budget level's name once degraded"""
+    level = game_levels[ai]
+    model = AI_PLAYER_MODELS[ai]["model"]
+    if level >= CHEAP:
+        model = BUDGET_CHEAP_MODELS.get(ai) or model
+    return model, PROMPT_MODE if level == NORMAL else LEVELS[level]
+
+def record_rating(game_id, result):
+    """Adds a finished game to the results log and refits the ratings (not games with heuristic moves)"""
+    from ratings import result_entry
+    if FALLBACK in game_levels.values():
+        print(f"🏅 Game {game_id} not rated: heuristic moves were played")
+        return
+    (white_model, white_prompt), (black_model, black_prompt) = played_config("claude"), played_config("gpt")
+    try:
+        with tracer.span("refit_ratings", category="game"):
+            rating_book.record(result_entry(
+                game_id, result, white_model, black_model, white_prompt, black_prompt
+            ))
+    except Exception as e:
+        print(f"⚠️  Cannot update ratings: {e}")
+
+def export_game_trace():
+    """Writes the spans of the game that just ended as Chrome trace JSON (if tracing is on)"""
+    if not tracer.enabled or not tracer.game:
+        return
+    path = os.path.join(TRACE_DIR, f"{tracer.game}.trace.json")
+    try:
+        count = tracer.export_game(tracer.game, path)
+        print(f"🧵 Trace saved: {path} ({count} events)")
+    except Exception as e:
+        print(f"⚠️  Cannot save trace: {e}")
+
+def on_game_analysed(report):
+    """Called from the analysis thread when a game's engine report is ready"""
+    for ai, stats in report["summary"].items():
+        print(f"🔬 {ai.upper():<6} accuracy {stats['accuracy']}% | ACPL {stats['acpl']} | "
+              f"{stats['blunders']} blunders, {stats['mistakes']} mistakes, {stats['inaccuracies']} inaccuracies")
+    get_state_publisher().publish({"last_analysis": {"game_id": report["game_id"], **report["summary"]}})
 
 # === FONCTION PRINCIPALE DE JEU ===
 
 def play_game(game_number):
     """Play a complete game"""
-    global current_game_id, game_in_progress
+    global current_game_id, game_in_progress, game_created_at, game_tokens, adjudication_errors
     
     # IMPORTANT: Reset flag at start
     game_in_progress = False
@@ -788,64 +722,25 @@ def play_game(game_number):
     challenge_accepted.clear()
     game_ready.clear()
     current_game_id = None
-    
-    # Create challenge
+    game_created_at = time.perf_counter()
+    game_tokens = 0
+    budget.start_game()
+    game_levels.update(claude=NORMAL, gpt=NORMAL)
+    if adjudicator:
+        adjudicator.reset()
+        adjudication_errors = 0
+    
+    # Create the game: auto-accepted challenge first, listener handshake as fallback
     try:
-        print(f"📤 {LICHESS_BOT_CLAUDE_USERNAME} challenges {LICHESS_BOT_GPT_USERNAME}...")
-        challenge = client_claude.challenges.create(
-            LICHESS_BOT_GPT_USERNAME,
-            rated=False,
-            clock_limit=TIME_CONTROL["time"] * 60,
-            clock_increment=TIME_CONTROL["increment"],
-            color="white"
-        )
-        
-        # Try different ways to get challenge ID
-        challenge_id = None
-        if isinstance(challenge, dict):
-            # Method 1: {"challenge": {"id": "..."}}
-            challenge_id = challenge.get("challenge", {}).get("id")
-            # Method 2: {"id": "..."}
-            if not challenge_id:
-                challenge_id = challenge.get("id")
-        elif isinstance(challenge, str):
-            # Method 3: Direct ID as string
-            challenge_id = challenge
-        
-        print(f"🔍 Debug - Challenge received: {challenge}")
-        print(f"🔍 Debug - Challenge ID extracted: {challenge_id}")
-        
-        if not challenge_id:
-            print("❌ Error: Cannot create challenge")
-            game_in_progress = False
-            return None
-        
-        print(f"✅ Challenge created: {challenge_id}")
-        
-        # Wait for GPT to accept (30 second timeout)
-        print("⏳ Waiting for GPT to accept challenge...")
-        if not challenge_accepted.wait(timeout=30):
-            print("❌ Timeout: GPT didn't accept challenge")
-            game_in_progress = False
-            try:
-                client_claude.challenges.cancel(challenge_id)
-            except:
-                pass
-            return None
-        
-        print("✅ Challenge accepted by GPT")
-        game_in_progress = True  # Now block new challenges
-        
-        # Wait for game to start
-        print("⏳ Waiting for game to start...")
-        if not game_ready.wait(timeout=15):
-            print("❌ Timeout: Game didn't start")
-            game_in_progress = False
-            return None
-        
-        game_id = current_game_id
+        with tracer.span("create_game", category="game", game_number=game_number) as span:
+            game_id = fast_start_game() if fast_start_enabled else None
+            if not game_id:
+                game_id = listener_start_game()
+            if game_id:
+                # Spans from here on belong to this game's trace
+                tracer.start_game(game_id)
+                span.set(game_id=game_id)
         if not game_id:
-            print("❌ Error: Game ID unavailable")
             game_in_progress = False
             return None
         
@@ -857,363 +752,322 @@ def play_game(game_number):
         
         # Save initial state
         save_game_state(game_url=game_url, game_num=game_number)
+        start_game_record(game_id, game_url, game_number)
         
     except Exception as e:
         print(f"❌ Error creating challenge: {e}")
         game_in_progress = False
+        fast_start_active.clear()
         return None
     
     # === PLAY THE GAME ===
     
-    # Initialiser le plateau
-    board = chess.Board()
-    move_number = 1
+    # One state machine fed by both bots' own game streams
+    runner = GameRunner(
+        game_id,
+        sides={chess.WHITE: ('claude', get_lichess('claude')), chess.BLACK: ('gpt', get_lichess('gpt'))},
+        play_turn=play_turn,
+        on_moves=on_game_moves,
+        adjudicate=(lambda board: adjudicate_position(game_id, board)) if adjudicator else None,
+        max_reconnects=LICHESS_STREAM_RECONNECTS,
+        log=print
+    )
     
-    # Streaming de la partie
     try:
-        print("🔍 Debug - Starting game stream...")
-        for event in client_claude.bots.stream_game_state(game_id):
-            print(f"🔍 Debug - Event received : type={event.get('type')}")
-            
-            if event['type'] == 'gameFull':
-                print("🔍 Debug - gameFull event received")
-                state = event.get('state', {})
-                moves = state.get('moves', '')
-                print(f"🔍 Debug - gameFull moves: '{moves}'")
-                
-                # Save moves to game state
-                save_game_state(moves=moves)
-                
-                # Treat first state as gameState too
-                status = state.get('status', 'started')
-                
-                # Apply moves to board
-                board = chess.Board()
-                if moves:
-                    for move_uci in moves.split():
-                        try:
-                            board.push_uci(move_uci)
-                        except:
-                            pass
-                
-                print(f"🔍 Debug - gameFull - Board: FEN={board.fen()}")
-                print(f"🔍 Debug - gameFull - {'White' if board.turn == chess.WHITE else 'Black'}'s turn")
-                
-                # If it's our turn (white = Claude), play immediately
-                if board.turn == chess.WHITE and status == 'started':
-                    print(f"\n♟️  Move {move_number} | Claude's turn (white)...")
-                    
-                    invalid_moves = []  # Store invalid moves
-                    claude_thought = "Analyzing position"  # Default thought
-                    
-                    # Wait a bit to ensure Lichess is ready
-                    time.sleep(0.5)
-                    
-                    for attempt in range(MAX_RETRIES):
-                        result = ask_claude_move(board.fen(), 'white', invalid_moves)
-                        
-                        if result and result[0]:  # Check if we got a move
-                            move_str, claude_thought = result
-                            move = validate_and_clean_move(move_str, board)
-                            
-                            if move:
-                                try:
-                                    client_claude.bots.make_move(game_id, move.uci())
-                                    print(f"✅ Claude plays: {move.uci()}")
-                                    save_game_state(last_move=f"Claude: {move.uci()}", claude_thought=claude_thought)
-                                    time.sleep(3)  # Pause to allow viewers to see the move
-                                    break  # Exit retry loop on success
-                                except Exception as e:
-                                    error_msg = str(e)
-                                    print(f"❌ Error sending move: {e}")
-                                    # If "not your turn", break immediately - don't retry
-                                    if "Not your turn" in error_msg or "not your turn" in error_msg:
-                                        print("⚠️  Skipping - waiting for next gameState event")
-                                        break
-                                    time.sleep(1)
-                            else:
-                                print(f"⚠️  Invalid move (attempt {attempt+1}/{MAX_RETRIES}): {move_str}")
-                                invalid_moves.append(move_str)  # Add to invalid list
-                        
-                        if attempt == MAX_RETRIES - 1:
-                            print("❌ Claude couldn't play a valid move. Resigning.")
-                            game_in_progress = False
-                            try:
-                                client_claude.bots.resign_game(game_id)
-                            except:
-                                pass
-                            return 'gpt'
-                        
-                        time.sleep(1)
-                
-            elif event['type'] == 'gameState':
-                print("🔍 Debug - gameState event received")
-                moves = event.get('moves', '')
-                status = event.get('status', '')
-                winner = event.get('winner', '')
-                print(f"🔍 Debug - gameState moves: '{moves}', status: '{status}'")
-                
-                # Save moves to game state
-                print(f"💾 Saving {len(moves.split()) if moves else 0} moves to game_state.json")
-                save_game_state(moves=moves)
-                
-                # Check if game is over
-                if status == 'mate' or status == 'resign' or status == 'draw' or status == 'timeout' or status == 'outoftime':
-                    print(f"\n{'='*60}")
-                    print(f"🏁 Game over: {status}")
-                    game_in_progress = False  # Allow new challenges
-                    
-                    if status == 'mate' or status == 'resign' or status == 'timeout' or status == 'outoftime':
-                        if winner == 'white':
-                            print("🏆 Claude victory (white)!")
-                            return 'claude'
-                        else:
-                            print("🏆 GPT victory (black)!")
-                            return 'gpt'
-                    else:
-                        print("⚖️  Draw !")
-                        return 'draw'
-                
-                # Appliquer les coups au plateau
-                board = chess.Board()
-                if moves:
-                    for move_uci in moves.split():
-                        try:
-                            board.push_uci(move_uci)
-                        except:
-                            pass
-                
-                print(f"🔍 Debug - Board after moves: FEN={board.fen()}")
-                print(f"🔍 Debug - {'White' if board.turn == chess.WHITE else 'Black'}'s turn")
-                print(f"🔍 Debug - board.turn == chess.WHITE ? {board.turn == chess.WHITE}")
-                
-                # Check if game is over by chess rules
-                if board.is_game_over():
-                    result = board.result()
-                    print(f"\n{'='*60}")
-                    print(f"🏁 Game over: {result}")
-                    game_in_progress = False  # Allow new challenges
-                    
-                    if result == "1-0":
-                        print("🏆 Claude victory (white)!")
-                        return 'claude'
-                    elif result == "0-1":
-                        print("🏆 GPT victory (black)!")
-                        return 'gpt'
-                    else:
-                        print("⚖️  Draw!")
-                        return 'draw'
-                
-                # Whose turn is it?
-                if board.turn == chess.WHITE and status == 'started':
-                    # Claude's turn
-                    print(f"\n♟️  Move {move_number} | Claude's turn (white)...")
-                    
-                    invalid_moves = []  # Store invalid moves
-                    claude_thought = "Analyzing position"  # Default thought
-                    
-                    # Wait a bit to ensure Lichess is ready
-                    time.sleep(0.5)
-                    
-                    for attempt in range(MAX_RETRIES):
-                        # Pass invalid moves to function
-                        result = ask_claude_move(board.fen(), 'white', invalid_moves)
-                        
-                        if result and result[0]:  # Check if we got a move
-                            move_str, claude_thought = result
-                            move = validate_and_clean_move(move_str, board)
-                            
-                            if move:
-                                try:
-                                    client_claude.bots.make_move(game_id, move.uci())
-                                    print(f"✅ Claude plays: {move.uci()}")
-                                    save_game_state(last_move=f"Claude: {move.uci()}", claude_thought=claude_thought)
-                                    time.sleep(3)  # Pause to allow viewers to see the move
-                                    break  # Exit retry loop on success
-                                except Exception as e:
-                                    error_msg = str(e)
-                                    print(f"❌ Error sending move: {e}")
-                                    # If "not your turn", break immediately - don't retry
-                                    if "Not your turn" in error_msg or "not your turn" in error_msg:
-                                        print("⚠️  Skipping - waiting for next gameState event")
-                                        break
-                                    time.sleep(1)
-                            else:
-                                print(f"⚠️  Invalid move (attempt {attempt+1}/{MAX_RETRIES}): {move_str}")
-                                invalid_moves.append(move_str)  # Add to invalid list
-                        
-                        if attempt == MAX_RETRIES - 1:
-                            print("❌ Claude couldn't play a valid move. Resigning.")
-                            game_in_progress = False
-                            try:
-                                client_claude.bots.resign_game(game_id)
-                            except:
-                                pass
-                            return 'gpt'
-                        
-                        time.sleep(1)
-                    
-                elif board.turn == chess.BLACK and status == 'started':
-                    # GPT's turn
-                    print(f"♟️  Move {move_number} | GPT's turn (black)...")
-                    
-                    invalid_moves = []  # Store invalid moves
-                    gpt_thought = "Analyzing position"  # Default thought
-                    
-                    # Wait a bit to ensure Lichess is ready
-                    time.sleep(0.5)
-                    
-                    for attempt in range(MAX_RETRIES):
-                        # Pass invalid moves to function
-                        result = ask_gpt_move(board.fen(), 'black', invalid_moves)
-                        
-                        if result and result[0]:  # Check if we got a move
-                            move_str, gpt_thought = result
-                            move = validate_and_clean_move(move_str, board)
-                            
-                            if move:
-                                try:
-                                    client_gpt.bots.make_move(game_id, move.uci())
-                                    print(f"✅ GPT plays: {move.uci()}")
-                                    save_game_state(last_move=f"GPT: {move.uci()}", gpt_thought=gpt_thought)
-                                    move_number += 1
-                                    time.sleep(3)  # Pause to allow viewers to see the move
-                                    break  # Exit retry loop on success
-                                except Exception as e:
-                                    error_msg = str(e)
-                                    print(f"❌ Error sending move: {e}")
-                                    # If "not your turn", break immediately - don't retry
-                                    if "Not your turn" in error_msg or "not your turn" in error_msg:
-                                        print("⚠️  Skipping - waiting for next gameState event")
-                                        break
-                                    time.sleep(1)
-                            else:
-                                print(f"⚠️  Invalid move (attempt {attempt+1}/{MAX_RETRIES}): {move_str}")
-                                invalid_moves.append(move_str)  # Add to invalid list
-                        
-                        if attempt == MAX_RETRIES - 1:
-                            print("❌ GPT couldn't play a valid move. Resigning.")
-                            game_in_progress = False
-                            try:
-                                client_gpt.bots.resign_game(game_id)
-                            except:
-                                pass
-                            return 'claude'
-                        
-                        time.sleep(1)
-                
+        print("🔍 Debug - Starting game streams...")
+        with tracer.span("game", category="game", game_id=game_id):
+            result = runner.run()
     except Exception as e:
         print(f"❌ Error during game: {e}")
+        result = None
+    
+    if adjudicator:
+        log_adjudication(game_id, runner.board, result)
+    
+    game_in_progress = False  # Allow new challenges
+    fast_start_active.clear()
+    if start_watcher:
+        start_watcher.forget(game_id)
+    return result
+
+def adjudicate_position(game_id, board):
+    """Ends a decided game through the bot API (ADJUDICATION_MODE=on). Returns the result or None"""
+    global adjudication_errors
+    if adjudication_errors >= ADJUDICATION_MAX_ERRORS:
+        return None
+    try:
+        with tracer.span("adjudicate", category="game", ply=board.ply()):
+            decision = adjudicator.check(board, game_tokens)
+        adjudication_errors = 0
+    except Exception as e:
+        # Optional feature: a broken engine must never end a live game
+        adjudication_errors += 1
+        print(f"⚠️  Adjudication evaluation failed, skipped at ply {board.ply()}: {e}")
+        if adjudication_errors >= ADJUDICATION_MAX_ERRORS:
+            print(f"⚠️  Adjudication disabled for this game after {adjudication_errors} failures")
+        return None
+    if not decision:
+        return None
+    kind, loser = decision
+    if ADJUDICATION_MODE != 'on':
+        if adjudicator.trigger["ply"] == board.ply():
+            print(f"🔍 Adjudication (shadow): would {kind} at ply {board.ply()}")
         return None
     
-    # Initialize board
-    board = chess.Board()
-    move_number = 1
+    try:
+        if kind == 'resign':
+            loser_ai = next(ai for ai, p in AI_PLAYERS.items() if p["color"] == chess.COLOR_NAMES[loser])
+            winner_ai = next(ai for ai in AI_PLAYERS if ai != loser_ai)
+            print(f"⚖️  Adjudication: {AI_PLAYERS[loser_ai]['label']} is lost "
+                  f"({adjudicator.trigger['score']:+d} cp), resigning")
+            get_lichess(loser_ai).bots.resign_game(game_id)
+            return winner_ai
+        from lichess_transport import accept_draw
+        print("⚖️  Adjudication: dead draw, both bots agree to a draw")
+        for ai in AI_PLAYERS:
+            get_lichess(ai)
+            accept_draw(lichess_sessions[ai], game_id)
+        return 'draw'
+    except Exception as e:
+        print(f"⚠️  Adjudication failed, game goes on: {e}")
+        return None
+
+def log_adjudication(game_id, board, result):
+    """Appends the game to the adjudication log if adjudication triggered"""
+    winner = {"claude": AI_PLAYERS["claude"]["color"], "gpt": AI_PLAYERS["gpt"]["color"]}.get(result, result)
+    entry = adjudicator.game_entry(game_id, ADJUDICATION_MODE, board.ply(), game_tokens, winner)
+    if not entry:
+        return
+    try:
+        from adjudication import append_entry
+        append_entry(ADJUDICATION_LOG, entry)
+    except Exception as e:
+        print(f"⚠️  Cannot write adjudication log: {e}")
+    if ADJUDICATION_MODE == 'shadow':
+        print(f"🔍 Adjudication would have saved {entry['plies_after']} plies, {entry['tokens_after']} tokens")
+
+def fast_start_game():
+    """Creates a game that GPT's client accepts right away. Returns the game ID or None"""
+    global game_in_progress, fast_start_enabled
     
-    # Stream game
+    fast_start_active.set()
     try:
-        for event in client_claude.bots.stream_game_state(game_id):
-            
-            if event['type'] == 'gameFull':
-                state = event.get('state', {})
-                moves = state.get('moves', '')
-                
-            elif event['type'] == 'gameState':
-                moves = event.get('moves', '')
-                status = event.get('status', '')
-                winner = event.get('winner', '')
-                
-                # Check if game is over
-                if status == 'mate' or status == 'resign' or status == 'draw' or status == 'timeout' or status == 'outoftime':
-                    print(f"\n{'='*60}")
-                    print(f"🏁 Game over: {status}")
-                    game_in_progress = False  # Allow new challenges
-                    
-                    if status == 'mate' or status == 'resign' or status == 'timeout' or status == 'outoftime':
-                        if winner == 'white':
-                            print("🏆 Claude victory (white)!")
-                            return 'claude'
-                        else:
-                            print("🏆 GPT victory (black)!")
-                            return 'gpt'
-                    else:
-                        print("⚖️  Draw!")
-                        return 'draw'
-                
-                # Apply moves to board
-                board = chess.Board()
-                if moves:
-                    for move_uci in moves.split():
-                        board.push_uci(move_uci)
-                
-                # Whose turn is it?
-                if board.turn == chess.WHITE:
-                    # Claude's turn
-                    print(f"\n♟️  Move {move_number} | Claude's turn (white)...")
-                    
-                    claude_thought = "Analyzing position"  # Default thought
-                    for attempt in range(MAX_RETRIES):
-                        result = ask_claude_move(board.fen(), 'white')
-                        
-                        if result and result[0]:  # Check if we got a move
-                            move_str, claude_thought = result
-                            move = validate_and_clean_move(move_str, board)
-                            
-                            if move:
-                                try:
-                                    client_claude.bots.make_move(game_id, move.uci())
-                                    print(f"✅ Claude plays: {move.uci()}")
-                                    save_game_state(last_move=f"Claude: {move.uci()}", claude_thought=claude_thought)
-                                    time.sleep(3)  # Pause to allow viewers to see the move
-                                    break
-                                except Exception as e:
-                                    print(f"❌ Error sending move: {e}")
-                            else:
-                                print(f"⚠️  Invalid move (attempt {attempt+1}/{MAX_RETRIES}): {move_str}")
-                        
-                        if attempt == MAX_RETRIES - 1:
-                            print("❌ Claude couldn't play a valid move. Resigning.")
-                            client_claude.bots.resign_game(game_id)
-                            return 'gpt'
-                    
-                else:
-                    # GPT's turn
-                    print(f"♟️  Move {move_number} | GPT's turn (black)...")
-                    
-                    gpt_thought = "Analyzing position"  # Default thought
-                    for attempt in range(MAX_RETRIES):
-                        result = ask_gpt_move(board.fen(), 'black')
-                        
-                        if result and result[0]:  # Check if we got a move
-                            move_str, gpt_thought = result
-                            move = validate_and_clean_move(move_str, board)
-                            
-                            if move:
-                                try:
-                                    client_gpt.bots.make_move(game_id, move.uci())
-                                    print(f"✅ GPT plays: {move.uci()}")
-                                    save_game_state(last_move=f"GPT: {move.uci()}", gpt_thought=gpt_thought)
-                                    move_number += 1
-                                    time.sleep(3)  # Pause to allow viewers to see the move
-                                    break
-                                except Exception as e:
-                                    print(f"❌ Error sending move: {e}")
-                            else:
-                                print(f"⚠️  Invalid move (attempt {attempt+1}/{MAX_RETRIES}): {move_str}")
-                        
-                        if attempt == MAX_RETRIES - 1:
-                            print("❌ GPT couldn't play a valid move. Resigning.")
-                            game_in_progress = False
-                            try:
-                                client_gpt.bots.resign_game(game_id)
-                            except:
-                                pass
-                            return 'claude'
-                
+        print(f"⚡ {LICHESS_BOT_CLAUDE_USERNAME} challenges {LICHESS_BOT_GPT_USERNAME} (accepted directly)...")
+        game_id = create_accepted_game(
+            get_lichess('claude'),
+            get_lichess('gpt'),
+            LICHESS_BOT_GPT_USERNAME,
+            clock_limit=TIME_CONTROL["time"] * 60,
+            clock_increment=TIME_CONTROL["increment"],
+            color="white"
+        )
+        if game_id:
+            game_in_progress = True  # Now block new challenges
+            print(f"✅ Game created and accepted: {game_id}")
+            return game_id
+        print("⚠️  Fast start returned no game ID, falling back to challenge listener")
     except Exception as e:
-        print(f"❌ Error during game : {e}")
-        game_in_progress = False
+        print(f"⚠️  Fast start failed ({e}), falling back to challenge listener")
+        if is_unsupported(e):
+            # Refused by Lichess (401/403/404): every later game would pay the same failed round trip
+            fast_start_enabled = False
+            print("⚠️  Fast start disabled until restart")
+    
+    fast_start_active.clear()
+    return None
+
+def listener_start_game():
+    """Creates a challenge and waits for the GPT listener to accept it. Returns the game ID or None"""
+    global game_in_progress
+    
+    print(f"📤 {LICHESS_BOT_CLAUDE_USERNAME} challenges {LICHESS_BOT_GPT_USERNAME}...")
+    challenge = get_lichess('claude').challenges.create(
+        LICHESS_BOT_GPT_USERNAME,
+        rated=False,
+        clock_limit=TIME_CONTROL["time"] * 60,
+        clock_increment=TIME_CONTROL["increment"],
+        color="white"
+    )
+    challenge_id = extract_challenge_id(challenge)
+    
+    print(f"🔍 Debug - Challenge received: {challenge}")
+    print(f"🔍 Debug - Challenge ID extracted: {challenge_id}")
+    
+    if not challenge_id:
+        print("❌ Error: Cannot create challenge")
         return None
+    
+    print(f"✅ Challenge created: {challenge_id}")
+    
+    # Wait for GPT to accept (30 second timeout)
+    print("⏳ Waiting for GPT to accept challenge...")
+    if not challenge_accepted.wait(timeout=30):
+        print("❌ Timeout: GPT didn't accept challenge")
+        try:
+            get_lichess('claude').challenges.cancel(challenge_id)
+        except:
+            pass
+        return None
+    
+    print("✅ Challenge accepted by GPT")
+    game_in_progress = True  # Now block new challenges
+    
+    # Wait for game to start: Claude's open event stream or GPT's listener, whichever is first
+    print("⏳ Waiting for game to start...")
+    deadline = time.monotonic() + 15
+    while not game_ready.is_set():
+        if start_watcher and start_watcher.wait_for(challenge_id, 0.2):
+            break
+        if not start_watcher:
+            game_ready.wait(0.2)
+        if time.monotonic() > deadline:
+            print("❌ Timeout: Game didn't start")
+            return None
+    
+    game_id = current_game_id or challenge_id
+    if not game_id:
+        print("❌ Error: Game ID unavailable")
+        return None
+    return game_id
+
+def on_game_moves(moves):
+    """Called by the game runner each time the move list changes"""
+    print(f"💾 Saving {len(moves.split()) if moves else 0} moves to game_state.json")
+    with tracer.span("save_state", category="stream"):
+        save_game_state(moves=moves)
+    if game_record:
+        game_record.sync(moves)
+
+# AI name -> how to ask it and which bot plays its moves
+AI_PLAYERS = {
+    'claude': {"label": "Claude", "color": 'white', "ask": ask_claude_move},
+    'gpt': {"label": "GPT", "color": 'black', "ask": ask_gpt_move},
+}
+
+def send_move(client, game_id, move, time_left):
+    """Sends a move; after a 429 it is sent again once the penalty is over, if the clock allows"""
+    from lichess_transport import is_rate_limited, retry_after
+    try:
+        client.bots.make_move(game_id, move.uci())
+    except Exception as e:
+        if not is_rate_limited(e):
+            raise
+        wait = retry_after(e.response)
+        if wait >= time_left:
+            raise
+        print(f"⏳ Move {move.uci()} rate limited, sending it again in {wait:.0f}s ({time_left:.0f}s on the clock)")
+        time.sleep(wait)
+        client.bots.make_move(game_id, move.uci())
+
+def play_turn(ai, game_id, board, received_at, clock_left=None):
+    """Asks an AI for a move and sends it, with retries. Returns 'played', 'skipped' or 'resigned'.
+    clock_left: seconds left on the AI's clock when the turn started (None if unknown)"""
+    with tracer.span("turn", category="turn", ai=ai, ply=board.ply() + 1) as span:
+        outcome = run_turn(ai, game_id, board, received_at, clock_left)
+        span.set(outcome=outcome)
+    return outcome
+
+def run_turn(ai, game_id, board, received_at, clock_left=None):
+    """Move attempts of one turn (see play_turn)"""
+    player = AI_PLAYERS[ai]
+    client = get_lichess(ai)
+    label = player["label"]
+    
+    print(f"\n♟️  Move {board.fullmove_number} | {label}'s turn ({player['color']})...")
+    
+    invalid_moves = []  # Store invalid moves
+    failures = {}  # failure class -> count in this turn
+    use_fallback = False
+    # Waiting for an open circuit must not run the clock down
+    if clock_left is None:
+        clock_left = TIME_CONTROL["time"] * 60
+    circuit_wait_left = BREAKER_MAX_CLOCK_SHARE * clock_left
+    
+    for attempt in range(MAX_RETRIES):
+        if attempt == 0:
+            dispatch_latency.add(time.perf_counter() - received_at)
+        
+        # Pass invalid moves to function
+        with tracer.span("ask", ai=ai, attempt=attempt):
+            if use_fallback:
+                candidates, thought = fallback_move(ai, board)
+            else:
+                candidates, thought = player["ask"](board.fen(), player["color"], invalid_moves)
+        
+        kind = None
+        if candidates:  # Check if we got a move
+            with tracer.span("validate", ai=ai, candidates=len(candidates)):
+                move, rejected = resolve_candidates(candidates, board, log=print)
+            # Illegal candidates are listed in the prompt of any new request
+            invalid_moves.extend(rejected)
+            
+            if move:
+                if rejected:
+                    candidate_saves[ai] += len(rejected)
+                    print(f"🎯 {label}: candidate #{len(rejected) + 1} played, "
+                          f"{len(rejected)} illegal skipped without a new request")
+                try:
+                    with tracer.span("make_move", ai=ai, move=move.uci()):
+                        send_move(client, game_id, move, clock_left - (time.perf_counter() - received_at))
+                    print(f"✅ {label} plays: {move.uci()}")
+                    if board.ply() == 0 and game_created_at:
+                        ttfm = time.perf_counter() - game_created_at
+                        time_to_first_move.add(ttfm)
+                        print(f"⏱️  Time to first move: {ttfm:.1f}s")
+                    with tracer.span("record_move", ai=ai):
+                        record_move(ai, move, thought, attempt)
+                        cache_move(ai, board, move, thought)
+                    with tracer.span("save_state", ai=ai):
+                        save_game_state(last_move=f"{label}: {move.uci()}", **{f"{ai}_thought": thought})
+                    with tracer.span("viewer_pause", ai=ai):
+                        time.sleep(3)  # Pause to allow viewers to see the move
+                    return 'played'
+                except Exception as e:
+                    error_msg = str(e)
+                    print(f"❌ Error sending move: {e}")
+                    # If "not your turn", stop immediately - don't retry
+                    if "not your turn" in error_msg.lower():
+                        print("⚠️  Skipping - waiting for next gameState event")
+                        return 'skipped'
+                    time.sleep(1)
+            else:
+                print(f"⚠️  Invalid move (attempt {attempt+1}/{MAX_RETRIES}): {', '.join(candidates)}")
+                kind = ILLEGAL_MOVE
+        else:
+            kind = ai_call_stats[ai].get("error") or UNPARSEABLE
+        
+        delay = 0.0
+        if kind:
+            failures[kind] = failures.get(kind, 0) + 1
+            delay = retry_delay(kind, failures[kind] - 1, ai_call_stats[ai].get("retry_after"))
+            if delay is None and PROVIDER_FALLBACK == 'heuristic':
+                use_fallback = True
+                delay = 0.0
+            elif kind == CIRCUIT_OPEN and delay:
+                if delay > circuit_wait_left:
+                    print(f"⛔ {label}: provider still unavailable, no more clock to wait "
+                          f"({clock_left:.0f}s left at turn start)")
+                    use_fallback = True
+                    delay = 0.0
+                else:
+                    circuit_wait_left -= delay
+        
+        if attempt == MAX_RETRIES - 1 or delay is None:
+            if delay is None:
+                print(f"❌ {label}: {kind} error is not retryable. Resigning.")
+            else:
+                print(f"❌ {label} couldn't play a valid move. Resigning.")
+            try:
+                client.bots.resign_game(game_id)
+            except:
+                pass
+            return 'resigned'
+        
+        if delay:
+            print(f"⏳ {label}: {kind}, retrying in {delay:.1f}s")
+            time.sleep(delay)
+    
+    return 'resigned'
 
 def display_scores():
     """Displays the score table"""
@@ -1230,52 +1084,117 @@ def display_scores():
     print(f"{'-'*60}")
     print(f"📊 Total games    : {scores['total']}")
     print(f"⏱️  Elapsed time     : {hours}h {minutes}min")
+    from lichess_transport import move_rtt, stream_monitor
+    
+    publisher_stats = get_state_publisher().stats()
+    print(f"💾 State publishes : {publisher_stats['publishes']} | writes: {publisher_stats['writes']} "
+          f"(p95 {publisher_stats['write_latency']['p95_ms']} ms)")
+    rtt = move_rtt.summary()
+    dispatch = dispatch_latency.summary()
+    ttfm = time_to_first_move.summary()
+    print(f"🚀 Time to 1st move : p50 {ttfm['p50_ms']} ms | p95 {ttfm['p95_ms']} ms")
+    print(f"⚡ Dispatch latency : p50 {dispatch['p50_ms']} ms | p95 {dispatch['p95_ms']} ms")
+    print(f"📡 Move RTT         : p50 {rtt['p50_ms']} ms | p95 {rtt['p95_ms']} ms ({rtt['count']} moves)")
+    for ai in ("claude", "gpt"):
+        llm = llm_latency[ai].summary()
+        print(f"🧠 {ai.upper():<6} LLM time  : p50 {llm['p50_ms']} ms | p95 {llm['p95_ms']} ms")
+        ttft = llm_ttft[ai].summary()
+        if ttft['count']:
+            print(f"⏩ {ai.upper():<6} 1st token : p50 {ttft['p50_ms']} ms | p95 {ttft['p95_ms']} ms | "
+                  f"closed early {early_closes[ai]}/{ttft['count']}")
+        if MOVE_CANDIDATES > 1:
+            print(f"🎯 {ai.upper():<6} candidates: {candidate_saves[ai]} retry calls saved")
+    if move_cache:
+        cache = move_cache.stats()
+        print(f"📦 Move cache       : {cache['hits']} hits / {cache['misses']} misses "
+              f"(hit rate {cache['hit_rate']}) | {cache['entries']} moves, {cache['evictions']} evicted")
+    if adjudicator:
+        from adjudication import load_entries, summarize
+        saved = summarize(load_entries(ADJUDICATION_LOG))
+        print(f"⚖️  Adjudication     : {saved['adjudicated_games']} games adjudicated, "
+              f"~{saved.get('estimated_plies_saved', '?')} plies / ~{saved.get('estimated_tokens_saved', '?')} "
+              f"tokens saved | shadow: {saved['shadow_games']} games, "
+              f"{saved['shadow_plies_after_trigger']} plies after trigger")
+    spend = budget.snapshot()
+    print(f"💸 Spend           : ${spend['total']['usd']:.2f} total | ${spend['usd_per_hour']:.2f}/h | "
+          f"projected ${spend['projected_usd_per_day']:.2f}/day | "
+          f"${spend['usd_per_game'] or 0:.3f}/game | level {spend['level']}")
+    if rating_book and rating_book.ratings['players']:
+        ratings = rating_book.ratings
+        print(f"🏅 Ratings ({ratings['games']} games, white advantage {ratings['white_advantage']:+} Elo):")
+        for player in ratings['players'][:5]:
+            print(f"   {player['player']:<36} {player['rating']:>5} [{player['ci_low']}, {player['ci_high']}]")
+    for name, breaker in provider_breakers.items():
+        snapshot = breaker.snapshot()
+        print(f"🔌 Provider {name:<9}: circuit {snapshot['state']} | trips: {snapshot['trips']} | "
+              f"last error: {snapshot['last_error'] or '-'}")
+    sessions = lichess_sessions.values()
+    print(f"🚦 Lichess 429s    : {sum(s.rate_limited for s in sessions)} | "
+          f"retries: {sum(s.retries for s in sessions)}")
+    streams = stream_monitor.snapshot()
+    print(f"🔄 Lichess streams : {len(streams['open'])} open | reconnects: {streams['reconnects']} | "
+          f"stalls: {streams['stalls']} | outage p50 {streams['outage']['p50_ms']} ms, "
+          f"p95 {streams['outage']['p95_ms']} ms")
     print(f"{'='*60}\n")
 
 # === HTTP SERVER FOR VIEWER ===
 
 def start_http_server():
-    """Starts an HTTP server to serve the HTML viewer"""
+    """Starts a threaded HTTP server for the viewer and the in-memory state"""
     try:
-        # Change working directory to serve local files
-        os.chdir(os.path.dirname(os.path.abspath(__file__)) or '.')
-        
         port = int(os.environ.get('PORT', 8000))
-        server = HTTPServer(('0.0.0.0', port), SimpleHTTPRequestHandler)
+        server = create_server(state_store, port=port)
         print(f"🌐 Web server started on port {port}")
+        http_ready.set()
         server.serve_forever()
     except Exception as e:
         print(f"⚠️  HTTP server error: {e}")
 
 # === MAIN LOOP ===
 
+def wait_until_ready(timeout=10):
+    """Waits for the HTTP server and both bots' event streams (gives up after timeout)"""
+    deadline = time.monotonic() + timeout
+    waits = [("HTTP server", http_ready)]
+    waits += [(f"{ai} event stream", lichess_sessions[ai].event_stream_open) for ai in ('gpt', 'claude')]
+    for name, event in waits:
+        if not event.wait(max(0, deadline - time.monotonic())):
+            print(f"⚠️  {name} not ready after {timeout}s, starting anyway")
+
 def main():
     """Main function - infinite game loop"""
-    global gpt_listener_running
+    global gpt_listener_running, start_watcher
     
     print("\n🚀 Starting AI Battle!")
     print("⚠️  Press Ctrl+C to stop cleanly\n")
     
-    # Initialize game_state.json with default state
-    save_game_state()
-    
-    # Start HTTP server in separate thread
+    # Start HTTP server in separate thread (binds while the clients are set up)
     http_thread = threading.Thread(target=start_http_server, daemon=True)
     http_thread.start()
-    time.sleep(1)  # Let server start
+    
+    if not initialize():
+        sys.exit(1)
+    
+    # Initialize game_state.json with default state
+    save_game_state()
     
     # Start listening thread for GPT bot
     gpt_thread = threading.Thread(target=gpt_challenge_listener, daemon=True)
     gpt_thread.start()
     
-    # Wait for thread to start
-    time.sleep(3)
+    # Keep Claude's event stream open so each new game is seen on a warm connection
+    start_watcher = GameStartWatcher(get_lichess('claude'), log=print).start()
+    
+    # Start as soon as the server is bound and both event streams are open
+    wait_until_ready()
     
     game_number = 1
     
     try:
         while True:
             result = play_game(game_number)
+            close_game_record(result)
+            export_game_trace()
             
             if result:
                 scores['total'] += 1
@@ -1303,6 +1222,8 @@ def main():
         print("\n\n🛑 Stopped by user")
         gpt_listener_running = False
         display_scores()
+        if state_publisher:
+            state_publisher.flush()
         print("👋 Thanks for using AI Battle!\n")
         sys.exit(0)
     
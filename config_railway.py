@@ -1,3 +1,4 @@
+import json
 import os
 
 # Configuration pour Railway - lit les variables d'environnement
@@ -20,8 +21,148 @@ TIME_CONTROL = {
 }
 
 # Modèles IA à utiliser
-CLAUDE_MODEL = "claude-haiku-4-5-20251001"  # Haiku 4.5 - 4x moins cher que Sonnet
-GPT_MODEL = "gpt-4o-mini"
+CLAUDE_MODEL = os.environ.get('CLAUDE_MODEL', "claude-haiku-4-5-20251001")  # Haiku 4.5 - 4x moins cher que Sonnet
+GPT_MODEL = os.environ.get('GPT_MODEL', "gpt-4o-mini")
 
 # Nombre maximum de tentatives pour un coup invalide
 MAX_RETRIES = 30
+
+# === ARCHIVE PGN ===
+# Dossier de l'archive PGN (un fichier par jour, écrit coup par coup)
+PGN_ARCHIVE_DIR = os.environ.get('PGN_ARCHIVE_DIR', 'archive')
+# Archive binaire compacte (16 bits par demi-coup, lecture par mmap) des parties terminées
+BINARY_ARCHIVE_ENABLED = os.environ.get('BINARY_ARCHIVE_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+BINARY_ARCHIVE_PATH = os.environ.get('BINARY_ARCHIVE_PATH', os.path.join(PGN_ARCHIVE_DIR, 'games.bin'))
+
+# === PUBLICATION DE L'ÉTAT ===
+# Intervalle minimum (secondes) entre deux écritures de game_state.json
+STATE_WRITE_INTERVAL = float(os.environ.get('STATE_WRITE_INTERVAL', 1.0))
+
+# === TRANSPORT LICHESS ===
+# Taille du pool de connexions keep-alive par bot (flux + appels)
+LICHESS_POOL_SIZE = int(os.environ.get('LICHESS_POOL_SIZE', 10))
+# Limiteur par token : requêtes par seconde et rafale maximum
+LICHESS_RATE_PER_SEC = float(os.environ.get('LICHESS_RATE_PER_SEC', 2.0))
+LICHESS_BURST = int(os.environ.get('LICHESS_BURST', 8))
+# Nouvelles tentatives pour les appels idempotents (et après un 429)
+LICHESS_MAX_RETRIES = int(os.environ.get('LICHESS_MAX_RETRIES', 3))
+# Silence maximum (secondes, ni événement ni battement) avant de couper et rouvrir un flux
+# (Lichess envoie une ligne vide toutes les ~7 s)
+LICHESS_STREAM_TIMEOUT = float(os.environ.get('LICHESS_STREAM_TIMEOUT', 20.0))
+# Réouvertures successives d'un flux de partie avant abandon
+LICHESS_STREAM_RECONNECTS = int(os.environ.get('LICHESS_STREAM_RECONNECTS', 5))
+
+# === CLASSEMENT ===
+# Journal des résultats (une partie par ligne) et classement Bradley-Terry recalculé après chaque partie
+RATINGS_LOG = os.environ.get('RATINGS_LOG', 'results.jsonl')
+# Regroupement des joueurs : 'config' (modèle + mode de prompt) ou 'model'
+RATINGS_GROUP_BY = os.environ.get('RATINGS_GROUP_BY', 'config')
+# Tirages bootstrap pour les intervalles de confiance à 95 %
+RATINGS_BOOTSTRAP = int(os.environ.get('RATINGS_BOOTSTRAP', 200))
+
+# === DÉMARRAGE RAPIDE ===
+# Crée le défi puis l'accepte aussitôt avec le client du bot GPT (sans attendre l'écouteur de défis),
+# repli sur l'écouteur de défis en cas d'échec
+FAST_START = os.environ.get('FAST_START', 'true').lower() in ('1', 'true', 'yes')
+
+# === FOURNISSEURS IA ===
+# Un fournisseur = une API (type "anthropic", "openai" ou "openai_compatible")
+# avec sa limite d'appels simultanés et son espacement minimum entre appels
+LLM_PROVIDERS = {
+    "anthropic": {"type": "anthropic", "api_key": ANTHROPIC_API_KEY, "max_concurrency": 2, "min_interval": 0.0},
+    "openai": {"type": "openai", "api_key": OPENAI_API_KEY, "max_concurrency": 2, "min_interval": 0.0},
+}
+
+# Serveur local compatible OpenAI (llama.cpp, vLLM, Ollama...), activé si l'URL est définie
+if os.environ.get('LOCAL_LLM_BASE_URL'):
+    LLM_PROVIDERS["local"] = {
+        "type": "openai_compatible",
+        "base_url": os.environ.get('LOCAL_LLM_BASE_URL'),
+        "api_key": os.environ.get('LOCAL_LLM_API_KEY'),
+        "max_concurrency": int(os.environ.get('LOCAL_LLM_CONCURRENCY', 1)),
+        "min_interval": 0.0,
+    }
+
+# Fournisseur et modèle utilisés par chaque bot
+AI_PLAYER_MODELS = {
+    "claude": {"provider": os.environ.get('CLAUDE_PROVIDER', 'anthropic'), "model": CLAUDE_MODEL},
+    "gpt": {"provider": os.environ.get('GPT_PROVIDER', 'openai'), "model": GPT_MODEL},
+}
+
+# Paramètres de génération des coups
+MOVE_MAX_TOKENS = 80  # Réduit pour éviter les timeouts
+MOVE_TEMPERATURE = 0.6  # Équilibré : ni trop aléatoire, ni trop lent
+# Réponses en streaming : le flux est fermé dès qu'un coup légal et sa pensée sont lus
+LLM_STREAMING = os.environ.get('LLM_STREAMING', 'false').lower() in ('1', 'true', 'yes')
+
+# === ANALYSE MOTEUR ===
+# Moteur UCI local pour l'analyse d'après-partie (désactivée s'il est introuvable)
+ENGINE_PATH = os.environ.get('ENGINE_PATH', 'stockfish')
+# Nombre de processus moteur et profondeur d'analyse par position
+ENGINE_WORKERS = int(os.environ.get('ENGINE_WORKERS', 2))
+ENGINE_DEPTH = int(os.environ.get('ENGINE_DEPTH', 12))
+
+# === CACHE DES COUPS ===
+# Rejoue les coups déjà joués par un modèle dans la même position (désactivé par défaut)
+MOVE_CACHE_ENABLED = os.environ.get('MOVE_CACHE_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+MOVE_CACHE_PATH = os.environ.get('MOVE_CACHE_PATH', 'move_cache.sqlite3')
+# Nombre maximum de coups gardés (les moins récemment utilisés sont supprimés)
+MOVE_CACHE_MAX_ENTRIES = int(os.environ.get('MOVE_CACHE_MAX_ENTRIES', 50000))
+# "replay" : toujours le coup le plus fréquent, "sample" : tirage selon la fréquence
+MOVE_CACHE_MODE = os.environ.get('MOVE_CACHE_MODE', 'sample')
+
+# === TRACES ===
+# Spans de chaque étape d'un coup, exportés par partie au format Chrome trace (désactivé par défaut)
+TRACE_ENABLED = os.environ.get('TRACE_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+TRACE_DIR = os.environ.get('TRACE_DIR', 'traces')
+# Nombre maximum d'événements gardés en mémoire (tampon circulaire)
+TRACE_BUFFER_SIZE = int(os.environ.get('TRACE_BUFFER_SIZE', 20000))
+
+# === FORMAT DU PROMPT ===
+# "full" : plateau ASCII, analyse et règles complètes ; "compact" : FEN + coups légaux en SAN
+PROMPT_MODE = os.environ.get('PROMPT_MODE', 'full')
+# Coups candidats demandés par réponse (classés) : le premier légal est joué sans nouvel appel (1 = un seul coup)
+MOVE_CANDIDATES = int(os.environ.get('MOVE_CANDIDATES', 1))
+
+# === BUDGET ===
+# Limites de dépense (0 = pas de limite) : tokens et dollars par partie et sur la dernière heure
+BUDGET_GAME_TOKENS = int(os.environ.get('BUDGET_GAME_TOKENS', 0))
+BUDGET_GAME_USD = float(os.environ.get('BUDGET_GAME_USD', 0))
+BUDGET_HOUR_TOKENS = int(os.environ.get('BUDGET_HOUR_TOKENS', 0))
+BUDGET_HOUR_USD = float(os.environ.get('BUDGET_HOUR_USD', 0))
+# Part d'une limite à partir de laquelle chaque niveau s'applique :
+# prompt compact, max_tokens réduit, modèle moins cher, coups heuristiques locaux
+BUDGET_THRESHOLDS = tuple(float(x) for x in os.environ.get('BUDGET_THRESHOLDS', '0.6,0.75,0.9,1.0').split(','))
+# max_tokens au niveau réduit
+BUDGET_LEAN_MAX_TOKENS = int(os.environ.get('BUDGET_LEAN_MAX_TOKENS', 40))
+# Modèles moins chers (même fournisseur) au niveau 'cheap' ; non défini = modèle inchangé
+BUDGET_CHEAP_MODELS = {
+    "claude": os.environ.get('BUDGET_CHEAP_CLAUDE_MODEL'),
+    "gpt": os.environ.get('BUDGET_CHEAP_GPT_MODEL'),
+}
+# Prix en dollars par million de tokens, ajoutés à la table intégrée : {"modèle": [entrée, sortie]}
+BUDGET_PRICES = json.loads(os.environ.get('BUDGET_PRICES', '{}'))
+
+# === POLITIQUE DE RETRY ===
+# Disjoncteur par fournisseur IA : ouvert après N échecs consécutifs, nouvel essai après X secondes
+BREAKER_FAILURE_THRESHOLD = int(os.environ.get('BREAKER_FAILURE_THRESHOLD', 5))
+BREAKER_RESET_TIMEOUT = float(os.environ.get('BREAKER_RESET_TIMEOUT', 30))
+# Quand le fournisseur est indisponible : "none" (attendre) ou "heuristic" (coup heuristique immédiat)
+PROVIDER_FALLBACK = os.environ.get('PROVIDER_FALLBACK', 'none')
+# Avec "none" : part maximale du temps restant à la pendule passée à attendre pendant un coup,
+# ensuite un coup heuristique est joué
+BREAKER_MAX_CLOCK_SHARE = float(os.environ.get('BREAKER_MAX_CLOCK_SHARE', 0.25))
+
+# === ADJUDICATION ===
+# "off", "shadow" (note seulement quand une partie aurait été arbitrée) ou "on" (abandon / nulle via l'API bot)
+ADJUDICATION_MODE = os.environ.get('ADJUDICATION_MODE', 'off')
+# Moteur UCI pour l'évaluation (vide : simple décompte du matériel)
+ADJUDICATION_ENGINE = os.environ.get('ADJUDICATION_ENGINE', '')
+# Abandon : avance d'au moins N centipions pendant N demi-coups consécutifs
+ADJUDICATION_RESIGN_MARGIN = int(os.environ.get('ADJUDICATION_RESIGN_MARGIN', 900))
+ADJUDICATION_RESIGN_PLIES = int(os.environ.get('ADJUDICATION_RESIGN_PLIES', 8))
+# Nulle : écart d'au plus N centipions pendant N demi-coups, après le demi-coup 80 et avec peu de pièces
+ADJUDICATION_DRAW_MARGIN = int(os.environ.get('ADJUDICATION_DRAW_MARGIN', 50))
+ADJUDICATION_DRAW_PLIES = int(os.environ.get('ADJUDICATION_DRAW_PLIES', 20))
+# Journal des parties arbitrées (plies et tokens économisés)
+ADJUDICATION_LOG = os.environ.get('ADJUDICATION_LOG', 'adjudications.jsonl')
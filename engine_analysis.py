@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Engine Analysis - AI Battle
+===========================
+Post-game analysis with a local UCI engine (Stockfish or any UCI engine).
+Every position of a finished game is evaluated by a pool of engine
+processes. Each bot gets centipawn loss, inaccuracy, mistake and blunder
+counts, and accuracy (Lichess win% formula).
+
+Games are queued on a dispatcher thread, so the game loop never waits.
+"""
+
+import json
+import math
+import os
+import queue
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import chess
+import chess.engine
+
+# Mate scores are turned into large centipawn values, then evaluations are capped
+MATE_SCORE = 10000
+EVAL_CAP = 1000
+
+# Centipawn loss thresholds
+INACCURACY = 50
+MISTAKE = 100
+BLUNDER = 300
+
+
+def find_engine(path):
+    """Full path of the engine executable, or None if it cannot be found"""
+    if not path:
+        return None
+    if os.path.isfile(path) and os.access(path, os.X_OK):
+        return os.path.abspath(path)
+    return shutil.which(path)
+
+
+# === ENGINE POOL ===
+
+def evaluate_board(engine, board, limit):
+    """Engine evaluation of a position in centipawns, from White's point of view"""
+    if board.is_checkmate():
+        return -MATE_SCORE if board.turn == chess.WHITE else MATE_SCORE
+    if board.is_game_over():
+        return 0
+    info = engine.analyse(board, limit)
+    return info["score"].white().score(mate_score=MATE_SCORE)
+
+
+class EnginePool:
+    """Fixed set of engine processes; each evaluation borrows one of them"""
+
+    def __init__(self, engine_path, size=2, depth=12, time_limit=None, hash_mb=64):
+        self.engine_path = engine_path
+        self.hash_mb = hash_mb
+        self.limit = chess.engine.Limit(depth=depth, time=time_limit)
+        self.idle = queue.Queue()
+        for _ in range(size):
+            self.idle.put(self.open_engine())
+        # One thread per engine process: the search runs in the engines, threads only wait on pipes
+        self.executor = ThreadPoolExecutor(max_workers=size, thread_name_prefix="engine")
+        self.size = size
+
+    def open_engine(self):
+        engine = chess.engine.SimpleEngine.popen_uci(self.engine_path)
+        options = {"Threads": 1, "Hash": self.hash_mb}
+        engine.configure({name: value for name, value in options.items() if name in engine.options})
+        return engine
+
+    def evaluate(self, fen):
+        """Evaluates one position, restarting the engine once if it died"""
+        engine = self.idle.get()
+        try:
+            try:
+                return evaluate_board(engine, chess.Board(fen), self.limit)
+            except chess.engine.EngineTerminatedError:
+                engine = self.open_engine()
+                return evaluate_board(engine, chess.Board(fen), self.limit)
+        finally:
+            self.idle.put(engine)
+
+    def evaluate_all(self, fens):
+        """Evaluations of several positions, spread over the engines"""
+        return list(self.executor.map(self.evaluate, fens))
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        while not self.idle.empty():
+            try:
+                self.idle.get_nowait().quit()
+            except Exception:
+                pass
+
+
+# === SCORING ===
+
+def win_percent(cp):
+    """Winning chances (0-100) for a centipawn evaluation"""
+    return 50 + 50 * (2 / (1 + math.exp(-0.00368208 * cp)) - 1)
+
+
+def move_accuracy(win_before, win_after):
+    """Accuracy (0-100) of a move from the mover's winning chances before and after it"""
+    accuracy = 103.1668 * math.exp(-0.04354 * (win_before - win_after)) - 3.1669
+    return max(0.0, min(100.0, accuracy))
+
+
+def classify_loss(loss):
+    """'blunder', 'mistake', 'inaccuracy' or None"""
+    if loss >= BLUNDER:
+        return 'blunder'
+    if loss >= MISTAKE:
+        return 'mistake'
+    if loss >= INACCURACY:
+        return 'inaccuracy'
+    return None
+
+
+def game_positions(moves):
+    """FEN of every position of the game, starting position included"""
+    board = chess.Board()
+    fens = [board.fen()]
+    for move_uci in moves:
+        board.push_uci(move_uci)
+        fens.append(board.fen())
+    return fens
+
+
+def score_game(moves, evals, players):
+    """Per-ply losses and per-bot summary from the evaluations (len(moves) + 1 values)"""
+    plies = []
+    per_color = {chess.WHITE: [], chess.BLACK: []}
+    for index, move_uci in enumerate(moves):
+        color = chess.WHITE if index % 2 == 0 else chess.BLACK
+        sign = 1 if color == chess.WHITE else -1
+        before = max(-EVAL_CAP, min(EVAL_CAP, evals[index])) * sign
+        after = max(-EVAL_CAP, min(EVAL_CAP, evals[index + 1])) * sign
+        loss = max(0, before - after)
+        ply = {
+            "ply": index + 1,
+            "move": move_uci,
+            "eval": evals[index + 1],
+            "cp_loss": loss,
+            "class": classify_loss(loss),
+            "accuracy": round(move_accuracy(win_percent(before), win_percent(after)), 1),
+        }
+        plies.append(ply)
+        per_color[color].append(ply)
+
+    summary = {}
+    for color, name in ((chess.WHITE, players['white']), (chess.BLACK, players['black'])):
+        own = per_color[color]
+        summary[name] = {
+            "color": 'white' if color == chess.WHITE else 'black',
+            "moves": len(own),
+            "acpl": round(sum(p["cp_loss"] for p in own) / len(own), 1) if own else None,
+            "inaccuracies": sum(p["class"] == 'inaccuracy' for p in own),
+            "mistakes": sum(p["class"] == 'mistake' for p in own),
+            "blunders": sum(p["class"] == 'blunder' for p in own),
+            "accuracy": round(sum(p["accuracy"] for p in own) / len(own), 1) if own else None,
+        }
+    return plies, summary
+
+
+# === ANALYZER ===
+
+class GameAnalyzer:
+    """Queues finished games and analyses them in the background"""
+
+    def __init__(self, engine_path, workers=2, depth=12, time_limit=None, hash_mb=64,
+                 output_dir=None, log=print):
+        self.engine_path = engine_path
+        self.workers = workers
+        self.depth = depth
+        self.time_limit = time_limit
+        self.hash_mb = hash_mb
+        self.output_dir = output_dir
+        self.log = log
+
+        self.pool = None
+        self.pool_lock = threading.Lock()
+        # One game at a time; its positions are spread over the engine pool
+        self.dispatcher = ThreadPoolExecutor(max_workers=1, thread_name_prefix="analysis")
+
+    def get_pool(self):
+        """Starts the engine processes on first use"""
+        with self.pool_lock:
+            if self.pool is None:
+                self.pool = EnginePool(self.engine_path, self.workers, self.depth,
+                                       self.time_limit, self.hash_mb)
+            return self.pool
+
+    def submit(self, game_id, moves, players, on_done=None):
+        """Queues a finished game (list of UCI moves). Returns a future of the report"""
+        return self.dispatcher.submit(self.run, game_id, list(moves), players, on_done)
+
+    def analyse(self, game_id, moves, players):
+        """Evaluates every position and builds the report"""
+        evals = self.get_pool().evaluate_all(game_positions(moves))
+        plies, summary = score_game(moves, evals, players)
+        return {
+            "game_id": game_id,
+            "engine": os.path.basename(self.engine_path),
+            "depth": self.depth,
+            "time_limit": self.time_limit,
+            "summary": summary,
+            "plies": plies,
+        }
+
+    def run(self, game_id, moves, players, on_done):
+        """Dispatcher thread: analyses, stores and reports one game"""
+        try:
+            report = self.analyse(game_id, moves, players)
+        except Exception as e:
+            self.log(f"⚠️  Engine analysis of {game_id} failed: {e}")
+            return None
+
+        if self.output_dir:
+            try:
+                self.save(report)
+            except Exception as e:
+                self.log(f"⚠️  Cannot save analysis of {game_id}: {e}")
+        if on_done:
+            on_done(report)
+        return report
+
+    def save(self, report):
+        """Stores the report next to the archived game"""
+        os.makedirs(self.output_dir, exist_ok=True)
+        path = os.path.join(self.output_dir, f"{report['game_id']}.analysis.json")
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        return path
+
+    def shutdown(self):
+        """Waits for queued games, then stops the engine processes"""
+        self.dispatcher.shutdown(wait=True)
+        if self.pool:
+            self.pool.close()
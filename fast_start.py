@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Fast Start - AI Battle
+======================
+Starts games without waiting for the challenge/accept handshake: the
+challenger creates the challenge and the opponent's client accepts it right
+away, instead of waiting for the challenge to show up on the opponent's
+event stream. A watcher keeps the challenger's incoming-events stream open
+between games, so the next gameStart is seen on an already-open connection.
+
+Creating the challenge with the opponent's token (acceptByToken, berserk's
+challenges.create_with_accept) did it in one call, but berserk deprecates
+it since 0.12.7 and Lichess no longer supports it.
+"""
+
+import threading
+import time
+
+from metrics import LatencyStats
+
+# From the challenge request to the first move accepted by Lichess
+time_to_first_move = LatencyStats()
+
+
+def extract_challenge_id(response):
+    """Finds the game/challenge ID in a challenge creation response"""
+    if isinstance(response, str):
+        return response
+    if not isinstance(response, dict):
+        return None
+    for key in ("game", "challenge"):
+        value = response.get(key)
+        if isinstance(value, dict) and value.get("id"):
+            return value["id"]
+    return response.get("id")
+
+
+def create_accepted_game(client, opponent_client, opponent_username, clock_limit, clock_increment, color):
+    """Creates a challenge and accepts it at once with the opponent's client. Returns the game ID"""
+    response = client.challenges.create(
+        opponent_username,
+        rated=False,
+        clock_limit=clock_limit,
+        clock_increment=clock_increment,
+        color=color
+    )
+    challenge_id = extract_challenge_id(response)
+    if not challenge_id:
+        return None
+    try:
+        opponent_client.challenges.accept(challenge_id)
+    except Exception:
+        # Do not leave a pending challenge behind for the fallback to trip over
+        try:
+            client.challenges.cancel(challenge_id)
+        except Exception:
+            pass
+        raise
+    # An accepted challenge becomes the game with the same ID
+    return challenge_id
+
+
+# Lichess refuses the fast path itself (token, scope or endpoint): retrying will not help.
+# Other errors (400 for a busy bot, 429...) only concern the current game
+UNSUPPORTED_STATUSES = (401, 403, 404)
+
+
+def is_unsupported(error):
+    """True when the fast path cannot work for this process (see UNSUPPORTED_STATUSES)"""
+    return getattr(error, "status_code", None) in UNSUPPORTED_STATUSES
+
+
+class GameStartWatcher:
+    """Keeps a bot's incoming-events stream open and remembers gameStart events"""
+
+    def __init__(self, client, log=print):
+        self.client = client
+        self.log = log
+        self.lock = threading.Lock()
+        self.started = {}
+        self.new_game = threading.Condition(self.lock)
+        self.connected = threading.Event()
+        self.running = True
+        self.thread = threading.Thread(target=self.watch, daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.running = False
+
+    def watch(self):
+        """Watcher thread: reconnects with backoff if the stream drops"""
+        # Imported here so that importing this module does not load berserk
+        from lichess_transport import backoff_delay, is_rate_limited, RATE_LIMIT_PENALTY
+
+        failures = 0
+        while self.running:
+            delay = 1.0
+            try:
+                stream = self.client.bots.stream_incoming_events()
+                self.connected.set()
+                for event in stream:
+                    if not self.running:
+                        break
+                    failures = 0
+                    if event.get('type') == 'gameStart':
+                        game = event.get('game', {})
+                        game_id = game.get('gameId') or game.get('id')
+                        if game_id:
+                            with self.new_game:
+                                self.started[game_id] = time.monotonic()
+                                self.new_game.notify_all()
+            except Exception as e:
+                if not self.running:
+                    break
+                delay = RATE_LIMIT_PENALTY if is_rate_limited(e) else backoff_delay(failures, base=1.0)
+                failures += 1
+                self.log(f"⚠️  Game start watcher error: {e} (reconnecting in {delay:.1f}s)")
+            self.connected.clear()
+            if self.running:
+                time.sleep(delay)
+
+    def wait_for(self, game_id, timeout):
+        """Waits until gameStart was seen for game_id (True) or the timeout expires"""
+        deadline = time.monotonic() + timeout
+        with self.new_game:
+            while game_id not in self.started:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self.new_game.wait(remaining)
+            return True
+
+    def forget(self, game_id):
+        """Drops a finished game"""
+        with self.lock:
+            self.started.pop(game_id, None)
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Game Runner - AI Battle
+=======================
+One state machine per game. Each bot reads its own Lichess game stream in a
+thread and pushes events into a shared queue; the runner applies them in
+order and asks the side to move for a move on the first event that puts it
+on move (duplicate events from the other stream are ignored).
+
+A stream that fails or stalls (the transport gives streams a read deadline)
+is reopened with backoff; the gameFull event it starts with resyncs the
+board, so moves missed during the outage are applied on reconnect.
+"""
+
+import queue
+import threading
+import time
+
+import chess
+
+from metrics import LatencyStats
+from retry_policy import backoff_delay
+from tracing import tracer
+
+# Statuses that mean the game never really started
+CANCELLED_STATUSES = ("aborted", "noStart")
+
+# Time from the event that puts a side on move to the start of its LLM call
+dispatch_latency = LatencyStats()
+
+
+class GameRunner:
+    """Consumes both bots' game streams and dispatches move requests"""
+
+    def __init__(self, game_id, sides, play_turn, on_moves=None, adjudicate=None, max_reconnects=5, log=print):
+        # sides: {chess.WHITE: (ai_name, berserk_client), chess.BLACK: (...)}
+        # adjudicate(board): called on each new position, returns a result to end the game early
+        self.game_id = game_id
+        self.sides = sides
+        self.play_turn = play_turn
+        self.on_moves = on_moves
+        self.adjudicate = adjudicate
+        # Reopenings in a row (without any event in between) before a stream is given up
+        self.max_reconnects = max_reconnects
+        self.log = log
+
+        self.events = queue.Queue()
+        self.board = chess.Board()
+        self.moves = ""
+        self.status = "created"
+        self.dispatched_ply = None
+        # Seconds left on each clock at the last event (None until Lichess reports it)
+        self.clocks = {chess.WHITE: None, chess.BLACK: None}
+        self.open_streams = 0
+        self.finished = threading.Event()
+
+    def start_streams(self):
+        """Starts one stream reader thread per bot"""
+        for color, (name, client) in self.sides.items():
+            self.open_streams += 1
+            thread = threading.Thread(target=self.read_stream, args=(name, client), daemon=True)
+            thread.start()
+
+    def read_stream(self, name, client):
+        """Stream reader thread: forwards events with their arrival time, reopening the stream if it drops"""
+        failures = 0
+        while not self.finished.is_set():
+            try:
+                for event in client.bots.stream_game_state(self.game_id):
+                    if self.finished.is_set():
+                        break
+                    failures = 0
+                    self.events.put((name, time.perf_counter(), event))
+                reason = "closed"
+            except Exception as e:
+                reason = f"error: {e}"
+            if self.finished.is_set():
+                break
+            if failures >= self.max_reconnects:
+                self.log(f"⚠️  {name} game stream {reason}, giving up after {failures} reconnects")
+                break
+            # A stream closing right after the last event must not be reopened once the game is over
+            if self.finished.wait(backoff_delay(failures, base=0.5, cap=5.0)):
+                break
+            failures += 1
+            self.log(f"🔄 {name} game stream {reason}, reopening (attempt {failures})")
+            tracer.instant("stream_reconnect", category="stream", bot=name, attempt=failures)
+        # None marks the end of this stream
+        self.events.put((name, time.perf_counter(), None))
+
+    def run(self):
+        """Plays the game to the end. Returns 'claude', 'gpt', 'draw' or None"""
+        self.start_streams()
+        try:
+            while True:
+                name, received_at, event = self.events.get()
+
+                if event is None:
+                    self.open_streams -= 1
+                    if self.open_streams == 0:
+                        self.log("❌ All game streams closed before the end of the game")
+                        return None
+                    continue
+
+                result = self.handle_event(event, received_at)
+                if result is not None:
+                    return result or None
+        finally:
+            self.finished.set()
+
+    def handle_event(self, event, received_at):
+        """Applies one stream event. Returns a result, '' for a cancelled game, or None to continue"""
+        if event.get('type') == 'gameFull':
+            state = event.get('state', {})
+        elif event.get('type') == 'gameState':
+            state = event
+        else:
+            return None
+
+        moves = state.get('moves', '')
+        status = state.get('status', 'started')
+        ply_count = len(moves.split()) if moves else 0
+
+        # The other bot's stream delivers the same events: skip anything not newer
+        if ply_count < len(self.board.move_stack):
+            return None
+        if moves == self.moves and status == self.status:
+            return None
+
+        tracer.instant("stream_event", category="stream", plies=ply_count, status=status)
+        self.update_clocks(state)
+        self.apply_moves(moves)
+        self.status = status
+        if self.on_moves:
+            self.on_moves(moves)
+
+        if status not in ('created', 'started'):
+            return self.finish_by_status(status, state.get('winner'))
+
+        if self.board.is_game_over():
+            return self.finish_by_board()
+
+        if self.adjudicate:
+            result = self.adjudicate(self.board)
+            if result:
+                return result
+
+        return self.dispatch(received_at)
+
+    def update_clocks(self, state):
+        """Reads wtime/btime (milliseconds) from a game state"""
+        for color, key in ((chess.WHITE, 'wtime'), (chess.BLACK, 'btime')):
+            value = state.get(key)
+            if isinstance(value, (int, float)):
+                self.clocks[color] = value / 1000
+
+    def apply_moves(self, moves):
+        """Brings the board up to date, pushing only the new moves"""
+        uci_moves = moves.split() if moves else []
+        played = [move.uci() for move in self.board.move_stack]
+        if uci_moves[:len(played)] != played:
+            self.board = chess.Board()
+            played = []
+        for move_uci in uci_moves[len(played):]:
+            try:
+                self.board.push_uci(move_uci)
+            except ValueError:
+                self.log(f"⚠️  Cannot apply move from stream: {move_uci}")
+                break
+        self.moves = moves
+
+    def dispatch(self, received_at):
+        """Asks the side to move for a move, once per ply"""
+        ply = len(self.board.move_stack)
+        if self.dispatched_ply == ply:
+            return None
+        self.dispatched_ply = ply
+
+        name, client = self.sides[self.board.turn]
+        outcome = self.play_turn(name, self.game_id, self.board.copy(), received_at, self.clocks[self.board.turn])
+        if outcome == 'resigned':
+            return self.sides[not self.board.turn][0]
+        return None
+
+    def finish_by_status(self, status, winner):
+        """Result from the Lichess game status"""
+        self.log(f"\n{'='*60}")
+        self.log(f"🏁 Game over: {status}")
+        if status in CANCELLED_STATUSES:
+            return ''
+        return self.declare(winner)
+
+    def finish_by_board(self):
+        """Result from the chess rules when Lichess has not reported it yet"""
+        result = self.board.result(claim_draw=False)
+        self.log(f"\n{'='*60}")
+        self.log(f"🏁 Game over: {result}")
+        return self.declare({"1-0": 'white', "0-1": 'black'}.get(result))
+
+    def declare(self, winner):
+        """Maps the winning color to the AI name ('draw' if none)"""
+        if winner in ('white', 'black'):
+            name = self.sides[chess.WHITE if winner == 'white' else chess.BLACK][0]
+            self.log(f"🏆 {name.upper()} victory ({winner})!")
+            return name
+        self.log("⚖️  Draw!")
+        return 'draw'
@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Lichess Transport - AI Battle
+=============================
+Shared HTTP layer for the berserk clients:
+- explicit keep-alive connection pool size
+- one token bucket per bot token, paused for a minute after a 429
+- retries with exponential backoff and jitter for idempotent calls (a move
+  post is never held through a 429 penalty: the caller decides, knowing the clock)
+- move submission round-trip time, kept apart from LLM time
+- stream watchdog: streams get a read deadline (Lichess sends a heartbeat
+  line every few seconds, so silence means a dead connection), and every
+  stream's heartbeats, events, stalls and reconnects are tracked
+"""
+
+import re
+import threading
+import time
+
+import berserk
+import requests
+from requests.adapters import HTTPAdapter
+
+from metrics import LatencyStats
+from retry_policy import backoff_delay
+
+LICHESS_URL = "https://lichess.org"
+
+# Lichess asks clients to wait a full minute after a 429
+RATE_LIMIT_PENALTY = 60.0
+
+# POST endpoints that can safely be sent twice
+IDEMPOTENT_POST = re.compile(r"/(accept|decline|cancel|resign|abort|draw/yes)/?$")
+MOVE_PATH = re.compile(r"/api/bot/game/[^/]+/move/")
+EVENT_STREAM_PATH = re.compile(r"/api/stream/event/?$")
+GAME_STREAM_PATH = re.compile(r"/api/bot/game/stream/([^/?]+)")
+
+# Lost streams are forgotten after this long if they were not reopened
+LOST_STREAM_TTL = 600.0
+
+# Round-trip time of make_move calls (both bots)
+move_rtt = LatencyStats()
+
+
+def retry_after(response):
+    """Seconds to wait after a 429 (Retry-After header or the Lichess minute)"""
+    try:
+        return max(float(response.headers.get("Retry-After")), 1.0)
+    except (TypeError, ValueError):
+        return RATE_LIMIT_PENALTY
+
+
+def is_stall(error):
+    """True if a stream read failed because the read deadline passed"""
+    return isinstance(error, (requests.ConnectionError, requests.Timeout)) and "timed out" in str(error).lower()
+
+
+class StreamMonitor:
+    """Last heartbeat and event of each open stream, with stalls, reconnects and outage durations"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.streams = {}
+        self.reconnects = 0
+        self.stalls = 0
+        # From the last line of a lost stream to its reopening
+        self.outages = LatencyStats()
+
+    def watch(self, key, response):
+        """Tracks a stream response by wrapping its iter_lines (used by berserk's stream parser)"""
+        now = time.monotonic()
+        with self.lock:
+            for name, state in list(self.streams.items()):
+                if state["lost_at"] is not None and now - state["lost_at"] > LOST_STREAM_TTL:
+                    del self.streams[name]
+            previous = self.streams.get(key)
+            if previous and previous["lost_at"] is not None:
+                self.reconnects += 1
+                self.outages.add(now - previous["last_line"])
+            self.streams[key] = {
+                "opened": now, "last_line": now, "last_heartbeat": None, "last_event": None,
+                "events": 0, "heartbeats": 0, "lost_at": None,
+                "reconnects": previous["reconnects"] + 1 if previous else 0,
+            }
+
+        original = response.iter_lines
+
+        def iter_lines(*args, **kwargs):
+            error = None
+            try:
+                for line in original(*args, **kwargs):
+                    self.line(key, line)
+                    yield line
+            except Exception as e:
+                error = e
+                raise
+            finally:
+                self.closed(key, error)
+
+        response.iter_lines = iter_lines
+        return response
+
+    def line(self, key, line):
+        now = time.monotonic()
+        with self.lock:
+            state = self.streams.get(key)
+            if state is None:
+                return
+            state["last_line"] = now
+            if line:
+                state["last_event"] = now
+                state["events"] += 1
+            else:
+                state["last_heartbeat"] = now
+                state["heartbeats"] += 1
+
+    def closed(self, key, error):
+        """A stream ended: kept as lost on error (its reopening is a reconnect), dropped otherwise"""
+        with self.lock:
+            state = self.streams.get(key)
+            if state is None:
+                return
+            if error is None:
+                del self.streams[key]
+                return
+            state["lost_at"] = time.monotonic()
+            if is_stall(error):
+                self.stalls += 1
+
+    def snapshot(self):
+        """Counters and, per open stream, seconds since its last heartbeat and event"""
+        now = time.monotonic()
+
+        def ago(moment):
+            return round(now - moment, 1) if moment is not None else None
+
+        with self.lock:
+            open_streams = {
+                key: {
+                    "age_s": ago(state["opened"]),
+                    "since_heartbeat_s": ago(state["last_heartbeat"]),
+                    "since_event_s": ago(state["last_event"]),
+                    "events": state["events"],
+                    "reconnects": state["reconnects"],
+                }
+                for key, state in self.streams.items() if state["lost_at"] is None
+            }
+            counters = {"reconnects": self.reconnects, "stalls": self.stalls}
+        return {**counters, "outage": self.outages.summary(), "open": open_streams}
+
+
+# Every stream of both bots
+stream_monitor = StreamMonitor()
+
+
+class TokenBucket:
+    """Token bucket limiter that can be paused after a rate-limit response"""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Blocks until a request may be sent"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                if now < self.blocked_until:
+                    wait = self.blocked_until - now
+                else:
+                    self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                    self.updated = now
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+                    wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def penalize(self, seconds):
+        """Pauses the bucket (e.g. after a 429)"""
+        with self.lock:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+            self.tokens = 0
+
+
+# One bucket per bot token, shared by every session using that token
+buckets = {}
+buckets_lock = threading.Lock()
+
+
+def get_bucket(token, rate, capacity):
+    """Returns the token bucket of a bot token"""
+    with buckets_lock:
+        if token not in buckets:
+            buckets[token] = TokenBucket(rate, capacity)
+        return buckets[token]
+
+
+class LichessSession(berserk.TokenSession):
+    """TokenSession with pool sizing, rate limiting and retries"""
+
+    def __init__(self, token, pool_size=10, rate=2.0, burst=8, max_retries=3, timeout=15.0,
+                 stream_timeout=20.0, name=None):
+        super().__init__(token)
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.mount("https://", adapter)
+        self.mount("http://", adapter)
+
+        self.bucket = get_bucket(token, rate, burst)
+        self.max_retries = max_retries
+        self.timeout = timeout
+        # Longest silence (no event, no heartbeat) before a stream read fails and the stream is reopened
+        self.stream_timeout = stream_timeout
+        self.name = name or "lichess"
+        self.rate_limited = 0
+        self.retries = 0
+        # Set once the incoming-events stream has been answered (streams open on first read)
+        self.event_stream_open = threading.Event()
+
+    @staticmethod
+    def is_idempotent(method, url):
+        """GETs and accept/decline/cancel/resign/abort calls can be retried"""
+        if method.upper() in ("GET", "HEAD", "OPTIONS"):
+            return True
+        return method.upper() == "POST" and bool(IDEMPOTENT_POST.search(url))
+
+    def stream_key(self, url):
+        """Name of a stream in the monitor: '<bot>/events', '<bot>/game/<id>' or '<bot><path>'"""
+        if EVENT_STREAM_PATH.search(url):
+            return f"{self.name}/events"
+        game = GAME_STREAM_PATH.search(url)
+        if game:
+            return f"{self.name}/game/{game.group(1)}"
+        return self.name + re.sub(r"^https?://[^/]+", "", url)
+
+    def request(self, method, url, *args, **kwargs):
+        stream = kwargs.get("stream", False)
+        if stream:
+            kwargs.setdefault("timeout", (self.timeout, self.stream_timeout))
+        else:
+            kwargs.setdefault("timeout", self.timeout)
+        # Streams are reopened by their caller, never replayed here
+        idempotent = not stream and self.is_idempotent(method, url)
+        is_move = bool(MOVE_PATH.search(url))
+
+        attempt = 0
+        while True:
+            self.bucket.acquire()
+            start = time.perf_counter()
+            try:
+                response = super().request(method, url, *args, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                if idempotent and attempt < self.max_retries:
+                    self.retries += 1
+                    time.sleep(backoff_delay(attempt))
+                    attempt += 1
+                    continue
+                raise
+            if is_move:
+                move_rtt.add(time.perf_counter() - start)
+            if stream and response.status_code == 200:
+                if EVENT_STREAM_PATH.search(url):
+                    self.event_stream_open.set()
+                stream_monitor.watch(self.stream_key(url), response)
+
+            if response.status_code == 429:
+                self.rate_limited += 1
+                self.bucket.penalize(retry_after(response))
+                # A 429 was not processed, so any call can be sent again; but waiting out
+                # the penalty may cost a move its whole clock, so moves fail at once
+                if not stream and not is_move and attempt < self.max_retries:
+                    self.retries += 1
+                    attempt += 1
+                    response.close()
+                    continue
+                return response
+
+            if response.status_code >= 500 and idempotent and attempt < self.max_retries:
+                self.retries += 1
+                response.close()
+                time.sleep(backoff_delay(attempt))
+                attempt += 1
+                continue
+
+            return response
+
+
+def create_client(token, pool_size=10, rate=2.0, burst=8, max_retries=3, stream_timeout=20.0, name=None):
+    """Builds a berserk client on top of the shared transport"""
+    session = LichessSession(token, pool_size=pool_size, rate=rate, burst=burst, max_retries=max_retries,
+                             stream_timeout=stream_timeout, name=name)
+    return berserk.Client(session), session
+
+
+def accept_draw(session, game_id, base_url=LICHESS_URL):
+    """Offers or accepts a draw in a bot game, straight through the bot's LichessSession:
+    berserk 0.13 has no bot draw call (client.board.accept_draw is the Board API, refused to bots)"""
+    response = session.post(f"{base_url}/api/bot/game/{game_id}/draw/yes")
+    if not response.ok:
+        raise berserk.exceptions.ResponseError(response)
+    return response.json()["ok"]
+
+
+def is_rate_limited(error):
+    """True if a berserk error is a 429 response"""
+    return getattr(error, "status_code", None) == 429
@@ -0,0 +1,336 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Load Test - AI Battle
+=====================
+Simulated viewers against the broadcast path. A recorded game is replayed
+through the real StatePublisher and SnapshotStore (same state, log lines
+and plies as a live game), served by the real viewer server, while N
+viewers poll it the way viewer.html does: every 2 s, game_state.json with
+If-None-Match, then logs?since= and moves?since= (or the full logs.json
+with --full-logs).
+
+The server has no push endpoint (viewers only poll), so there is no
+push mode to simulate.
+
+Viewers run in separate processes so that they do not compete with the
+server for the GIL, while the replay loop shares the process with the
+server, as the game loop does in chess_battle. Each viewer count is one
+run; the report gives the server throughput, response times per route,
+and how late the replay loop's ticks and publishes got compared with the
+run without viewers.
+
+Usage:
+    python load_test.py --viewers 0 50 200
+    python load_test.py --game archive/games.bin --viewers 0 100 --duration 30 --output load.json
+"""
+
+import argparse
+import gzip
+import http.client
+import json
+import multiprocessing
+import os
+import random
+import tempfile
+import threading
+import time
+
+import chess
+import chess.pgn
+
+from metrics import LatencyStats, percentile
+from state_publisher import StatePublisher
+from state_server import SnapshotStore, create_server
+
+POLL_INTERVAL = 2.0
+# Same buffer size as chess_battle's logs
+LOG_CAPACITY = 500
+ROUTES = ("game_state.json", "logs", "moves", "logs.json")
+
+THOUGHT = ("Developing the knight keeps the centre under control and prepares castling, "
+           "while the bishop on the long diagonal still pins the pawn in front of the king.")
+
+
+def load_game(source=None, game=0, seed=0):
+    """(moves, thoughts) of the game to replay: from a binary archive (.bin), a PGN file,
+    or a random legal game without a source"""
+    if source and source.endswith('.bin'):
+        from binary_archive import BinaryArchive
+        with BinaryArchive(source) as archive:
+            moves = archive.moves(game)
+        return moves, [None] * len(moves)
+    if source:
+        with open(source, encoding='utf-8') as f:
+            for _ in range(game):
+                chess.pgn.skip_game(f)
+            record = chess.pgn.read_game(f)
+        if record is None:
+            raise ValueError(f"no game {game} in {source}")
+        nodes = list(record.mainline())
+        # Thought only: the [%...] annotations are not shown in the viewer
+        return [node.move for node in nodes], [node.comment.split('[%')[0].strip() or None for node in nodes]
+
+    rng = random.Random(seed)
+    board = chess.Board()
+    moves = []
+    while not board.is_game_over() and len(moves) < 120:
+        move = rng.choice(list(board.legal_moves))
+        board.push(move)
+        moves.append(move)
+    return moves, [None] * len(moves)
+
+
+class GameReplay:
+    """Publishes a game ply by ply, as chess_battle does, and times each tick"""
+
+    def __init__(self, store, moves, thoughts, ply_interval=1.0, state_path=None):
+        self.store = store
+        self.moves = moves
+        self.thoughts = thoughts
+        self.ply_interval = ply_interval
+        self.publisher = StatePublisher(state_path, store=store, log=lambda *args: None)
+        self.logs = []
+        self.log_sequence = store.sequence('logs', capacity=LOG_CAPACITY)
+        self.move_sequence = store.sequence('moves')
+        # Time spent publishing one ply, and how late each tick started
+        self.publish_time = LatencyStats(window=100000)
+        self.lateness = LatencyStats(window=100000)
+
+    def log(self, message):
+        entry = f"[{time.strftime('%H:%M:%S')}] {message}"
+        self.logs.append(entry)
+        del self.logs[:-LOG_CAPACITY]
+        self.log_sequence.append(entry)
+        self.store.invalidate('logs', self.logs_snapshot)
+
+    def logs_snapshot(self):
+        return {"logs": list(self.logs)}
+
+    def publish_ply(self, game_number, board, ply):
+        """Log lines, plies and game state of one move"""
+        move = self.moves[ply]
+        ai = "claude" if board.turn == chess.WHITE else "gpt"
+        thought = self.thoughts[ply] or THOUGHT
+        self.log(f"🤖 {ai.upper()} is thinking...")
+        self.log(f"💭 {ai.upper()}: {thought}")
+        board.push(move)
+        self.log(f"✅ {ai.upper()} played {move.uci()}")
+        uci = [m.uci() for m in board.move_stack]
+        self.move_sequence.sync(uci)
+        self.publisher.publish({
+            "game_in_progress": True,
+            "game_number": game_number,
+            "last_move": move.uci(),
+            "moves": " ".join(uci),
+            "ai_thoughts": {ai: {"thought": thought, "material": 39, "threats": 0}},
+            "last_update": time.strftime("%Y-%m-%d %H:%M:%S"),
+        })
+
+    def run(self, duration):
+        """Replays the game (restarting it as needed) for duration seconds"""
+        start = time.perf_counter()
+        next_tick = start
+        game_number = 0
+        while True:
+            game_number += 1
+            board = chess.Board()
+            self.move_sequence.reset()
+            for ply in range(len(self.moves)):
+                now = time.perf_counter()
+                if now - start >= duration:
+                    return
+                self.lateness.add(max(0.0, now - next_tick))
+                with self.publish_time.time():
+                    self.publish_ply(game_number, board, ply)
+                next_tick += self.ply_interval
+                time.sleep(max(0.0, next_tick - time.perf_counter()))
+
+
+def poll(connection, path, etag=None):
+    """One GET on a keep-alive connection: (status, body bytes, new ETag, JSON or None)"""
+    headers = {"Accept-Encoding": "gzip"}
+    if etag:
+        headers["If-None-Match"] = etag
+    connection.request("GET", "/" + path, headers=headers)
+    response = connection.getresponse()
+    body = response.read()
+    data = None
+    if response.status == 200 and path != "game_state.json":
+        raw = gzip.decompress(body) if response.getheader("Content-Encoding") == "gzip" else body
+        data = json.loads(raw)
+    return response.status, len(body), response.getheader("ETag") or etag, data
+
+
+def viewer_loop(port, stop_at, full_logs, results, lock):
+    """One simulated viewer, polling like viewer.html until stop_at"""
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+    etag = None
+    seq = {"logs": 0, "moves": 0}
+    # Viewers opened the page at different times
+    time.sleep(random.uniform(0, POLL_INTERVAL))
+    samples = {route: [] for route in ROUTES}
+    statuses = {}
+    transferred = 0
+    errors = 0
+    while time.time() < stop_at:
+        cycle = time.time()
+        paths = ["game_state.json"] + (["logs.json"] if full_logs else [f"logs?since={seq['logs']}"])
+        paths.append(f"moves?since={seq['moves']}")
+        for path in paths:
+            route = path.split('?')[0]
+            started = time.perf_counter()
+            try:
+                status, size, new_etag, data = poll(connection, path, etag if route == "game_state.json" else None)
+            except (OSError, http.client.HTTPException):
+                errors += 1
+                connection.close()
+                continue
+            samples[route].append(time.perf_counter() - started)
+            statuses[status] = statuses.get(status, 0) + 1
+            transferred += size
+            if route == "game_state.json":
+                etag = new_etag
+            elif data and "seq" in data:
+                seq[route] = data["seq"]
+        time.sleep(max(0.0, POLL_INTERVAL - (time.time() - cycle)))
+    connection.close()
+    with lock:
+        for route, values in samples.items():
+            results["samples"][route].extend(values)
+        for status, count in statuses.items():
+            results["statuses"][status] = results["statuses"].get(status, 0) + count
+        results["bytes"] += transferred
+        results["errors"] += errors
+
+
+def viewer_process(port, viewers, stop_at, full_logs, queue):
+    """Runs a share of the viewers as threads and sends back their merged samples"""
+    results = {"samples": {route: [] for route in ROUTES}, "statuses": {}, "bytes": 0, "errors": 0}
+    lock = threading.Lock()
+    threads = [threading.Thread(target=viewer_loop, args=(port, stop_at, full_logs, results, lock), daemon=True)
+               for _ in range(viewers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    queue.put(results)
+
+
+def response_times(samples):
+    def ms(value):
+        return round(value * 1000, 2) if value is not None else None
+    return {
+        "requests": len(samples),
+        "p50_ms": ms(percentile(samples, 50)),
+        "p95_ms": ms(percentile(samples, 95)),
+        "p99_ms": ms(percentile(samples, 99)),
+        "max_ms": ms(max(samples)) if samples else None,
+    }
+
+
+def run_load(viewers, moves, thoughts, duration=20.0, ply_interval=1.0, processes=4, full_logs=False, log=print):
+    """One run: a fresh server and replay, with viewers polling for duration seconds"""
+    store = SnapshotStore()
+    server = create_server(store, host='127.0.0.1', port=0)
+    port = server.server_address[1]
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        replay = GameReplay(store, moves, thoughts, ply_interval, os.path.join(workdir, 'game_state.json'))
+        # Something to serve before the first ply
+        replay.publish_ply(0, chess.Board(), 0)
+
+        context = multiprocessing.get_context("spawn")
+        queue = context.Queue()
+        # Started before the clock: spawning a process takes longer than an import
+        stop_at = time.time() + duration + 2.0
+        shares = [viewers // processes + (1 if i < viewers % processes else 0) for i in range(processes)]
+        workers = [context.Process(target=viewer_process, args=(port, share, stop_at, full_logs, queue))
+                   for share in shares if share]
+        for worker in workers:
+            worker.start()
+        time.sleep(max(0.0, stop_at - duration - time.time()))
+        replay.run(duration)
+        parts = [queue.get() for _ in workers]
+        for worker in workers:
+            worker.join()
+        replay.publisher.flush()
+
+    server.shutdown()
+    server.server_close()
+
+    samples = {route: [value for part in parts for value in part["samples"][route]] for route in ROUTES}
+    all_samples = [value for values in samples.values() for value in values]
+    statuses = {}
+    for part in parts:
+        for status, count in part["statuses"].items():
+            statuses[str(status)] = statuses.get(str(status), 0) + count
+    result = {
+        "viewers": viewers,
+        "duration_s": duration,
+        "requests_per_s": round(len(all_samples) / duration, 1),
+        "kbytes_per_s": round(sum(part["bytes"] for part in parts) / 1024 / duration, 1),
+        "errors": sum(part["errors"] for part in parts),
+        "statuses": statuses,
+        "response_time": response_times(all_samples),
+        "routes": {route: response_times(values) for route, values in samples.items() if values},
+        "game_loop": {
+            "plies": replay.publish_time.count,
+            "publish": replay.publish_time.summary(),
+            "tick_lateness": replay.lateness.summary(),
+        },
+    }
+    timing = result["response_time"]
+    loop = result["game_loop"]
+    log(f"👥 {viewers:>4} viewers | {result['requests_per_s']:>7} req/s | "
+        f"p50 {timing['p50_ms']} ms | p95 {timing['p95_ms']} ms | p99 {timing['p99_ms']} ms | "
+        f"errors {result['errors']}")
+    log(f"   ♟️  {loop['plies']} plies | publish p95 {loop['publish']['p95_ms']} ms | "
+        f"tick lateness p95 {loop['tick_lateness']['p95_ms']} ms, max {loop['tick_lateness']['max_ms']} ms")
+    return result
+
+
+def compare_game_loop(results, log=print):
+    """Game-loop timing of each run against the run with the fewest viewers"""
+    baseline = min(results, key=lambda result: result["viewers"])
+    base = baseline["game_loop"]
+    for result in results:
+        if result is baseline:
+            continue
+        loop = result["game_loop"]
+        changes = []
+        for name in ("publish", "tick_lateness"):
+            before, after = base[name]["p95_ms"], loop[name]["p95_ms"]
+            if before is not None and after is not None:
+                changes.append(f"{name} p95 {before} -> {after} ms")
+        log(f"📈 {result['viewers']} viewers vs {baseline['viewers']}: {' | '.join(changes)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="AI Battle viewer load test")
+    parser.add_argument("--game", help="Game to replay: binary archive (.bin) or PGN file (default: a random game)")
+    parser.add_argument("--game-index", type=int, default=0, help="Game number in the archive or PGN file")
+    parser.add_argument("--viewers", nargs="+", type=int, default=[0, 50, 200], help="Viewer counts, one run each")
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds per run")
+    parser.add_argument("--ply-interval", type=float, default=1.0, help="Seconds between replayed plies")
+    parser.add_argument("--processes", type=int, default=4, help="Client processes the viewers are spread over")
+    parser.add_argument("--full-logs", action="store_true", help="Poll logs.json instead of logs?since=")
+    parser.add_argument("--output", help="Report file (JSON)")
+    args = parser.parse_args()
+
+    moves, thoughts = load_game(args.game, args.game_index)
+    print(f"🎬 Replaying {len(moves)} plies every {args.ply_interval}s, {args.duration}s per run")
+    results = [run_load(viewers, moves, thoughts, args.duration, args.ply_interval, args.processes, args.full_logs)
+               for viewers in args.viewers]
+    if len(results) > 1:
+        compare_game_loop(results)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({"game": args.game, "plies": len(moves), "full_logs": args.full_logs, "runs": results}, f, indent=2)
+        print(f"💾 Report saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Metrics - AI Battle
+===================
+Thread-safe latency statistics shared by the game loop, publisher and tools.
+"""
+
+import math
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+
+def percentile(samples, p):
+    """Nearest-rank percentile of a list of numbers (None if empty)"""
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    rank = max(1, math.ceil(p / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+class LatencyStats:
+    """Count, mean and percentiles over a bounded window of recent samples"""
+
+    def __init__(self, window=1000):
+        self.lock = threading.Lock()
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.samples = deque(maxlen=window)
+
+    def add(self, seconds):
+        """Records one duration in seconds"""
+        with self.lock:
+            self.count += 1
+            self.total += seconds
+            self.max = max(self.max, seconds)
+            self.samples.append(seconds)
+
+    @contextmanager
+    def time(self):
+        """Context manager recording the duration of its block"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(time.perf_counter() - start)
+
+    def summary(self):
+        """Returns count, mean, p50, p95 and max in milliseconds"""
+        with self.lock:
+            samples = list(self.samples)
+            count, total, maximum = self.count, self.total, self.max
+
+        def ms(value):
+            return round(value * 1000, 1) if value is not None else None
+
+        return {
+            "count": count,
+            "mean_ms": ms(total / count) if count else None,
+            "p50_ms": ms(percentile(samples, 50)),
+            "p95_ms": ms(percentile(samples, 95)),
+            "max_ms": ms(maximum) if count else None,
+        }
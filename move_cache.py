@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Move Cache - AI Battle
+======================
+Persistent cache of moves the AIs already played, shared across games.
+Entries are keyed by the position's Zobrist hash, the provider/model, the
+prompt version and a temperature bucket, and hold every legal move returned
+for that key with its thought and how many times it was returned.
+
+On a repeated position the cache replays the most frequent move ('replay')
+or samples among the stored moves by frequency ('sample'). The table is
+bounded: least recently used entries are evicted past max_entries.
+"""
+
+import random
+import sqlite3
+import threading
+import time
+
+import chess
+import chess.polyglot
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS moves (
+    key TEXT NOT NULL,
+    move TEXT NOT NULL,
+    thought TEXT,
+    count INTEGER NOT NULL DEFAULT 1,
+    last_used REAL NOT NULL,
+    PRIMARY KEY (key, move)
+);
+CREATE INDEX IF NOT EXISTS moves_last_used ON moves (last_used);
+"""
+
+# Eviction runs once every this many stores
+EVICTION_INTERVAL = 100
+
+
+class MoveCache:
+    """SQLite-backed move cache with LRU eviction and hit/miss counters"""
+
+    def __init__(self, path, prompt_version, max_entries=50000, mode='sample', temperature_step=0.25):
+        if mode not in ('replay', 'sample'):
+            raise ValueError(f"Unknown move cache mode '{mode}'")
+        self.path = path
+        self.prompt_version = prompt_version
+        self.max_entries = max_entries
+        self.mode = mode
+        self.temperature_step = temperature_step
+
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript(SCHEMA)
+
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self.evict()
+
+    def make_key(self, board, model, temperature):
+        """Zobrist hash + model + prompt version + temperature bucket"""
+        bucket = round(temperature / self.temperature_step) * self.temperature_step
+        return f"{chess.polyglot.zobrist_hash(board):016x}:{model}:v{self.prompt_version}:t{bucket:.2f}"
+
+    def lookup(self, board, model, temperature):
+        """Returns a cached (move_uci, thought) legal in this position, or None"""
+        key = self.make_key(board, model, temperature)
+        with self.lock:
+            rows = self.db.execute(
+                "SELECT move, thought, count FROM moves WHERE key = ?", (key,)
+            ).fetchall()
+            # Guard against hash collisions
+            rows = [row for row in rows if chess.Move.from_uci(row[0]) in board.legal_moves]
+            if not rows:
+                self.misses += 1
+                return None
+
+            if self.mode == 'replay':
+                move, thought, _ = max(rows, key=lambda row: row[2])
+            else:
+                move, thought, _ = random.choices(rows, weights=[row[2] for row in rows])[0]
+            self.db.execute("UPDATE moves SET last_used = ? WHERE key = ?", (time.time(), key))
+            self.db.commit()
+            self.hits += 1
+            return move, thought
+
+    def store(self, board, model, temperature, move_uci, thought):
+        """Records a legal move returned by the model for this position"""
+        key = self.make_key(board, model, temperature)
+        with self.lock:
+            self.db.execute(
+                "INSERT INTO moves (key, move, thought, count, last_used) VALUES (?, ?, ?, 1, ?) "
+                "ON CONFLICT (key, move) DO UPDATE SET count = count + 1, "
+                "thought = excluded.thought, last_used = excluded.last_used",
+                (key, move_uci, thought, time.time())
+            )
+            self.db.commit()
+            self.stores += 1
+            due = self.stores % EVICTION_INTERVAL == 0
+        if due:
+            self.evict()
+
+    def evict(self):
+        """Deletes the least recently used rows beyond max_entries"""
+        with self.lock:
+            (count,) = self.db.execute("SELECT COUNT(*) FROM moves").fetchone()
+            excess = count - self.max_entries
+            if excess > 0:
+                self.db.execute(
+                    "DELETE FROM moves WHERE rowid IN "
+                    "(SELECT rowid FROM moves ORDER BY last_used ASC LIMIT ?)", (excess,)
+                )
+                self.db.commit()
+                self.evictions += excess
+
+    def stats(self):
+        """Hit/miss counters and current size"""
+        with self.lock:
+            (entries,) = self.db.execute("SELECT COUNT(*) FROM moves").fetchone()
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+                "stores": self.stores,
+                "evictions": self.evictions,
+                "entries": entries,
+            }
+
+    def close(self):
+        with self.lock:
+            self.db.close()
@@ -0,0 +1,548 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Move Prompt - AI Battle
+=======================
+Board analysis helpers, the move prompt shared by every AI provider, and
+the parser for the "thought line + UCI move line" response format.
+With several candidates, the move line holds up to K moves, best first
+("e2e4 d2d4 g1f3"): the first legal one is played, so an illegal first
+choice does not cost another round trip.
+"""
+
+import re
+
+import chess
+
+# Bump when the prompt or the response format changes (keys the move cache)
+PROMPT_VERSION = 1
+
+# Example answers shown in the prompt, matching the side to play
+RESPONSE_EXAMPLES = {
+    'white': "Attacking queen with knight\nb1c3\n\nDefending the rook\na1b1",
+    'black': "Developing center pawn\ne7e5\n\nCapturing enemy piece\nd8d4",
+}
+
+# Candidate answer examples (move line: best first)
+CANDIDATE_EXAMPLES = {
+    'white': "Attacking queen with knight\nb1c3 g1f3 d2d4",
+    'black': "Developing center pawn\ne7e5 g8f6 d7d5",
+}
+COMPACT_CANDIDATE_EXAMPLES = {
+    'white': "Developing knight toward center\nNf3 e4 d4",
+    'black': "Challenging the center pawn\nd5 Nf6 e5",
+}
+
+UCI_PATTERN = r'\b([a-h][1-8][a-h][1-8][qrbn]?)\b'
+SAN_PATTERN = r'(O-O(-O)?|0-0(-0)?|[KQRBN][a-h]?[1-8]?x?[a-h][1-8]|[a-h](x[a-h])?[1-8](=?[QRBN])?)[+#]?'
+
+
+def board_to_ascii(board):
+    """Converts board to visual ASCII representation with Unicode symbols"""
+    pieces_unicode = {
+        'R': '♖', 'N': '♘', 'B': '♗', 'Q': '♕', 'K': '♔', 'P': '♙',
+        'r': '♜', 'n': '♞', 'b': '♝', 'q': '♛', 'k': '♚', 'p': '♟',
+    }
+    
+    result = "\n  a b c d e f g h\n"
+    for i in range(8):
+        rank = 8 - i
+        result += f"{rank} "
+        for j in range(8):
+            square = chess.square(j, 7 - i)
+            piece = board.piece_at(square)
+            if piece:
+                result += pieces_unicode.get(piece.symbol(), piece.symbol()) + " "
+            else:
+                result += ". "
+        result += f"{rank}\n"
+    result += "  a b c d e f g h\n"
+    return result
+
+
+def calculate_material_score(board):
+    """Calculates material score for each color"""
+    piece_values = {
+        chess.PAWN: 1,
+        chess.KNIGHT: 3,
+        chess.BISHOP: 3,
+        chess.ROOK: 5,
+        chess.QUEEN: 9,
+        chess.KING: 0
+    }
+    
+    white_score = 0
+    black_score = 0
+    
+    for square in chess.SQUARES:
+        piece = board.piece_at(square)
+        if piece:
+            value = piece_values[piece.piece_type]
+            if piece.color == chess.WHITE:
+                white_score += value
+            else:
+                black_score += value
+    
+    return white_score, black_score
+
+
+def analyze_threats(board, color):
+    """Analyzes threats and endangered pieces"""
+    threats = []
+    captures = []
+    
+    my_color = chess.WHITE if color == 'white' else chess.BLACK
+    opponent_color = chess.BLACK if color == 'white' else chess.WHITE
+    
+    # Check attacked pieces
+    for square in chess.SQUARES:
+        piece = board.piece_at(square)
+        if piece and piece.color == my_color:
+            # Is this piece attacked?
+            if board.is_attacked_by(opponent_color, square):
+                piece_name = chess.piece_name(piece.piece_type).upper()
+                square_name = chess.square_name(square)
+                threats.append(f"{piece_name} on {square_name}")
+    
+    # Search for possible captures
+    for move in board.legal_moves:
+        if board.is_capture(move):
+            captured_piece = board.piece_at(move.to_square)
+            if captured_piece:
+                piece_name = chess.piece_name(captured_piece.piece_type).upper()
+                captures.append(f"{move.uci()} (capture {piece_name})")
+    
+    return threats, captures
+
+
+def get_smart_moves(board):
+    """Returns the most interesting moves (not all)"""
+    legal_moves = list(board.legal_moves)
+    
+    # Prioritize: captures, checks, development
+    captures = [m for m in legal_moves if board.is_capture(m)]
+    checks = [m for m in legal_moves if board.gives_check(m)]
+    
+    # Development moves (knights, bishops)
+    development = []
+    for move in legal_moves:
+        piece = board.piece_at(move.from_square)
+        if piece and piece.piece_type in [chess.KNIGHT, chess.BISHOP]:
+            # If piece moves from its initial position
+            if move.from_square in [chess.B1, chess.G1, chess.C1, chess.F1,  # White
+                                     chess.B8, chess.G8, chess.C8, chess.F8]:  # Black
+                development.append(move)
+    
+    # Combine: captures + checks + development + some others
+    smart_moves = list(set(captures + checks + development))
+    
+    # If not enough, add random moves
+    if len(smart_moves) < 10:
+        remaining = [m for m in legal_moves if m not in smart_moves]
+        smart_moves.extend(remaining[:10 - len(smart_moves)])
+    
+    return smart_moves[:15]  # Max 15 moves
+
+
+# Prompt encodings: "full" (ASCII board, analysis, rules) or "compact" (FEN + SAN moves)
+PROMPT_MODES = ("full", "compact")
+PROMPT_SEPARATORS = {"full": "\n\n", "compact": "\n"}
+
+# Compact mode answer examples (SAN, as written in the legal move list)
+COMPACT_EXAMPLES = {
+    'white': "Developing knight toward center\nNf3",
+    'black': "Challenging the center pawn\nd5",
+}
+
+PIECE_LETTERS = {chess.PAWN: "", chess.KNIGHT: "N", chess.BISHOP: "B", chess.ROOK: "R", chess.QUEEN: "Q", chess.KING: "K"}
+
+
+def prompt_cache_version(mode, candidates=1):
+    """Prompt version as used in move cache keys (each mode and candidate count has its own moves)"""
+    version = PROMPT_VERSION if mode == "full" else f"{PROMPT_VERSION}-{mode}"
+    return version if candidates <= 1 else f"{version}-k{candidates}"
+
+
+def full_prompt_sections(board_fen, color, invalid_moves, candidates=1):
+    """Sections of the full prompt: ASCII board, analysis, all legal moves and rules"""
+    board_temp = chess.Board(board_fen)
+    
+    # Generate ASCII board
+    ascii_board = board_to_ascii(board_temp)
+    
+    # Calculate material score
+    white_score, black_score = calculate_material_score(board_temp)
+    my_score = white_score if color == 'white' else black_score
+    opp_score = black_score if color == 'white' else white_score
+    diff = my_score - opp_score
+    
+    # Analyze threats
+    threats, captures = analyze_threats(board_temp, color)
+    
+    # Smart recommended moves
+    smart_moves = get_smart_moves(board_temp)
+    smart_moves_str = ", ".join([m.uci() for m in smart_moves])
+    
+    # ALL LEGAL MOVES (complete list)
+    all_legal_moves = list(board_temp.legal_moves)
+    all_legal_moves_str = ", ".join([m.uci() for m in all_legal_moves])
+    
+    # History
+    move_stack = list(board_temp.move_stack)
+    last_moves = " ".join([m.uci() for m in move_stack[-4:]]) if len(move_stack) > 0 else "Game start"
+    
+    threats_str = "\n- ".join(threats) if threats else "No immediate threats"
+    captures_str = "\n- ".join(captures[:5]) if captures else "No captures available"
+    
+    situation = "AHEAD" if diff > 0 else "BEHIND" if diff < 0 else "EQUAL"
+    
+    sections = [
+        ("role", f"🎯 YOU ARE A CHESS GRANDMASTER - YOU PLAY {'WHITE (♙)' if color == 'white' else 'BLACK (♟)'}"),
+        ("board", f"CURRENT BOARD:\n{ascii_board}"),
+        ("material", f"""📊 MATERIAL SCORE:
+White: {white_score} points | Black: {black_score} points
+→ You are {situation} ({diff:+d} points)"""),
+        ("threats", f"⚠️ YOUR PIECES IN DANGER:\n- {threats_str}"),
+        ("captures", f"🎯 POSSIBLE CAPTURES:\n- {captures_str}"),
+        ("history", f"📋 LAST MOVES: {last_moves}"),
+        ("recommended", f"🎲 RECOMMENDED MOVES:\n{smart_moves_str}"),
+        ("legal_moves", f"⚔️ ALL LEGAL MOVES (you MUST choose from this list):\n{all_legal_moves_str}"),
+    ]
+    
+    # Warning about invalid moves
+    if invalid_moves:
+        sections.append(("invalid_moves", f"❌ WARNING! These moves are INVALID, do NOT play them again:\n{', '.join(invalid_moves)}\nChoose a DIFFERENT move!"))
+    
+    sections.append(("rules", """🏆 MISSION: WIN THE GAME!
+
+⚠️ CRITICAL ANTI-BLUNDER RULES (check BEFORE every move):
+1. NEVER leave your pieces undefended - always verify they're protected!
+2. ALWAYS check if opponent can capture your pieces after your move!
+3. NEVER sacrifice material without equal or better compensation!
+4. If one of YOUR pieces is attacked → Save it FIRST (move it or defend it)!
+5. Don't move into checks or create hanging pieces!
+
+🚨 SPECIAL RULES FOR KING AND QUEEN:
+1. KING: NEVER move your King in the opening (first 10 moves)! Keep it safe behind pawns!
+2. KING: Castle early (O-O or O-O-O) to protect your King!
+3. QUEEN: Your Queen is worth 9 points - PROTECT IT AT ALL COSTS!
+4. QUEEN: If your Queen is attacked → MOVE IT IMMEDIATELY!
+5. QUEEN: Don't bring Queen out too early - she's vulnerable to attacks!
+6. QUEEN: NEVER sacrifice your Queen unless it's checkmate!
+
+STRATEGY (in priority order):
+1. If CHECKMATE possible → Do it immediately!
+2. If YOUR QUEEN is attacked → SAVE HER FIRST!
+3. If YOUR pieces are attacked → SAVE THEM (move or defend)!
+4. If you can CAPTURE opponent's material → Take it!
+5. Castle early to protect your King!
+6. Otherwise → Develop pieces, control center
+
+⛔ ABSOLUTELY FORBIDDEN:
+- Moving your King in the opening without castling
+- Losing your Queen for free or for less than a Queen
+- Leaving pieces undefended (hanging pieces)
+- Moving attacked pieces to another attacked square
+- Leaving your king in danger"""))
+    
+    if candidates > 1:
+        sections.append(("format", f"""📝 RESPONSE FORMAT - STRICTLY FOLLOW THIS:
+Line 1: Your thought in EXACTLY 3-6 words only (about your best move)
+Line 2: Up to {candidates} DIFFERENT moves in UCI format, best first, separated by spaces
+
+CORRECT example:
+{CANDIDATE_EXAMPLES[color]}
+
+The first legal move of line 2 is played - put your best move first!"""))
+        return sections
+    
+    sections.append(("format", f"""📝 RESPONSE FORMAT - STRICTLY FOLLOW THIS:
+Line 1: Your thought in EXACTLY 3-6 words only
+Line 2: Your move in UCI format (4 characters: e2e4)
+
+CORRECT examples:
+{RESPONSE_EXAMPLES[color]}
+
+WRONG examples (DO NOT DO THIS):
+Looking at this position, I see...  ← TOO LONG!
+I need to find the best move  ← NO MOVE PROVIDED!
+
+Now play - remember: SHORT thought + UCI move!"""))
+    
+    return sections
+
+
+def compact_prompt_sections(board_fen, color, invalid_moves, candidates=1):
+    """Sections of the compact prompt: the FEN carries the board, moves are listed in SAN"""
+    board = chess.Board(board_fen)
+    my_color = chess.WHITE if color == 'white' else chess.BLACK
+    
+    white_score, black_score = calculate_material_score(board)
+    diff = (white_score - black_score) * (1 if my_color == chess.WHITE else -1)
+    
+    attacked = [
+        PIECE_LETTERS[piece.piece_type] + chess.square_name(square)
+        for square, piece in board.piece_map().items()
+        if piece.color == my_color and piece.piece_type != chess.KING
+        and board.is_attacked_by(not my_color, square)
+    ]
+    
+    sections = [
+        ("role", f"You play {color.capitalize()} in a chess game. Find the strongest move."),
+        ("board", f"FEN: {board.fen()}"),
+        ("material", f"Material: {diff:+d} for you"),
+        ("threats", f"Your attacked pieces: {' '.join(attacked) if attacked else 'none'}"),
+        ("legal_moves", f"Legal moves (SAN): {' '.join(board.san(move) for move in board.legal_moves)}"),
+    ]
+    if invalid_moves:
+        sections.append(("invalid_moves", f"Invalid, do not repeat: {', '.join(invalid_moves)}"))
+    sections.append(("rules", "Priorities: checkmate, save attacked pieces (queen first), win free material, "
+                              "castle early, never leave pieces hanging."))
+    if candidates > 1:
+        sections.append(("format", f"Reply in exactly 2 lines: a 3-6 word thought, then up to {candidates} different "
+                                   f"moves copied from the legal moves, best first, separated by spaces.\n"
+                                   f"Example:\n{COMPACT_CANDIDATE_EXAMPLES[color]}"))
+    else:
+        sections.append(("format", f"Reply in exactly 2 lines: a 3-6 word thought, then one move copied from the legal moves.\n"
+                                   f"Example:\n{COMPACT_EXAMPLES[color]}"))
+    return sections
+
+
+def build_prompt_sections(board_fen, color, invalid_moves=[], mode="full", candidates=1):
+    """Named prompt sections [(name, text)] for a prompt mode"""
+    if mode == "full":
+        return full_prompt_sections(board_fen, color, invalid_moves, candidates)
+    if mode == "compact":
+        return compact_prompt_sections(board_fen, color, invalid_moves, candidates)
+    raise ValueError(f"Unknown prompt mode '{mode}'")
+
+
+def build_move_prompt(board_fen, color, invalid_moves=[], mode="full", candidates=1):
+    """Builds the move prompt for the side to play (asking for up to `candidates` ranked moves)"""
+    sections = build_prompt_sections(board_fen, color, invalid_moves, mode, candidates)
+    return PROMPT_SEPARATORS[mode].join(text for name, text in sections)
+
+
+def parse_move_response(response_text):
+    """Extracts (move, thought) from a response; move is None if none was found"""
+    # Parse: look for UCI move and extract thought
+    lines = [line.strip() for line in response_text.split('\n') if line.strip()]
+    thought = None
+    move = None
+    
+    # Strategy: Assume format is "thought" then "move"
+    if len(lines) >= 2:
+        # Try last line as move, previous as thought
+        potential_move = lines[-1]
+        if len(potential_move) >= 4 and len(potential_move) <= 5:
+            if potential_move[0:2].isalpha() and potential_move[2:4].isdigit():
+                move = potential_move
+                thought = lines[-2] if len(lines) >= 2 else None
+    
+    # Fallback: search for UCI move anywhere
+    if not move:
+        for i, line in enumerate(lines):
+            # Look for UCI move (4-5 chars like e2e4 or e7e8q)
+            if len(line) >= 4 and len(line) <= 5 and line[0:2].isalpha() and line[2:4].isdigit():
+                move = line
+                # Get thought from previous line if available
+                if i > 0:
+                    thought = lines[i-1]
+                break
+    
+    # Last resort: regex pattern search
+    if not move:
+        match = re.search(UCI_PATTERN, response_text.lower())
+        if match:
+            move = match.group(1)
+    
+    # SAN answer (compact prompt): last line that is a move on its own, e.g. "Nf3" or "O-O"
+    if not move:
+        for i in range(len(lines) - 1, -1, -1):
+            candidate = lines[i].strip('.!?* ')
+            if re.fullmatch(SAN_PATTERN, candidate):
+                move = candidate
+                if i > 0:
+                    thought = lines[i-1]
+                break
+    
+    # Default thought only if we really couldn't find one
+    if not thought and move:
+        # Try to extract any non-move line as thought
+        for line in lines:
+            if line != move and len(line) > 4:
+                thought = line
+                break
+    
+    if not thought:
+        thought = "Calculating next move"
+    
+    return move, thought
+
+
+def is_move_token(token):
+    return bool(re.fullmatch(UCI_PATTERN, token.lower()) or re.fullmatch(SAN_PATTERN, token))
+
+
+def split_candidates(line):
+    """Moves of a candidate line ("e2e4 d2d4", "1. Nf3, 2. e4"), or None if it is not a move line"""
+    tokens = [token.strip('.!?*()"\'') for token in re.split(r'[\s,;]+', line)]
+    tokens = [token for token in tokens if token and not re.fullmatch(r'\d+[.)]?', token)]
+    if tokens and all(is_move_token(token) for token in tokens):
+        return tokens
+    return None
+
+
+def find_candidate_line(response_text, limit=3):
+    """(ranked moves, thought line or None) of the last line made only of moves, or (None, None)"""
+    lines = [line.strip() for line in response_text.split('\n') if line.strip()]
+    for i in range(len(lines) - 1, -1, -1):
+        moves = split_candidates(lines[i])
+        if moves:
+            thought = lines[i - 1] if i > 0 and not split_candidates(lines[i - 1]) else None
+            return list(dict.fromkeys(moves))[:limit], thought
+    return None, None
+
+
+def parse_move_candidates(response_text, limit=3):
+    """Extracts (ranked candidate moves, thought) from a response; candidates is [] if no move was found"""
+    moves, thought = find_candidate_line(response_text, limit)
+    if moves:
+        return moves, thought or "Calculating next move"
+    # No move line: single-move parsing (move anywhere in the text)
+    move, thought = parse_move_response(response_text)
+    return ([move] if move else []), thought
+
+
+def resolve_candidates(candidates, board, log=print):
+    """First legal candidate, in rank order. Returns (move or None, rejected candidates)"""
+    rejected = []
+    for candidate in candidates:
+        move = validate_and_clean_move(candidate, board, log=log)
+        if move:
+            return move, rejected
+        rejected.append(candidate)
+    return None, rejected
+
+
+def validate_and_clean_move(move_str, board, log=print):
+    """Validates and cleans the move proposed by the AI - handles both UCI and algebraic notation"""
+    # Clean the response
+    original_move = move_str
+    move_str = move_str.strip()
+    
+    # Remove quotes, but preserve case for algebraic notation
+    move_str = move_str.replace('"', '').replace("'", '').replace('\n', '').replace('\r', '')
+    
+    log(f"🔍 Debug - Original move: '{original_move}' → Cleaned: '{move_str}'")
+    
+    # Try parsing as Standard Algebraic Notation (SAN) first - e.g., "Kxf2", "Nf3", "e4"
+    try:
+        move = board.parse_san(move_str)
+        if move in board.legal_moves:
+            log(f"✅ Parsed as algebraic notation (SAN): '{move_str}' → UCI: '{move.uci()}'")
+            return move
+    except Exception as e:
+        log(f"🔍 Debug - Not valid SAN: '{move_str}' ({e})")
+    
+    # Try parsing as UCI - e.g., "e2e4", "g1f3"
+    move_str_lower = move_str.lower().strip()
+    
+    # Remove extra spaces
+    move_str_lower = ''.join(c for c in move_str_lower if c.isalnum())
+    
+    # If too long, take first characters
+    if len(move_str_lower) > 5:
+        move_str_lower = move_str_lower[:5]
+    
+    log(f"🔍 Debug - Trying UCI: '{move_str_lower}'")
+    
+    # Try to parse as UCI
+    try:
+        move = chess.Move.from_uci(move_str_lower)
+        if move in board.legal_moves:
+            log(f"✅ Parsed as UCI: '{move_str_lower}'")
+            return move
+        else:
+            log(f"🔍 Debug - Move '{move_str_lower}' is not legal in this position")
+    except Exception as e:
+        log(f"🔍 Debug - Cannot parse as UCI: '{move_str_lower}' ({e})")
+    
+    # Try to find a similar move
+    for legal_move in board.legal_moves:
+        if legal_move.uci().startswith(move_str_lower[:4]):
+            log(f"🔍 Debug - Similar move found: {legal_move.uci()}")
+            return legal_move
+    
+    log(f"❌ No valid move found for: '{original_move}'")
+    return None
+
+
+class MoveStreamParser:
+    """Incremental parser over a streamed response: done once a legal move and its thought are read"""
+
+    def __init__(self, board, candidates=1):
+        self.board = board
+        self.candidates = candidates
+        self.text = ""
+        self.move = None
+        self.thought = None
+        self.done = False
+
+    def feed(self, chunk):
+        """Adds a chunk of the response. Returns True when the rest of the stream is not needed"""
+        self.text += chunk
+        if self.candidates > 1:
+            return self.feed_candidates()
+        complete, newline, partial = self.text.rpartition('\n')
+        partial = partial.strip().lower()
+        # A trailing UCI move is final once it is legal as written (a promotion needs its 5th letter)
+        if re.fullmatch(UCI_PATTERN, partial) and self.is_legal_uci(partial):
+            return self.check(self.text)
+        if newline and '\n' in chunk:
+            return self.check(complete)
+        return False
+
+    def is_legal_uci(self, token):
+        try:
+            return chess.Move.from_uci(token) in self.board.legal_moves
+        except ValueError:
+            # Looks like UCI but is not a move (e2e2): not a move yet
+            return False
+
+    def check(self, text):
+        move, thought = parse_move_response(text)
+        if not move or thought == "Calculating next move":
+            return False
+        if not validate_and_clean_move(move, self.board, log=lambda *args: None):
+            return False
+        self.move, self.thought, self.done = move, thought, True
+        return True
+
+    def feed_candidates(self):
+        """Candidate line: done at the first legal candidate, once it is complete (the rest is never played)"""
+        text = self.text
+        if not text[-1:].isspace():
+            # The last token may still grow (e7e8 -> e7e8q)
+            text = re.sub(r'\S+$', '', text)
+        moves, thought = find_candidate_line(text, self.candidates)
+        if not moves or not thought:
+            return False
+        legal = [m for m in moves if validate_and_clean_move(m, self.board, log=lambda *args: None)]
+        if not legal:
+            return False
+        # Earlier candidates were illegal: keep them so the resolver reports them as rejected
+        self.move = moves[:moves.index(legal[0]) + 1]
+        self.thought, self.done = thought, True
+        return True
+
+    def result(self):
+        """(move, thought) read so far, parsed like a complete response if the parser is not done.
+        With several candidates, the move is the list of candidates"""
+        if self.candidates > 1:
+            if self.done:
+                return self.move, self.thought
+            return parse_move_candidates(self.text, self.candidates)
+        if self.done:
+            return self.move, self.thought
+        return parse_move_response(self.text)
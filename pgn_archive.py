@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+PGN Archive - AI Battle
+=======================
+Writes every game to disk ply by ply and files finished games into a
+rolling archive (one PGN file per day), plus a streaming exporter.
+
+Usage:
+    python pgn_archive.py export --since 2026-01-01 --model haiku > games.pgn
+"""
+
+import argparse
+import glob
+import os
+import shutil
+import sys
+from datetime import datetime
+
+import chess
+import chess.pgn
+
+ARCHIVE_PREFIX = "games_"
+
+
+def archive_path(archive_dir, day=None):
+    """Returns the rolling archive file for a given day (today by default)"""
+    day = day or datetime.now()
+    return os.path.join(archive_dir, f"{ARCHIVE_PREFIX}{day.strftime('%Y-%m-%d')}.pgn")
+
+
+def format_move_comment(thought=None, latency=None, retries=None, tokens=None):
+    """Builds the PGN comment attached to a move: thought + [%cmd] annotations"""
+    parts = []
+    if thought:
+        # Braces would end the comment early
+        parts.append(thought.replace('{', '(').replace('}', ')').strip())
+    if latency is not None:
+        parts.append(f"[%latency {latency:.3f}]")
+    if retries is not None:
+        parts.append(f"[%retries {retries}]")
+    if tokens:
+        parts.append(f"[%tokens {tokens[0]}+{tokens[1]}]")
+    return " ".join(parts)
+
+
+class PgnGameWriter:
+    """Writes one game incrementally, then appends it to the rolling archive"""
+
+    def __init__(self, archive_dir, game_id, headers):
+        os.makedirs(archive_dir, exist_ok=True)
+        self.archive_dir = archive_dir
+        self.game_id = game_id
+        self.headers = chess.pgn.Headers(headers)
+        self.board = chess.Board()
+        self.closed = False
+
+        # Movetext goes to a .part file as it is played, so a crash
+        # still leaves the moves on disk
+        self.part_path = os.path.join(archive_dir, f"{game_id}.pgn.part")
+        self.handle = open(self.part_path, 'w', encoding='utf-8')
+        self.exporter = chess.pgn.FileExporter(self.handle)
+        self.exporter.begin_game()
+
+    def add_move(self, move, thought=None, latency=None, retries=None, tokens=None):
+        """Appends one ply with its annotations (move is a chess.Move or UCI string)"""
+        if self.closed:
+            return
+        if isinstance(move, str):
+            move = chess.Move.from_uci(move)
+
+        self.exporter.visit_move(self.board, move)
+        comment = format_move_comment(thought, latency, retries, tokens)
+        if comment:
+            self.exporter.visit_comment(comment)
+        self.board.push(move)
+        self.handle.flush()
+
+    def sync(self, moves):
+        """Appends moves seen on the game stream that were not recorded yet"""
+        uci_moves = moves.split() if moves else []
+        for move_uci in uci_moves[len(self.board.move_stack):]:
+            try:
+                self.add_move(move_uci)
+            except ValueError:
+                break
+
+    def finish(self, result="*", termination=None):
+        """Writes the result and files the game into the rolling archive"""
+        if self.closed:
+            return None
+        self.closed = True
+
+        self.exporter.visit_result(result)
+        self.exporter.end_game()
+        self.handle.close()
+
+        self.headers["Result"] = result
+        if termination:
+            self.headers["Termination"] = termination
+        self.headers["PlyCount"] = str(len(self.board.move_stack))
+
+        path = archive_path(self.archive_dir)
+        with open(path, 'a', encoding='utf-8') as archive:
+            header_exporter = chess.pgn.FileExporter(archive)
+            header_exporter.begin_game()
+            header_exporter.begin_headers()
+            for name, value in self.headers.items():
+                header_exporter.visit_header(name, value.replace('"', "'"))
+            header_exporter.end_headers()
+
+            # Stream the movetext across instead of loading it
+            with open(self.part_path, 'r', encoding='utf-8') as part:
+                shutil.copyfileobj(part, archive)
+
+        os.remove(self.part_path)
+        return path
+
+
+def iter_archive_files(archive_dir, since=None, until=None):
+    """Yields archive files in date order, skipping days outside [since, until]"""
+    for path in sorted(glob.glob(os.path.join(archive_dir, f"{ARCHIVE_PREFIX}*.pgn"))):
+        day = os.path.basename(path)[len(ARCHIVE_PREFIX):-len(".pgn")]
+        if since and day < since:
+            continue
+        if until and day > until:
+            continue
+        yield path
+
+
+def game_matches(headers, since=None, until=None, model=None):
+    """Checks a game's headers against the export filters"""
+    day = headers.get("Date", "").replace(".", "-")
+    if since and day < since:
+        return False
+    if until and day > until:
+        return False
+    if model:
+        models = (headers.get("WhiteModel", "") + " " + headers.get("BlackModel", "")).lower()
+        if model.lower() not in models:
+            return False
+    return True
+
+
+def export_games(archive_dir, since=None, until=None, model=None):
+    """Streams archived games one at a time, filtered by date (YYYY-MM-DD) and model"""
+    for path in iter_archive_files(archive_dir, since, until):
+        with open(path, 'r', encoding='utf-8') as handle:
+            while True:
+                offset = handle.tell()
+                # Only the headers are parsed for games that get filtered out
+                headers = chess.pgn.read_headers(handle)
+                if headers is None:
+                    break
+                if not game_matches(headers, since, until, model):
+                    continue
+                handle.seek(offset)
+                game = chess.pgn.read_game(handle)
+                if game is None:
+                    break
+                yield game
+
+
+def main():
+    """Command line exporter"""
+    parser = argparse.ArgumentParser(description="AI Battle PGN archive tools")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    export = sub.add_parser("export", help="Export archived games as PGN")
+    export.add_argument("--dir", default=os.environ.get('PGN_ARCHIVE_DIR', 'archive'))
+    export.add_argument("--since", help="First day to include (YYYY-MM-DD)")
+    export.add_argument("--until", help="Last day to include (YYYY-MM-DD)")
+    export.add_argument("--model", help="Only games where either side used this model")
+    export.add_argument("--output", help="Output file (stdout by default)")
+
+    args = parser.parse_args()
+
+    out = open(args.output, 'w', encoding='utf-8') if args.output else sys.stdout
+    try:
+        exporter = chess.pgn.FileExporter(out)
+        count = 0
+        for game in export_games(args.dir, args.since, args.until, args.model):
+            game.accept(exporter)
+            count += 1
+        print(f"✅ Exported {count} games", file=sys.stderr)
+    finally:
+        if args.output:
+            out.close()
+
+
+if __name__ == "__main__":
+    main()
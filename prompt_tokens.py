@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Prompt Tokens - AI Battle
+=========================
+Token accounting per prompt section, for each prompt mode, over a corpus
+of positions. Uses tiktoken when it is installed (exact for OpenAI models,
+close enough for Claude), otherwise an estimate of 4 UTF-8 bytes per token.
+
+Usage:
+    python prompt_tokens.py benchmark_positions.jsonl --modes full compact
+    python prompt_tokens.py positions.fen --output tokens.json
+"""
+
+import argparse
+import json
+import math
+import sys
+
+import chess
+
+from metrics import percentile
+from move_prompt import PROMPT_MODES, PROMPT_SEPARATORS, build_prompt_sections
+
+
+def get_counter(encoding_name="o200k_base"):
+    """Returns (count_tokens(text), tokenizer name)"""
+    try:
+        import tiktoken
+        encoding = tiktoken.get_encoding(encoding_name)
+        return (lambda text: len(encoding.encode(text))), f"tiktoken/{encoding_name}"
+    except Exception:
+        return (lambda text: math.ceil(len(text.encode('utf-8')) / 4)), "estimate (4 bytes/token)"
+
+
+def load_positions(path):
+    """FENs from a .fen file (one per line) or a benchmark corpus (JSON lines / EPD)"""
+    if path.endswith('.fen'):
+        from batch_eval import load_fen_corpus
+        return load_fen_corpus(path)
+    from benchmark import load_corpus
+    return [position["fen"] for position in load_corpus(path)]
+
+
+def account(fens, modes, count_tokens):
+    """Per mode: token statistics of every section and of the whole prompt"""
+    report = {}
+    for mode in modes:
+        per_section = {}
+        totals = []
+        for fen in fens:
+            color = 'white' if chess.Board(fen).turn == chess.WHITE else 'black'
+            sections = build_prompt_sections(fen, color, mode=mode)
+            for name, text in sections:
+                per_section.setdefault(name, []).append(count_tokens(text))
+            prompt = PROMPT_SEPARATORS[mode].join(text for name, text in sections)
+            totals.append(count_tokens(prompt))
+
+        mean_total = sum(totals) / len(totals)
+        report[mode] = {
+            "prompts": len(totals),
+            "total_mean": round(mean_total, 1),
+            "total_p95": percentile(totals, 95),
+            "sections": {
+                name: {
+                    "mean": round(sum(counts) / len(counts), 1),
+                    "p95": percentile(counts, 95),
+                    "share": round(sum(counts) / len(counts) / mean_total, 3),
+                }
+                for name, counts in per_section.items()
+            },
+        }
+    return report
+
+
+def print_report(report, tokenizer):
+    print(f"🔢 Tokenizer: {tokenizer}")
+    for mode, stats in report.items():
+        print(f"\n📝 {mode} prompt: {stats['total_mean']} tokens on average "
+              f"(p95 {stats['total_p95']}, {stats['prompts']} positions)")
+        for name, section in sorted(stats["sections"].items(), key=lambda item: -item[1]["mean"]):
+            print(f"   {name:<14} {section['mean']:>7} avg | {section['p95']:>5} p95 | {section['share']:>6.1%}")
+    if len(report) > 1:
+        baseline = next(iter(report.values()))["total_mean"]
+        for mode, stats in list(report.items())[1:]:
+            print(f"\n📉 {mode}: {1 - stats['total_mean'] / baseline:.0%} fewer prompt tokens than "
+                  f"{next(iter(report))}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="AI Battle prompt token accounting")
+    parser.add_argument("corpus", nargs="?", default="benchmark_positions.jsonl")
+    parser.add_argument("--modes", nargs="+", default=list(PROMPT_MODES), choices=PROMPT_MODES)
+    parser.add_argument("--encoding", default="o200k_base", help="tiktoken encoding, if installed")
+    parser.add_argument("--output", help="Save the report as JSON")
+    args = parser.parse_args()
+
+    count_tokens, tokenizer = get_counter(args.encoding)
+    fens = load_positions(args.corpus)
+    if not fens:
+        sys.exit("❌ No positions in corpus")
+    report = account(fens, args.modes, count_tokens)
+    print_report(report, tokenizer)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({"tokenizer": tokenizer, "modes": report}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
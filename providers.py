@@ -0,0 +1,316 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+AI Providers - AI Battle
+========================
+One interface for every LLM backend. A provider is created from a config
+dict ({"type": "anthropic" | "openai" | "openai_compatible", ...}); each
+one gets a bounded concurrency semaphore and adaptive request pacing, so
+several games running at once stay under the provider's rate limits.
+
+complete_stream() consumes the token stream instead, and can close it as
+soon as a stop condition is met (e.g. a legal move has been parsed).
+
+SDKs are imported when a provider makes its first call.
+"""
+
+import threading
+import time
+
+
+class ProviderResponse:
+    """Text returned by a provider with its token usage and latency"""
+
+    def __init__(self, text, input_tokens=None, output_tokens=None, latency=None):
+        self.text = text
+        self.input_tokens = input_tokens
+        self.output_tokens = output_tokens
+        self.latency = latency
+        # Streaming only: time to first token, and whether the stream was closed early
+        self.ttft = None
+        self.stopped_early = False
+
+    @property
+    def tokens(self):
+        """(input, output) token counts, or None if the provider did not report them"""
+        if self.input_tokens is None and self.output_tokens is None:
+            return None
+        return (self.input_tokens or 0, self.output_tokens or 0)
+
+
+class StreamStopError(Exception):
+    """The stop callback of a stream failed: a bug on our side, not a provider failure"""
+
+    # retry_policy.UNPARSEABLE: retried at once, never counted by the circuit breaker
+    failure_class = "unparseable"
+
+    def __init__(self, error, tokens=None):
+        super().__init__(f"stop callback failed: {error}")
+        # (input, output) tokens already streamed, if known
+        self.tokens = tokens
+
+
+def is_rate_limit_error(error):
+    """True for HTTP 429 / rate-limit exceptions from any SDK"""
+    if getattr(error, "status_code", None) == 429:
+        return True
+    return "ratelimit" in type(error).__name__.lower()
+
+
+class AdaptivePacer:
+    """Minimum spacing between request starts: doubles on rate limits, decays on success"""
+
+    def __init__(self, min_interval=0.0, max_interval=30.0, backoff_base=1.0, decay=0.8):
+        self.floor = min_interval
+        self.interval = min_interval
+        self.max_interval = max_interval
+        self.backoff_base = backoff_base
+        self.decay = decay
+        self.next_start = 0.0
+        self.lock = threading.Lock()
+
+    def wait(self):
+        """Blocks until the next request may start"""
+        with self.lock:
+            now = time.monotonic()
+            start = max(now, self.next_start)
+            self.next_start = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+    def on_success(self):
+        with self.lock:
+            self.interval = max(self.floor, self.interval * self.decay)
+
+    def on_rate_limit(self):
+        with self.lock:
+            self.interval = min(self.max_interval, max(self.backoff_base, self.interval * 2))
+            self.next_start = max(self.next_start, time.monotonic() + self.interval)
+
+
+class Provider:
+    """Base provider: subclasses implement call()"""
+
+    def __init__(self, name, max_concurrency=2, min_interval=0.0, timeout=30.0, **options):
+        self.name = name
+        self.options = options
+        self.timeout = timeout
+        self.semaphore = threading.BoundedSemaphore(max_concurrency)
+        self.pacer = AdaptivePacer(min_interval=min_interval)
+        self.client = None
+        self.client_lock = threading.Lock()
+
+    def get_client(self):
+        """Creates the SDK client on first use"""
+        with self.client_lock:
+            if self.client is None:
+                self.client = self.create_client()
+            return self.client
+
+    def create_client(self):
+        raise NotImplementedError
+
+    def call(self, prompt, model, max_tokens, temperature):
+        """Sends one prompt; returns a ProviderResponse without latency"""
+        raise NotImplementedError
+
+    def stream_call(self, prompt, model, max_tokens, temperature, usage):
+        """Yields the response text in chunks, filling usage with token counts.
+        Providers without streaming yield the whole response at once"""
+        response = self.call(prompt, model, max_tokens, temperature)
+        usage["input_tokens"] = response.input_tokens
+        usage["output_tokens"] = response.output_tokens
+        yield response.text
+
+    def complete(self, prompt, model, max_tokens=80, temperature=0.6):
+        """Sends one prompt within the concurrency limit and pacing"""
+        with self.semaphore:
+            self.pacer.wait()
+            start = time.time()
+            try:
+                response = self.call(prompt, model, max_tokens, temperature)
+            except Exception as e:
+                if is_rate_limit_error(e):
+                    self.pacer.on_rate_limit()
+                raise
+            response.latency = time.time() - start
+            self.pacer.on_success()
+            return response
+
+    def complete_stream(self, prompt, model, max_tokens=80, temperature=0.6, stop=None):
+        """Streams one prompt; stop(chunk) returning True closes the stream early.
+        latency is the time until the stream ended or was closed"""
+        with self.semaphore:
+            self.pacer.wait()
+            start = time.time()
+            usage = {}
+            parts = []
+            ttft = None
+            stopped = False
+            chunks = self.stream_call(prompt, model, max_tokens, temperature, usage)
+            try:
+                for chunk in chunks:
+                    if ttft is None:
+                        ttft = time.time() - start
+                    parts.append(chunk)
+                    try:
+                        stopped = bool(stop and stop(chunk))
+                    except Exception as e:
+                        raise StreamStopError(e, (usage.get("input_tokens") or 0, len(parts))) from e
+                    if stopped:
+                        break
+            except Exception as e:
+                if is_rate_limit_error(e):
+                    self.pacer.on_rate_limit()
+                if parts and getattr(e, "tokens", None) is None:
+                    # Tokens were already streamed (and billed): let the caller account them
+                    e.tokens = (usage.get("input_tokens") or 0, usage.get("output_tokens") or len(parts))
+                raise
+            finally:
+                chunks.close()
+            output_tokens = usage.get("output_tokens")
+            if output_tokens is None and stopped:
+                # Usage comes with the end of the stream: count text deltas (about one token each)
+                output_tokens = len(parts)
+            response = ProviderResponse("".join(parts).strip(), usage.get("input_tokens"), output_tokens)
+            response.latency = time.time() - start
+            response.ttft = ttft
+            response.stopped_early = stopped
+            self.pacer.on_success()
+            return response
+
+
+class AnthropicProvider(Provider):
+    """Anthropic Messages API"""
+
+    def create_client(self):
+        from anthropic import Anthropic
+        return Anthropic(
+            api_key=self.options.get("api_key"),
+            base_url=self.options.get("base_url"),
+            timeout=self.timeout
+        )
+
+    def call(self, prompt, model, max_tokens, temperature):
+        message = self.get_client().messages.create(
+            model=model,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            messages=[{"role": "user", "content": prompt}]
+        )
+        return ProviderResponse(
+            message.content[0].text.strip(),
+            message.usage.input_tokens,
+            message.usage.output_tokens
+        )
+
+    def stream_call(self, prompt, model, max_tokens, temperature, usage):
+        stream = self.get_client().messages.create(
+            model=model,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            messages=[{"role": "user", "content": prompt}],
+            stream=True
+        )
+        try:
+            for event in stream:
+                if event.type == "message_start":
+                    usage["input_tokens"] = event.message.usage.input_tokens
+                elif event.type == "content_block_delta" and event.delta.type == "text_delta":
+                    yield event.delta.text
+                elif event.type == "message_delta":
+                    # Only sent at the end: unknown when the stream is closed early
+                    usage["output_tokens"] = event.usage.output_tokens
+        finally:
+            stream.close()
+
+
+class OpenAIProvider(Provider):
+    """OpenAI Chat Completions API"""
+
+    # Ask for token usage in the last chunk of a stream
+    stream_usage = True
+
+    def create_client(self):
+        from openai import OpenAI
+        return OpenAI(
+            api_key=self.options.get("api_key"),
+            base_url=self.options.get("base_url"),
+            timeout=self.timeout
+        )
+
+    def call(self, prompt, model, max_tokens, temperature):
+        response = self.get_client().chat.completions.create(
+            model=model,
+            messages=[{"role": "user", "content": prompt}],
+            max_tokens=max_tokens,
+            temperature=temperature
+        )
+        usage = response.usage
+        return ProviderResponse(
+            (response.choices[0].message.content or "").strip(),
+            usage.prompt_tokens if usage else None,
+            usage.completion_tokens if usage else None
+        )
+
+    def stream_call(self, prompt, model, max_tokens, temperature, usage):
+        options = {"stream_options": {"include_usage": True}} if self.stream_usage else {}
+        stream = self.get_client().chat.completions.create(
+            model=model,
+            messages=[{"role": "user", "content": prompt}],
+            max_tokens=max_tokens,
+            temperature=temperature,
+            stream=True,
+            **options
+        )
+        try:
+            for chunk in stream:
+                if chunk.usage:
+                    usage["input_tokens"] = chunk.usage.prompt_tokens
+                    usage["output_tokens"] = chunk.usage.completion_tokens
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        finally:
+            stream.close()
+
+
+class OpenAICompatibleProvider(OpenAIProvider):
+    """Local or self-hosted server speaking the OpenAI API (llama.cpp, vLLM, Ollama...)"""
+
+    # Not every server accepts stream_options
+    stream_usage = False
+
+    def create_client(self):
+        from openai import OpenAI
+        return OpenAI(
+            # Local servers usually ignore the key, but the SDK requires one
+            api_key=self.options.get("api_key") or "local",
+            base_url=self.options["base_url"],
+            timeout=self.timeout
+        )
+
+
+PROVIDER_TYPES = {
+    "anthropic": AnthropicProvider,
+    "openai": OpenAIProvider,
+    "openai_compatible": OpenAICompatibleProvider,
+}
+
+
+def register_provider_type(type_name, provider_class):
+    """Makes a new provider class available to configurations"""
+    PROVIDER_TYPES[type_name] = provider_class
+
+
+def create_provider(name, config):
+    """Builds a provider from its config dict"""
+    options = dict(config)
+    type_name = options.pop("type")
+    if type_name not in PROVIDER_TYPES:
+        raise ValueError(f"Unknown provider type '{type_name}' for '{name}'")
+    return PROVIDER_TYPES[type_name](name, **options)
+
+
+def build_providers(configs):
+    """Builds every configured provider: {name: Provider}"""
+    return {name: create_provider(name, config) for name, config in configs.items()}
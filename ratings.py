@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Ratings - AI Battle
+===================
+Bradley-Terry ratings (on the Elo scale) of every player configuration
+(model + prompt mode) over all recorded games, with a white advantage term
+and bootstrap confidence intervals.
+
+Games are reduced to counts per (white, black, score), so a fit costs the
+same with a hundred or a hundred thousand results. The fit is a Newton
+solve batched over all bootstrap resamples at once (resampling games is
+drawing new counts from a multinomial over those outcomes).
+
+Results are appended to a JSON lines log, one game per line.
+
+Usage:
+    python ratings.py results.jsonl
+    python ratings.py --archive archive/games.bin --group-by model
+"""
+
+import argparse
+import json
+import os
+from datetime import datetime
+
+import numpy as np
+
+# Natural log-odds -> Elo points
+ELO_SCALE = 400 / np.log(10)
+BASE_RATING = 1500
+SCORES = {"1-0": 1.0, "0-1": 0.0, "1/2-1/2": 0.5}
+GROUPINGS = ("config", "model")
+
+
+def result_entry(game_id, result, white_model, black_model, white_prompt=None, black_prompt=None):
+    """Log entry of a finished game (result: '1-0', '0-1' or '1/2-1/2')"""
+    return {
+        "game_id": game_id,
+        "date": datetime.now().isoformat(timespec='seconds'),
+        "result": result,
+        "white_model": white_model,
+        "black_model": black_model,
+        "white_prompt": white_prompt,
+        "black_prompt": black_prompt,
+    }
+
+
+def append_result(path, entry):
+    """Appends one game to the results log"""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(entry) + "\n")
+
+
+def load_results(path):
+    if not os.path.isfile(path):
+        return []
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def archive_results(path):
+    """Results of the games of a binary archive (model only: the archive has no prompt mode)"""
+    from binary_archive import BinaryArchive
+    with BinaryArchive(path) as archive:
+        return [{"game_id": header["game_id"], "date": header["date"], "result": header["result"],
+                 "white_model": header["white_model"], "black_model": header["black_model"]}
+                for header in (archive.header(game) for game in range(len(archive)))]
+
+
+def player_key(entry, color, group_by="config"):
+    """Name of the player configuration of one side"""
+    model = entry.get(f"{color}_model") or "?"
+    prompt = entry.get(f"{color}_prompt")
+    if group_by == "model" or not prompt:
+        return model
+    return f"{model} [{prompt}]"
+
+
+def fit(white, black, score, counts, players, prior=0.25, iterations=30):
+    """Newton fit of strengths (natural units) and white advantage, batched over rows of counts.
+
+    white, black, score: (m,) outcome table; counts: (b, m) games per outcome for b fits.
+    Returns (b, players + 1) parameters: strengths, then the white advantage.
+    """
+    design = np.zeros((len(score), players + 1))
+    rows = np.arange(len(score))
+    design[rows, white] += 1
+    design[rows, black] -= 1
+    design[:, players] = 1
+    # Weak Gaussian prior (sd ~350 Elo): keeps unbeaten players finite and centres the strengths
+    penalty = prior * np.eye(players + 1)
+
+    theta = np.zeros((counts.shape[0], players + 1))
+    for _ in range(iterations):
+        expected = 1 / (1 + np.exp(-(theta @ design.T)))
+        gradient = (counts * (score - expected)) @ design - theta @ penalty
+        curvature = counts * expected * (1 - expected)
+        hessian = np.einsum('bm,mi,mj->bij', curvature, design, design) + penalty
+        step = np.linalg.solve(hessian, gradient[..., None])[..., 0]
+        theta += step
+        if np.abs(step).max() < 1e-6:
+            break
+    return theta
+
+
+def compute_ratings(results, group_by="config", bootstrap=200, seed=0):
+    """Ratings table of all player configurations, best first"""
+    games = [(player_key(e, "white", group_by), player_key(e, "black", group_by), SCORES[e["result"]])
+             for e in results if e.get("result") in SCORES]
+    if not games:
+        return {"games": 0, "white_advantage": None, "players": []}
+
+    names = sorted({name for white, black, _ in games for name in (white, black)})
+    index = {name: i for i, name in enumerate(names)}
+    outcomes, counts = np.unique(
+        np.array([(index[white], index[black], int(score * 2)) for white, black, score in games]),
+        axis=0, return_counts=True)
+    white, black, score = outcomes[:, 0], outcomes[:, 1], outcomes[:, 2] / 2
+
+    samples = np.random.default_rng(seed).multinomial(len(games), counts / len(games), size=bootstrap) \
+        if bootstrap else np.empty((0, len(counts)))
+    theta = fit(white, black, score, np.vstack([counts, samples]), len(names))
+    strengths = theta[:, :-1] - theta[:, :-1].mean(axis=1, keepdims=True)
+    ratings = BASE_RATING + ELO_SCALE * strengths
+    low, high = (np.percentile(ratings[1:], [2.5, 97.5], axis=0) if bootstrap else (ratings[0], ratings[0]))
+
+    players = []
+    for i, name in enumerate(names):
+        as_white, as_black = white == i, black == i
+        wins = counts[as_white & (score == 1)].sum() + counts[as_black & (score == 0)].sum()
+        losses = counts[as_white & (score == 0)].sum() + counts[as_black & (score == 1)].sum()
+        draws = counts[(as_white | as_black) & (score == 0.5)].sum()
+        players.append({
+            "player": name,
+            "rating": round(float(ratings[0, i])),
+            "ci_low": round(float(low[i])),
+            "ci_high": round(float(high[i])),
+            "games": int(wins + losses + draws),
+            "as_white": int(counts[as_white].sum()),
+            "wins": int(wins),
+            "draws": int(draws),
+            "losses": int(losses),
+        })
+    players.sort(key=lambda player: -player["rating"])
+    return {
+        "games": len(games),
+        "white_advantage": round(float(ELO_SCALE * theta[0, -1])),
+        "bootstrap": bootstrap,
+        "players": players,
+    }
+
+
+class RatingBook:
+    """Results log plus the latest ratings, refitted after each game"""
+
+    def __init__(self, path, group_by="config", bootstrap=200, log=print):
+        self.path = path
+        self.group_by = group_by
+        self.bootstrap = bootstrap
+        self.log = log
+        self.results = load_results(path)
+        self.ratings = compute_ratings(self.results, group_by, bootstrap)
+
+    def record(self, entry):
+        """Logs one game and refits. Returns the new ratings"""
+        self.results.append(entry)
+        try:
+            append_result(self.path, entry)
+        except OSError as e:
+            self.log(f"⚠️  Cannot write results log: {e}")
+        self.ratings = compute_ratings(self.results, self.group_by, self.bootstrap)
+        return self.ratings
+
+
+def print_ratings(ratings):
+    print(f"🏅 {ratings['games']} games | white advantage: {ratings['white_advantage']} Elo")
+    for rank, player in enumerate(ratings["players"], 1):
+        print(f"   {rank:>2}. {player['player']:<40} {player['rating']:>5} "
+              f"[{player['ci_low']}, {player['ci_high']}] "
+              f"+{player['wins']} ={player['draws']} -{player['losses']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="AI Battle ratings")
+    parser.add_argument("log", nargs="?", default="results.jsonl")
+    parser.add_argument("--archive", help="Rate the games of a binary archive instead of the results log")
+    parser.add_argument("--group-by", default="config", choices=GROUPINGS)
+    parser.add_argument("--bootstrap", type=int, default=1000, help="Resamples for the confidence intervals")
+    parser.add_argument("--json", action="store_true", help="Print the ratings as JSON")
+    args = parser.parse_args()
+
+    results = archive_results(args.archive) if args.archive else load_results(args.log)
+    ratings = compute_ratings(results, args.group_by, args.bootstrap)
+    if args.json:
+        print(json.dumps(ratings, indent=2))
+    else:
+        print_ratings(ratings)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Retry Policy - AI Battle
+========================
+Classifies failed move attempts and decides how long to wait before the
+next one:
+- rate limits, timeouts and 5xx errors back off exponentially with jitter
+  (honouring Retry-After when the provider sends one)
+- unparseable answers and illegal moves are retried right away
+- other client errors (bad key, bad request) are not retried
+
+Each provider also gets a circuit breaker: after a run of provider
+failures (rate limits, timeouts, 5xx: not client errors, which come from
+our own request) it opens and calls fail fast until a probe call is allowed.
+"""
+
+import random
+import threading
+import time
+
+# Failure classes
+RATE_LIMIT = "rate_limit"
+TIMEOUT = "timeout"
+SERVER_ERROR = "server_error"
+CLIENT_ERROR = "client_error"
+UNPARSEABLE = "unparseable"
+ILLEGAL_MOVE = "illegal_move"
+CIRCUIT_OPEN = "circuit_open"
+
+# Failures that say something about the provider's health (a 4xx is caused by our own request)
+PROVIDER_FAILURES = (RATE_LIMIT, TIMEOUT, SERVER_ERROR)
+
+# Failure class -> (backoff base, cap) in seconds; None: not retried
+BACKOFF = {
+    RATE_LIMIT: (2.0, 30.0),
+    TIMEOUT: (1.0, 15.0),
+    SERVER_ERROR: (1.0, 15.0),
+    CLIENT_ERROR: None,
+    UNPARSEABLE: (0.0, 0.0),
+    ILLEGAL_MOVE: (0.0, 0.0),
+    # Waits for the breaker's next probe (passed as the wait hint)
+    CIRCUIT_OPEN: (1.0, 30.0),
+}
+
+
+def backoff_delay(attempt, base=0.5, cap=30.0):
+    """Exponential backoff with full jitter"""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+def classify_error(error):
+    """Failure class of an exception raised by a provider SDK"""
+    # Our own errors raised during a call (e.g. a failing stream parser) name their class
+    declared = getattr(error, "failure_class", None)
+    if declared:
+        return declared
+    status = getattr(error, "status_code", None)
+    name = type(error).__name__.lower()
+    if status == 429 or "ratelimit" in name:
+        return RATE_LIMIT
+    if "timeout" in name or isinstance(error, TimeoutError):
+        return TIMEOUT
+    if isinstance(status, int):
+        return SERVER_ERROR if status >= 500 else CLIENT_ERROR
+    # Connection errors and anything unexpected: treated as a provider outage
+    return SERVER_ERROR
+
+
+def retry_after(error):
+    """Seconds asked by a Retry-After header of the error's response, if any"""
+    response = getattr(error, "response", None)
+    try:
+        return max(float(response.headers.get("retry-after")), 0.0)
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+
+def retry_delay(kind, attempt, wait_hint=None):
+    """Seconds to wait before retrying after the attempt-th failure of this class, None to give up"""
+    backoff = BACKOFF.get(kind, (1.0, 15.0))
+    if backoff is None:
+        return None
+    delay = backoff_delay(attempt, *backoff) if backoff[0] else 0.0
+    if wait_hint:
+        delay = max(delay, min(wait_hint, backoff[1]))
+    return delay
+
+
+class CircuitBreaker:
+    """Closed -> open after threshold consecutive failures -> half-open after reset_timeout"""
+
+    def __init__(self, name, threshold=5, reset_timeout=30.0, on_change=None):
+        self.name = name
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.on_change = on_change
+        self.lock = threading.Lock()
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+        self.trips = 0
+        self.last_error = None
+
+    def allow(self):
+        """True if a call may go out (one probe at a time while half-open)"""
+        with self.lock:
+            if self.state == "open":
+                if time.monotonic() - self.opened_at < self.reset_timeout:
+                    return False
+                self.state = "half_open"
+                self.probing = False
+                changed = True
+            else:
+                changed = False
+            if self.state == "half_open":
+                if self.probing:
+                    return False
+                self.probing = True
+        if changed:
+            self.notify()
+        return True
+
+    def retry_in(self):
+        """Seconds until the next probe is allowed (0 unless open)"""
+        with self.lock:
+            if self.state != "open":
+                return 0.0
+            return max(0.0, self.opened_at + self.reset_timeout - time.monotonic())
+
+    def record_success(self):
+        with self.lock:
+            changed = self.state != "closed"
+            self.state = "closed"
+            self.failures = 0
+            self.probing = False
+        if changed:
+            self.notify()
+
+    def record_failure(self, kind):
+        """Counts a provider failure; opens the breaker at the threshold or on a failed probe"""
+        with self.lock:
+            self.failures += 1
+            self.last_error = kind
+            self.probing = False
+            opened = self.state == "half_open" or (self.state == "closed" and self.failures >= self.threshold)
+            if opened:
+                self.state = "open"
+                self.opened_at = time.monotonic()
+                self.trips += 1
+        if opened:
+            self.notify()
+
+    def snapshot(self):
+        """State shown in game_state.json"""
+        retry_in = self.retry_in()
+        with self.lock:
+            return {
+                "state": self.state,
+                "consecutive_failures": self.failures,
+                "trips": self.trips,
+                "last_error": self.last_error,
+                "retry_in_s": round(retry_in, 1),
+            }
+
+    def notify(self):
+        if self.on_change:
+            self.on_change(self)
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Startup Benchmark - AI Battle
+=============================
+Measures how long a fresh interpreter takes to import chess_battle (or any
+module), and which heavy libraries that import pulls in. Each run is a new
+process, started from an empty directory so that no state file is touched.
+
+Usage:
+    python startup_benchmark.py                       # current tree
+    python startup_benchmark.py --ref HEAD~1          # also measure a git revision
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from metrics import percentile
+
+# Libraries whose import cost matters at startup
+HEAVY_MODULES = ("berserk", "requests", "anthropic", "openai", "chess.engine", "numpy")
+
+PROBE = """
+import sys, time, json
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"seconds": elapsed, "loaded": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def measure(source_dir, module, runs):
+    """Import time of module in fresh interpreters: (samples, heavy modules loaded)"""
+    env = dict(os.environ)
+    env["PYTHONPATH"] = source_dir
+    env["PYTHONDONTWRITEBYTECODE"] = "1"
+    code = PROBE.format(module=module, heavy=HEAVY_MODULES)
+    samples = []
+    loaded = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for _ in range(runs):
+            output = subprocess.run(
+                [sys.executable, "-c", code], cwd=workdir, env=env,
+                capture_output=True, text=True, timeout=120
+            )
+            lines = [line for line in output.stdout.splitlines() if line.startswith('{"seconds"')]
+            if output.returncode != 0 or not lines:
+                raise RuntimeError(f"import {module} failed: {output.stderr.strip()[-500:]}")
+            result = json.loads(lines[-1])
+            samples.append(result["seconds"])
+            loaded = result["loaded"]
+    return samples, loaded
+
+
+def export_revision(ref, target):
+    """Writes the files of a git revision into target"""
+    archive = subprocess.run(["git", "archive", ref], capture_output=True, check=True).stdout
+    subprocess.run(["tar", "-x", "-C", target], input=archive, check=True)
+
+
+def report(label, samples, loaded):
+    summary = {
+        "runs": len(samples),
+        "p50_ms": round(percentile(samples, 50) * 1000, 1),
+        "p95_ms": round(percentile(samples, 95) * 1000, 1),
+        "min_ms": round(min(samples) * 1000, 1),
+        "heavy_modules_loaded": loaded,
+    }
+    print(f"⏱️  {label:<12} p50 {summary['p50_ms']} ms | p95 {summary['p95_ms']} ms | "
+          f"min {summary['min_ms']} ms | loads: {', '.join(loaded) or 'none'}")
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="AI Battle import-time benchmark")
+    parser.add_argument("--module", default="chess_battle")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--ref", help="Git revision to compare against")
+    parser.add_argument("--output", help="Save the results as JSON")
+    args = parser.parse_args()
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    results = {"module": args.module}
+    samples, loaded = measure(here, args.module, args.runs)
+    results["current"] = report("current", samples, loaded)
+
+    if args.ref:
+        with tempfile.TemporaryDirectory() as checkout:
+            export_revision(args.ref, checkout)
+            ref_samples, ref_loaded = measure(checkout, args.module, args.runs)
+        results[args.ref] = report(args.ref, ref_samples, ref_loaded)
+        saved = results[args.ref]["p50_ms"] - results["current"]["p50_ms"]
+        print(f"🚀 Saved {saved:.1f} ms at p50 vs {args.ref}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+State Publisher - AI Battle
+===========================
+Merges game state updates into a single snapshot. Updates are copied when
+published, so callers can keep mutating the dicts they pass (scores, ratings).
+The in-memory store is only told the snapshot changed: it is serialized and
+compressed by the next request that reads it, at most once per change, while
+game_state.json is rewritten by a background thread at most once per interval,
+atomically (temp file + os.replace).
+"""
+
+import copy
+import json
+import os
+import tempfile
+import threading
+import time
+
+from metrics import LatencyStats
+
+
+def merge_state(target, update):
+    """Recursively merges update into target (nested dicts are merged, not replaced)"""
+    for key, value in update.items():
+        if isinstance(value, dict) and isinstance(target.get(key), dict):
+            merge_state(target[key], value)
+        else:
+            target[key] = value
+    return target
+
+
+def write_text_atomic(path, text):
+    """Writes text next to path and swaps it in, so readers never see a partial file"""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(prefix='.tmp_', suffix='.json', dir=directory)
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(text)
+        # mkstemp creates the file owner-only
+        os.chmod(temp_path, 0o644)
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+
+
+class StatePublisher:
+    """Coalesces state updates and debounces disk writes"""
+
+    def __init__(self, path, store=None, store_name='game_state', min_interval=1.0, log=print):
+        self.path = path
+        self.store = store
+        self.store_name = store_name
+        self.min_interval = min_interval
+        self.log = log
+
+        self.snapshot = {}
+        self.condition = threading.Condition()
+        self.dirty = False
+        self.last_write = 0.0
+        # Keeps writes in order between the writer thread and flush()
+        self.write_lock = threading.Lock()
+
+        self.publish_count = 0
+        self.write_count = 0
+        self.write_errors = 0
+        self.write_latency = LatencyStats()
+
+        self.writer_thread = threading.Thread(target=self.writer_loop, daemon=True)
+        self.writer_thread.start()
+
+    def publish(self, update):
+        """Merges a copy of an update into the snapshot and schedules a write"""
+        update = copy.deepcopy(update)
+        with self.condition:
+            merge_state(self.snapshot, update)
+            self.publish_count += 1
+            self.dirty = True
+            if self.store:
+                # Several updates per move: encode only the snapshot that is actually read
+                self.store.invalidate(self.store_name, self.get)
+            self.condition.notify()
+
+    def get(self):
+        """Returns a copy of the current snapshot"""
+        with self.condition:
+            return json.loads(json.dumps(self.snapshot))
+
+    def writer_loop(self):
+        """Background thread: writes the latest snapshot, at most once per interval"""
+        while True:
+            with self.condition:
+                while not self.dirty:
+                    self.condition.wait()
+                # Let more updates pile up until the interval has passed
+                delay = self.last_write + self.min_interval - time.monotonic()
+                if delay > 0:
+                    self.condition.wait(delay)
+                    continue
+            self.write_pending()
+
+    def write_pending(self):
+        """Serializes the snapshot under the lock, then writes it outside of it"""
+        with self.write_lock:
+            with self.condition:
+                if not self.dirty:
+                    return
+                text = json.dumps(self.snapshot, ensure_ascii=False)
+                self.dirty = False
+
+            start = time.perf_counter()
+            try:
+                write_text_atomic(self.path, text)
+                self.write_count += 1
+            except Exception as e:
+                self.write_errors += 1
+                self.log(f"⚠️  Error saving state: {e}")
+            self.write_latency.add(time.perf_counter() - start)
+            self.last_write = time.monotonic()
+
+    def flush(self):
+        """Writes any pending update immediately (e.g. before exiting)"""
+        self.write_pending()
+
+    def stats(self):
+        """Publish and write counters with write latency"""
+        with self.condition:
+            stats = {
+                "publishes": self.publish_count,
+                "writes": self.write_count,
+                "write_errors": self.write_errors,
+            }
+        stats["write_latency"] = self.write_latency.summary()
+        return stats
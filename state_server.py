@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+State Server - AI Battle
+========================
+Serves the viewer and the live state/log snapshots straight from memory.
+Each published snapshot gets a new version used in its ETag, so unchanged
+polls are answered with 304 (the ETag also carries a per-process nonce:
+versions start over after a restart), and larger bodies are pre-compressed with gzip.
+
+Log lines and plies are also kept in sequence logs: every entry gets a
+monotonic sequence number, and /logs?since=N or /moves?since=N return only
+the entries after N, so a poll costs the same however long the game is.
+
+A snapshot that changes more often than it is read (logs.json, on every log
+line) can be invalidated instead: it is rebuilt by the first request that
+needs it, at most once per change.
+"""
+
+import gzip
+import json
+import os
+import secrets
+import threading
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Bodies smaller than this are not worth compressing
+GZIP_MIN_SIZE = 1024
+
+# URL path -> snapshot name
+SNAPSHOT_ROUTES = {
+    "/game_state.json": "game_state",
+    "/logs.json": "logs",
+}
+
+# URL path -> sequence log name (delta API)
+SEQUENCE_ROUTES = {
+    "/logs": "logs",
+    "/moves": "moves",
+}
+
+# URL path -> (file, content type); nothing else in the directory is exposed
+ASSET_ROUTES = {
+    "/": ("viewer.html", "text/html; charset=utf-8"),
+    "/viewer.html": ("viewer.html", "text/html; charset=utf-8"),
+    "/Cyber-Tac_-_2077.mp3": ("Cyber-Tac_-_2077.mp3", "audio/mpeg"),
+}
+
+
+class Snapshot:
+    """One encoded response body with its ETag"""
+
+    def __init__(self, etag, body, content_type, gzipped=None, version=0):
+        self.etag = etag
+        self.version = version
+        self.body = body
+        self.content_type = content_type
+        self.gzipped = gzipped
+
+
+def encode_body(etag, body, content_type, version=0):
+    """Builds a snapshot, compressing the body once if it is large enough"""
+    gzipped = gzip.compress(body, compresslevel=5) if len(body) >= GZIP_MIN_SIZE else None
+    return Snapshot(etag, body, content_type, gzipped, version)
+
+
+class SequenceLog:
+    """Entries numbered with a monotonic sequence, readable from any sequence number"""
+
+    def __init__(self, capacity=None):
+        self.lock = threading.Lock()
+        self.entries = deque(maxlen=capacity)
+        self.seq = 0
+        # Sequence number before the first entry of the current run (see reset)
+        self.base = 0
+
+    def append(self, value):
+        """Adds an entry and returns its sequence number"""
+        with self.lock:
+            self.seq += 1
+            self.entries.append(value)
+            return self.seq
+
+    def reset(self):
+        """Starts a new run (e.g. a new game): readers from before it get everything again"""
+        with self.lock:
+            self.start_run()
+
+    def start_run(self):
+        # The reset takes a sequence number, so readers that were up to date see it too
+        self.entries.clear()
+        self.seq += 1
+        self.base = self.seq
+
+    def sync(self, values):
+        """Makes the entries equal to values, appending when values only extends them"""
+        with self.lock:
+            count = len(self.entries)
+            if len(values) >= count and list(self.entries) == list(values[:count]):
+                new_values = values[count:]
+            else:
+                self.start_run()
+                new_values = values
+            for value in new_values:
+                self.seq += 1
+                self.entries.append(value)
+
+    def since(self, seq):
+        """Entries after seq: (last seq, reset, values).
+        reset is True when seq is older than the buffer or from another run: values is then everything"""
+        with self.lock:
+            first = self.seq - len(self.entries)
+            if seq is None or seq < max(first, self.base) or seq > self.seq:
+                return self.seq, True, list(self.entries)
+            skip = len(self.entries) - (self.seq - seq)
+            return self.seq, False, [self.entries[i] for i in range(skip, len(self.entries))]
+
+
+class SnapshotStore:
+    """Latest JSON snapshots kept in memory, versioned with a global counter"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.version = 0
+        # Tells this process's versions from a previous run's, cached by clients with the same number
+        self.nonce = secrets.token_hex(4)
+        self.snapshots = {}
+        self.sequences = {}
+        # name -> function returning the data of a snapshot that is out of date
+        self.stale = {}
+
+    def sequence(self, name, capacity=None):
+        """Returns the sequence log called name, creating it on first use"""
+        with self.lock:
+            if name not in self.sequences:
+                self.sequences[name] = SequenceLog(capacity)
+            return self.sequences[name]
+
+    def publish(self, name, data):
+        """Serializes data once and makes it the current snapshot"""
+        body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        with self.lock:
+            self.version += 1
+            version = self.version
+        snapshot = encode_body(f'"{name}-{self.nonce}-{version}"', body, "application/json; charset=utf-8", version)
+        with self.lock:
+            # A slower publisher must not overwrite a newer snapshot
+            current = self.snapshots.get(name)
+            if current is None or current.version < version:
+                self.snapshots[name] = snapshot
+
+    def invalidate(self, name, producer):
+        """Marks a snapshot out of date: producer() gives its data when it is next read"""
+        with self.lock:
+            self.stale[name] = producer
+
+    def get(self, name):
+        """Returns the current snapshot (rebuilt first if it was invalidated) or None"""
+        with self.lock:
+            producer = self.stale.pop(name, None)
+            if producer is None:
+                return self.snapshots.get(name)
+        # Built outside the lock; concurrent readers get the previous snapshot meanwhile
+        self.publish(name, producer())
+        with self.lock:
+            return self.snapshots.get(name)
+
+
+def load_assets():
+    """Reads the viewer assets once at startup"""
+    assets = {}
+    for path, (filename, content_type) in ASSET_ROUTES.items():
+        full_path = os.path.join(BASE_DIR, filename)
+        if not os.path.isfile(full_path):
+            continue
+        with open(full_path, 'rb') as f:
+            body = f.read()
+        etag = f'"{filename}-{int(os.path.getmtime(full_path))}"'
+        # Audio is already compressed
+        if content_type.startswith("audio/"):
+            assets[path] = Snapshot(etag, body, content_type)
+        else:
+            assets[path] = encode_body(etag, body, content_type)
+    return assets
+
+
+class ViewerRequestHandler(BaseHTTPRequestHandler):
+    """Serves viewer assets and in-memory snapshots, with ETag and gzip"""
+
+    store = None
+    assets = {}
+    protocol_version = "HTTP/1.1"
+    # Headers and body are separate writes: with Nagle, the body waits for the
+    # client's delayed ACK (~40 ms per poll on keep-alive connections)
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        self.send_snapshot(include_body=True)
+
+    def do_HEAD(self):
+        self.send_snapshot(include_body=False)
+
+    def send_snapshot(self, include_body):
+        path, _, query = self.path.partition('?')
+
+        if path in SEQUENCE_ROUTES and self.store:
+            self.send_delta(SEQUENCE_ROUTES[path], query, include_body)
+            return
+
+        if path in SNAPSHOT_ROUTES:
+            snapshot = self.store.get(SNAPSHOT_ROUTES[path]) if self.store else None
+            cache_control = "no-cache"
+        else:
+            snapshot = self.assets.get(path)
+            cache_control = "public, max-age=60"
+
+        if snapshot is None:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        if self.headers.get("If-None-Match") == snapshot.etag:
+            self.send_response(304)
+            self.send_header("ETag", snapshot.etag)
+            self.send_header("Cache-Control", cache_control)
+            self.end_headers()
+            return
+
+        body = snapshot.body
+        use_gzip = snapshot.gzipped is not None and "gzip" in self.headers.get("Accept-Encoding", "")
+        if use_gzip:
+            body = snapshot.gzipped
+
+        self.send_response(200)
+        self.send_header("Content-Type", snapshot.content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", snapshot.etag)
+        self.send_header("Cache-Control", cache_control)
+        self.send_header("Vary", "Accept-Encoding")
+        if use_gzip:
+            self.send_header("Content-Encoding", "gzip")
+        self.end_headers()
+        if include_body:
+            self.wfile.write(body)
+
+    def send_delta(self, name, query, include_body):
+        """Entries of a sequence log after ?since=N (everything without it)"""
+        try:
+            since = int(parse_qs(query)["since"][0])
+        except (KeyError, ValueError):
+            since = None
+        seq, reset, items = self.store.sequence(name).since(since)
+        body = json.dumps({"seq": seq, "reset": reset, "items": items}, ensure_ascii=False).encode('utf-8')
+        use_gzip = len(body) >= GZIP_MIN_SIZE and "gzip" in self.headers.get("Accept-Encoding", "")
+        if use_gzip:
+            body = gzip.compress(body, compresslevel=5)
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Cache-Control", "no-store")
+        self.send_header("Vary", "Accept-Encoding")
+        if use_gzip:
+            self.send_header("Content-Encoding", "gzip")
+        self.end_headers()
+        if include_body:
+            self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # One line per poll would flood the console
+        pass
+
+
+def create_server(store, host='0.0.0.0', port=8000):
+    """Creates the threaded viewer server bound to a snapshot store"""
+    handler = type("BoundViewerRequestHandler", (ViewerRequestHandler,), {
+        "store": store,
+        "assets": load_assets(),
+    })
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Tracing - AI Battle
+===================
+Lightweight spans around the stages of the move pipeline and the game
+lifecycle, kept in a ring buffer and exported per game in Chrome trace
+event format (open in chrome://tracing or https://ui.perfetto.dev).
+
+Off by default: a disabled tracer hands out one shared no-op span, so
+instrumented code only pays for a method call.
+"""
+
+import json
+import os
+import threading
+import time
+from collections import deque
+
+
+def now_us():
+    """Monotonic clock in microseconds (trace event timestamps)"""
+    return time.perf_counter_ns() // 1000
+
+
+class NullSpan:
+    """Span used while tracing is disabled"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **args):
+        pass
+
+
+NULL_SPAN = NullSpan()
+
+
+class Span:
+    """Times a block and records it as a complete ('X') trace event"""
+
+    def __init__(self, tracer, name, category, args):
+        self.tracer = tracer
+        self.name = name
+        self.category = category
+        self.args = args
+
+    def __enter__(self):
+        self.start = now_us()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.args["error"] = exc_type.__name__
+        self.tracer.record({
+            "name": self.name,
+            "cat": self.category,
+            "ph": "X",
+            "ts": self.start,
+            "dur": now_us() - self.start,
+            "args": self.args,
+        })
+        return False
+
+    def set(self, **args):
+        """Adds arguments shown with the span (tokens, model...)"""
+        self.args.update(args)
+
+
+class Tracer:
+    """Collects spans of the current game in a bounded buffer"""
+
+    def __init__(self, enabled=False, capacity=20000):
+        self.enabled = enabled
+        self.events = deque(maxlen=capacity)
+        self.lock = threading.Lock()
+        self.game = None
+        self.thread_names = {}
+
+    def configure(self, enabled, capacity=None):
+        with self.lock:
+            self.enabled = enabled
+            if capacity and capacity != self.events.maxlen:
+                self.events = deque(self.events, maxlen=capacity)
+
+    def start_game(self, game):
+        """Tags the following events with a game key (e.g. the game number)"""
+        self.game = game
+
+    def span(self, name, category="move", **args):
+        """Context manager timing a block (no-op while disabled)"""
+        if not self.enabled:
+            return NULL_SPAN
+        return Span(self, name, category, args)
+
+    def instant(self, name, category="game", **args):
+        """Records a point in time (e.g. a stream event)"""
+        if not self.enabled:
+            return
+        self.record({"name": name, "cat": category, "ph": "i", "s": "t", "ts": now_us(), "args": args})
+
+    def record(self, event):
+        thread = threading.current_thread()
+        event["pid"] = os.getpid()
+        event["tid"] = thread.ident
+        event["game"] = self.game
+        with self.lock:
+            self.thread_names[thread.ident] = thread.name
+            self.events.append(event)
+
+    def game_events(self, game):
+        """Chrome trace events of one game, with thread name metadata"""
+        with self.lock:
+            events = [dict(e) for e in self.events if e["game"] == game]
+            names = dict(self.thread_names)
+        pid = os.getpid()
+        metadata = [
+            {"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": name}}
+            for tid, name in names.items()
+            if any(e["tid"] == tid for e in events)
+        ]
+        for event in events:
+            del event["game"]
+        return metadata + events
+
+    def export_game(self, game, path):
+        """Writes one game's spans as a Chrome trace JSON file. Returns the number of events"""
+        events = self.game_events(game)
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+        return len(events)
+
+
+# Shared by every module of the bot
+tracer = Tracer()